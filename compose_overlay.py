@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+compose_overlay.py
+
+Generated compose override files for the launch scripts. Instead of rewriting the
+tracked compose files on every run, the changes the launchers need (the Traefik
+network on Supabase's Kong, SearXNG's first-run capabilities, ...) are written as
+override files under .compose-overlays/ and passed to docker compose with extra `-f`
+options. Each overlay is rebuilt only when the hash of its inputs changes.
+
+Overlays are plain compose YAML, so compose's own merge rules apply, including the
+`!reset` and `!override` tags for removing or replacing an attribute of the base file.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+OVERLAY_DIR_NAME = ".compose-overlays"
+
+# Overlays for the Supabase file also apply to the main file, which includes it
+STACK_SUPABASE = "supabase"
+STACK_MAIN = "main"
+
+_PLAIN_KEY = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+class Reset:
+    """Emit a value with compose's `!reset` tag (e.g. Reset([]) clears a list)."""
+
+    tag = "!reset"
+
+    def __init__(self, value):
+        self.value = value
+
+class Override(Reset):
+    """Emit a value with compose's `!override` tag, replacing instead of merging."""
+
+    tag = "!override"
+
+def dump_yaml(data, indent=0):
+    """Render nested dicts/lists/scalars as block YAML (scalars as JSON, which YAML accepts)."""
+    pad = "  " * indent
+    lines = []
+    for key, value in data.items():
+        key = key if _PLAIN_KEY.match(key) else json.dumps(key)
+        if isinstance(value, Reset):
+            lines.append(f"{pad}{key}: {value.tag} {json.dumps(value.value)}")
+        elif isinstance(value, dict) and value:
+            lines.append(f"{pad}{key}:")
+            lines.append(dump_yaml(value, indent + 1))
+        elif isinstance(value, list) and value:
+            lines.append(f"{pad}{key}:")
+            lines.extend(f"{pad}  - {json.dumps(item)}" for item in value)
+        else:
+            lines.append(f"{pad}{key}: {json.dumps(value)}")
+    return "\n".join(lines)
+
+def input_digest(paths, extra=""):
+    """Hash the contents of the input files (missing files count as empty) plus `extra`."""
+    digest = hashlib.sha256(extra.encode())
+    for path in paths:
+        digest.update(path.encode() + b"\0")
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def overlay_dir(project_dir):
+    return os.path.join(project_dir, OVERLAY_DIR_NAME)
+
+def ensure_overlay(project_dir, stack, name, inputs, build, extra=""):
+    """
+    Make sure the overlay `name` for `stack` is up to date.
+
+    Args:
+        project_dir: directory holding the compose files
+        stack: STACK_SUPABASE or STACK_MAIN
+        name: overlay name, used for its file name
+        inputs: files the overlay is derived from
+        build: callable returning the override dict, or None when no override is needed
+        extra: additional cache key material (e.g. detected runtime state)
+    Returns:
+        (path or None, rebuilt) - the overlay file, and whether build() had to run
+    """
+    directory = overlay_dir(project_dir)
+    path = os.path.join(directory, f"{stack}-{name}.yml")
+    digest_path = os.path.join(directory, f"{stack}-{name}.sha256")
+    digest = input_digest(inputs, extra)
+
+    try:
+        with open(digest_path) as f:
+            cached = f.read().strip()
+    except OSError:
+        cached = None
+    if cached == digest:
+        return (path if os.path.exists(path) else None), False
+
+    override = build()
+    os.makedirs(directory, exist_ok=True)
+    if override:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"# Generated by compose_overlay.py from {', '.join(map(os.path.basename, inputs))}"
+                    " - do not edit\n")
+            f.write(dump_yaml(override) + "\n")
+        os.replace(tmp_path, path)
+    elif os.path.exists(path):
+        os.remove(path)
+    with open(digest_path, "w") as f:
+        f.write(digest + "\n")
+    return (path if override else None), True
+
+def overlay_files(project_dir, stack):
+    """Overlay files to pass to compose for `stack` (the main stack gets both kinds)."""
+    directory = overlay_dir(project_dir)
+    if not os.path.isdir(directory):
+        return []
+    prefixes = (f"{STACK_SUPABASE}-",) if stack == STACK_SUPABASE else (f"{STACK_SUPABASE}-", f"{STACK_MAIN}-")
+    return [
+        os.path.join(directory, name) for name in sorted(os.listdir(directory))
+        if name.endswith(".yml") and name.startswith(prefixes)
+    ]
+
+def overlay_args(project_dir, stack):
+    """The `-f <overlay>` options for `stack`."""
+    args = []
+    for path in overlay_files(project_dir, stack):
+        args.extend(["-f", path])
+    return args
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+docker_api.py
+
+Small Docker Engine API client for the launch scripts. It talks HTTP over the Docker
+Unix socket and keeps one persistent connection per thread, so container listing,
+inspect and exec calls no longer spawn a `docker` CLI process (and load its plugins)
+each time. Streaming calls (exec output, events) use their own connection.
+
+The socket path comes from DOCKER_HOST (unix://...) or defaults to
+/var/run/docker.sock, which also makes it easy to point the client at a fake server.
+"""
+
+import http.client
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import urllib.parse
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+API_VERSION = "v1.41"
+# Requests that can be replayed when the daemon may already have received them
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+class DockerAPIError(Exception):
+    """The Engine API answered with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+def socket_path_from_env():
+    """Return the Unix socket path from DOCKER_HOST, or None for non-unix hosts."""
+    host = os.environ.get("DOCKER_HOST", "")
+    if not host:
+        return DEFAULT_SOCKET
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return None
+
+class DockerClient:
+    """
+    Minimal Engine API client.
+
+    Args:
+        socket_path: path of the Docker Unix socket
+        timeout: socket timeout in seconds for non-streaming requests
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            # An idle kept-alive socket is only readable once the daemon closed it
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _url(self, path, params=None):
+        url = f"/{API_VERSION}{path}"
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        return url
+
+    def request(self, method, path, params=None, body=None):
+        """Send a request on the persistent connection and return the decoded JSON body."""
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        url = self._url(path, params)
+        for attempt in range(2):
+            conn = self._connection()
+            sent = False
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                sent = True
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                self._local.conn = None
+                if attempt or not self._can_retry(method, e, sent):
+                    raise
+        if response.status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except ValueError:
+                message = data.decode(errors="replace")
+            raise DockerAPIError(response.status, message)
+        return json.loads(data) if data else None
+
+    @staticmethod
+    def _can_retry(method, error, sent):
+        """
+        Reconnect once when the daemon closed the kept-alive connection under us.
+        A request that may have reached the daemon (restart, exec create, ...) is
+        only replayed if it is idempotent, and a timeout is never retried.
+        """
+        if isinstance(error, socket.timeout):
+            return False
+        if not sent:
+            return True
+        return method in IDEMPOTENT_METHODS and isinstance(
+            error, (ConnectionError, http.client.BadStatusLine)
+        )
+
+    def _stream(self, method, path, params=None, body=None):
+        """Open a dedicated connection for a streaming response."""
+        conn = UnixHTTPConnection(self.socket_path)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        conn.request(method, self._url(path, params), body=payload, headers=headers)
+        # getresponse() drops conn.sock for close-delimited bodies; keep it for shutdown
+        conn.stream_sock = conn.sock
+        response = conn.getresponse()
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            raise DockerAPIError(response.status, data.decode(errors="replace"))
+        return conn, response
+
+    def ping(self):
+        """Return True if the daemon answers."""
+        try:
+            conn = self._connection()
+            conn.request("GET", "/_ping")
+            response = conn.getresponse()
+            response.read()
+            return response.status == 200
+        except (http.client.HTTPException, OSError):
+            self._local.conn = None
+            return False
+
+    def containers(self, all=False, filters=None):
+        """
+        List containers (like `docker ps`).
+
+        Args:
+            all: include stopped containers
+            filters: dict such as {"label": ["com.docker.compose.project=localai"]}
+        """
+        params = {"all": "1" if all else "0"}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        return self.request("GET", "/containers/json", params)
+
+    def inspect(self, container):
+        """Return the inspect document of a container (like `docker inspect`)."""
+        return self.request("GET", f"/containers/{urllib.parse.quote(container)}/json")
+
+    def stats(self, container):
+        """Return one resource usage sample of a container (like `docker stats --no-stream`)."""
+        return self.request(
+            "GET", f"/containers/{urllib.parse.quote(container)}/stats",
+            {"stream": "false", "one-shot": "true"}
+        )
+
+    def restart(self, container, timeout=10):
+        """Restart a container, giving it `timeout` seconds to stop."""
+        self.request("POST", f"/containers/{urllib.parse.quote(container)}/restart", {"t": str(timeout)})
+
+    def exec(self, container, cmd):
+        """
+        Run a command in a running container (like `docker exec`).
+
+        Returns:
+            (exit_code, output) with stdout and stderr interleaved
+        """
+        created = self.request(
+            "POST", f"/containers/{urllib.parse.quote(container)}/exec",
+            body={"Cmd": cmd, "AttachStdout": True, "AttachStderr": True}
+        )
+        conn, response = self._stream(
+            "POST", f"/exec/{created['Id']}/start", body={"Detach": False, "Tty": False}
+        )
+        try:
+            output = _demultiplex(response.read())
+        finally:
+            conn.close()
+        exit_code = self.request("GET", f"/exec/{created['Id']}/json").get("ExitCode")
+        return exit_code, output
+
+    def events(self, filters=None, since=None):
+        """
+        Subscribe to the daemon event stream (like `docker events`).
+
+        The subscription is established before this returns, so no event that
+        happens afterwards is missed. Iterate the returned EventStream for event
+        dicts and close it when done.
+        """
+        params = {}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        if since is not None:
+            params["since"] = str(since)
+        conn, response = self._stream("GET", "/events", params)
+        return EventStream(conn, response)
+
+class EventStream:
+    """Iterator over a live event stream; close() may be called from another thread."""
+
+    def __init__(self, conn, response):
+        self._conn = conn
+        self._response = response
+
+    def __iter__(self):
+        try:
+            for line in self._response:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        finally:
+            self._conn.close()
+
+    def close(self):
+        sock = self._conn.stream_sock
+        if sock is not None:
+            try:
+                # Unblocks a reader thread waiting on the stream
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._conn.close()
+
+def _demultiplex(data):
+    """Decode the stdout/stderr framed stream of a non-TTY exec into text."""
+    output = []
+    offset = 0
+    while offset + 8 <= len(data):
+        size = struct.unpack(">I", data[offset + 4:offset + 8])[0]
+        output.append(data[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    return b"".join(output).decode(errors="replace")
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Return a shared DockerClient, or None when the Engine API is not reachable
+    over a Unix socket (e.g. Docker Desktop on Windows); callers then fall back
+    to the docker CLI.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            path = socket_path_from_env()
+            if path is None or not os.path.exists(path):
+                return None
+            client = DockerClient(path)
+            if not client.ping():
+                return None
+            _client = client
+        return _client
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Static performance linter for n8n workflow exports
+
+Flags workflow patterns that cost throughput but only show up when reading the JSON:
+    debug-code-node       Code nodes that console.log every item
+    polling-interval      Triggers polling every minute
+    retrieval-overfetch   Vector store topK far above the reranker's topN
+    interpolated-sql      {{ }} expressions spliced into Postgres queries (no plan reuse)
+    dynamic-sql           Whole statements generated at runtime
+    leading-wildcard-like LIKE '%...' filters that can't use an index
+
+Each finding has a severity and an estimated cost. --fix applies the safe fixes:
+pass-through debug nodes are removed (their neighbours reconnected) and interpolated
+values become $N query parameters (see query_params.py).
+
+Usage:
+    python3 lint_workflows.py ../backup/workflows
+    python3 lint_workflows.py ../backup/workflows/V5_Multi_Tenant_RAG_Workflow_Debug.json --fix
+    python3 lint_workflows.py ../backup/workflows --fix -o /tmp/fixed --json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from migrate_workflows import find_inputs
+from query_params import has_interpolation, is_dynamic_sql, parameterize_query
+from workflow_graph import WorkflowGraph, load_export, save_export
+
+SEVERITIES = ("info", "warning", "error")
+
+Finding = namedtuple("Finding", "rule severity node message cost fixable")
+
+CODE_TYPES = ("n8n-nodes-base.code", "n8n-nodes-base.function", "n8n-nodes-base.functionItem")
+POSTGRES_TYPES = ("n8n-nodes-base.postgres", "n8n-nodes-base.postgresTool")
+VECTOR_STORE_PREFIX = "@n8n/n8n-nodes-langchain.vectorStore"
+
+# Polls per day for the pollTimes modes of n8n polling triggers
+POLLS_PER_DAY = {"everyMinute": 1440, "everyHour": 24, "everyDay": 1, "everyWeek": 1 / 7, "everyMonth": 1 / 30}
+MIN_POLL_MINUTES = 5
+# Retrieve at most this many candidates per reranked result
+OVERFETCH_RATIO = 3
+
+_CONSOLE = re.compile(r"console\.(log|info|debug|warn|error)\s*\(")
+_PASS_THROUGH = re.compile(r"^return\s+(\$input\.all\(\)|items|\$input\.item)\s*;?$")
+_LEADING_WILDCARD = re.compile(r"\bI?LIKE\s+'%", re.I)
+
+RULES = []
+FIXES = {}
+
+def rule(func):
+    RULES.append(func)
+    return func
+
+def fix(name):
+    def register(func):
+        FIXES[name] = func
+        return func
+    return register
+
+def _code(node):
+    parameters = node.get("parameters", {})
+    return parameters.get("jsCode") or parameters.get("functionCode") or ""
+
+def _is_pass_through(code):
+    """True if the code does nothing but log and return its input unchanged."""
+    statements = []
+    for line in re.sub(r"/\*.*?\*/", "", code, flags=re.S).splitlines():
+        line = line.split("//", 1)[0].strip()
+        if line and not _CONSOLE.match(line):
+            statements.append(line)
+    return len(statements) == 1 and bool(_PASS_THROUGH.match(statements[0]))
+
+def _referenced_elsewhere(graph, name):
+    """True if another node's expressions read this node's output by name."""
+    needles = (f"$('{name}')", f'$("{name}")', f"$node['{name}']", f'$node["{name}"]')
+    for node in graph:
+        if node["name"] != name:
+            text = json.dumps(node.get("parameters", {}), ensure_ascii=False)
+            if any(needle in text for needle in needles):
+                return True
+    return False
+
+# Rules
+
+@rule
+def debug_code_nodes(graph):
+    for node_type in CODE_TYPES:
+        for node in graph.nodes_of_type(node_type):
+            code = _code(node)
+            calls = len(_CONSOLE.findall(code))
+            if not calls:
+                continue
+            stringify = code.count("JSON.stringify")
+            cost = f"{calls} console call(s){f' + {stringify} JSON.stringify' if stringify else ''} per run"
+            if _is_pass_through(code):
+                removable = (
+                    len(graph.outgoing(node["name"])) == len(graph.outgoing(node["name"], "main"))
+                    and not _referenced_elsewhere(graph, node["name"])
+                )
+                yield Finding(
+                    "debug-code-node", "warning", node["name"],
+                    "pass-through debug node logging every run; adds a sandboxed JS step to the path",
+                    cost + ", plus one Code node execution", removable
+                )
+            else:
+                yield Finding(
+                    "debug-code-node", "info", node["name"],
+                    "Code node writes to the console; logs are serialized on every run",
+                    cost, False
+                )
+
+@rule
+def polling_interval(graph):
+    for node in graph:
+        for poll in node.get("parameters", {}).get("pollTimes", {}).get("item", []):
+            mode = poll.get("mode")
+            if mode == "everyX":
+                unit, value = poll.get("unit", "minutes"), int(poll.get("value") or 1)
+                minutes = value if unit == "minutes" else value * 60
+                polls = 1440 / minutes
+            elif mode == "custom" and str(poll.get("cronExpression", "")).split()[:1] in (["*"], ["0/1"]):
+                minutes, polls = 1, 1440
+            else:
+                polls = POLLS_PER_DAY.get(mode, 0)
+                minutes = 1440 / polls if polls else None
+            if minutes is not None and minutes < MIN_POLL_MINUTES:
+                yield Finding(
+                    "polling-interval", "warning", node["name"],
+                    f"polls every {minutes:g} minute(s); consider {MIN_POLL_MINUTES}+ minutes or a push trigger",
+                    f"~{polls:,.0f} trigger executions and API calls/day", False
+                )
+
+@rule
+def retrieval_overfetch(graph):
+    for node in graph:
+        if not node.get("type", "").startswith(VECTOR_STORE_PREFIX):
+            continue
+        parameters = node.get("parameters", {})
+        top_k = parameters.get("topK")
+        rerankers = [graph.node(edge.source) for edge in graph.incoming(node["name"], "ai_reranker")]
+        if not (isinstance(top_k, (int, float)) and rerankers and parameters.get("useReranker")):
+            continue
+        top_n = rerankers[0].get("parameters", {}).get("topN", 3)
+        if top_k > top_n * OVERFETCH_RATIO:
+            yield Finding(
+                "retrieval-overfetch", "warning", node["name"],
+                f"topK {top_k} feeds a reranker keeping {top_n}; topK {top_n * OVERFETCH_RATIO} is usually enough",
+                f"{top_k - top_n} of {top_k} chunks fetched and reranked per query are discarded "
+                f"({top_k / top_n:.1f}x topN)", False
+            )
+
+@rule
+def interpolated_sql(graph):
+    for node_type in POSTGRES_TYPES:
+        for node in graph.nodes_of_type(node_type):
+            parameters = node.get("parameters", {})
+            query = parameters.get("query") or ""
+            if not has_interpolation(query):
+                continue
+            if is_dynamic_sql(query):
+                yield Finding(
+                    "dynamic-sql", "info", node["name"],
+                    "the whole statement is generated at runtime and can't be prepared",
+                    "planned from scratch on every call", False
+                )
+                continue
+            try:
+                parameterize_query(query, parameters.get("options", {}).get("queryReplacement", ""))
+                fixable = True
+            except ValueError:
+                fixable = False
+            values = sorted(set(re.findall(r"\bjson\.(\w+)", query)))
+            yield Finding(
+                "interpolated-sql", "error", node["name"],
+                "values are spliced into the SQL text instead of bound as $N parameters",
+                f"one statement text (and plan) per distinct {', '.join(values) or 'value'}; unescaped input",
+                fixable
+            )
+
+@rule
+def leading_wildcard_like(graph):
+    for node_type in POSTGRES_TYPES:
+        for node in graph.nodes_of_type(node_type):
+            if _LEADING_WILDCARD.search(node.get("parameters", {}).get("query") or ""):
+                yield Finding(
+                    "leading-wildcard-like", "warning", node["name"],
+                    "LIKE with a leading % can't use a btree index",
+                    "sequential scan of the table on every run", False
+                )
+
+# Fixes
+
+@fix("debug-code-node")
+def remove_debug_node(graph, finding):
+    name = finding.node
+    incoming = graph.incoming(name, "main")
+    outgoing = graph.outgoing(name, "main")
+    for edge_in in incoming:
+        for edge_out in outgoing:
+            graph.connect(edge_in.source, edge_out.target, "main", edge_in.output, edge_out.index)
+    graph.remove_node(name)
+    return f"removed debug node {name}"
+
+@fix("interpolated-sql")
+def bind_query_parameters(graph, finding):
+    parameters = graph.node(finding.node)["parameters"]
+    options = parameters.setdefault("options", {})
+    parameters["query"], options["queryReplacement"] = parameterize_query(
+        parameters["query"], options.get("queryReplacement", "")
+    )
+    return f"parameterized query of {finding.node}"
+
+def lint_workflow(workflow):
+    """Return the findings for one workflow dict, most severe first."""
+    graph = WorkflowGraph(workflow)
+    findings = [finding for check in RULES for finding in check(graph)]
+    return sorted(findings, key=lambda f: -SEVERITIES.index(f.severity))
+
+def fix_workflow(workflow, findings):
+    """Apply the safe fixes for `findings` in place; returns descriptions of what changed."""
+    graph = WorkflowGraph(workflow)
+    return [FIXES[f.rule](graph, f) for f in findings if f.fixable and f.rule in FIXES]
+
+def lint_file(path, apply_fixes=False, output_path=None):
+    start = time.perf_counter()
+    result = {"path": path, "findings": [], "fixes": [], "error": None}
+    try:
+        workflows, wrapped = load_export(path)
+        for workflow in workflows:
+            findings = lint_workflow(workflow)
+            if apply_fixes:
+                result["fixes"].extend(fix_workflow(workflow, findings))
+                findings = [f for f in findings if not (f.fixable and f.rule in FIXES)]
+            result["findings"].extend(f._asdict() for f in findings)
+        if apply_fixes and (result["fixes"] or output_path != path):
+            save_export(output_path, workflows, wrapped)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def print_report(results, min_severity):
+    threshold = SEVERITIES.index(min_severity)
+    icons = {"error": "❌", "warning": "⚠️ ", "info": "ℹ️ "}
+    for result in results:
+        findings = [f for f in result["findings"] if SEVERITIES.index(f["severity"]) >= threshold]
+        if not (findings or result["fixes"] or result["error"]):
+            continue
+        print(f"\n{result['path']}")
+        if result["error"]:
+            print(f"  ❌ {result['error']}")
+        for finding in findings:
+            fixable = "  [fixable]" if finding["fixable"] else ""
+            print(f"  {icons[finding['severity']]} {finding['rule']:22} {finding['node']}{fixable}")
+            print(f"      {finding['message']}")
+            print(f"      cost: {finding['cost']}")
+        for description in result["fixes"]:
+            print(f"  🔧 {description}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Static performance linter for n8n workflow exports')
+    parser.add_argument('inputs', nargs='+', metavar='PATH',
+                        help='Workflow files, directories or glob patterns')
+    parser.add_argument('--fix', action='store_true',
+                        help='Apply safe fixes (in place unless --output-dir is given)')
+    parser.add_argument('-o', '--output-dir', help='Write fixed workflows here instead of in place')
+    parser.add_argument('--min-severity', choices=SEVERITIES, default='info',
+                        help='Hide findings below this severity (default: info)')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Worker processes for large directories (default: 1)')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='Also search subdirectories of directory inputs')
+    args = parser.parse_args()
+    if args.output_dir and not args.fix:
+        parser.error('--output-dir only applies with --fix')
+
+    inputs = find_inputs(args.inputs, args.recursive)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        outputs = [os.path.join(args.output_dir, os.path.basename(path)) for path in inputs]
+    else:
+        outputs = inputs
+    fixes = [args.fix] * len(inputs)
+
+    start = time.perf_counter()
+    if args.jobs <= 1 or len(inputs) <= 1:
+        results = list(map(lint_file, inputs, fixes, outputs))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(lint_file, inputs, fixes, outputs))
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_report(results, args.min_severity)
+        counts = {
+            severity: sum(1 for r in results for f in r["findings"] if f["severity"] == severity)
+            for severity in SEVERITIES
+        }
+        fixable = sum(1 for r in results for f in r["findings"] if f["fixable"])
+        print(f"\n{len(results)} file(s) in {elapsed:.2f}s: {counts['error']} error(s), "
+              f"{counts['warning']} warning(s), {counts['info']} info, "
+              f"{sum(len(r['fixes']) for r in results)} fixed"
+              + (f", {fixable} fixable with --fix" if fixable else ""))
+
+    if any(r["error"] for r in results) or any(
+        f["severity"] == "error" for r in results for f in r["findings"]
+    ):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
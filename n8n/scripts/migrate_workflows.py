@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Migrate n8n workflow exports from V4 to V5 in bulk
+
+Applies the rules of upgrade_workflow_to_v5.py to every workflow export matched by the
+given files, directories or glob patterns, in a process pool. Outputs are written
+atomically under --output-dir with the input file names. Only V4 RAG workflows are
+upgraded: workflows that already have the V5 tenant context are skipped, so a run can
+be repeated safely, and other workflows (tools, tests) are skipped as well.
+
+Usage:
+    python3 migrate_workflows.py ../backup/workflows -o /tmp/v5
+    python3 migrate_workflows.py '../backup/workflows/V5_*.json' ../../n8n-tool-workflows -o out --jobs 4
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from upgrade_workflow_to_v5 import skip_reason, upgrade_workflow
+from workflow_graph import load_export, save_export
+
+def find_inputs(patterns, recursive=False):
+    """Expand files, directories (their *.json files) and glob patterns, keeping order."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**" if recursive else "", "*.json"), recursive=recursive)
+        else:
+            matches = glob.glob(pattern, recursive=True) or [pattern]
+        for path in sorted(matches):
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def migrate_file(path, output_path, dry_run=False):
+    """
+    Upgrade every workflow in one export file.
+
+    Returns:
+        dict with status ("migrated", "skipped" or "failed"), node counts, number of
+        applied changes, wall-clock and CPU seconds taken and an error message on failure
+    """
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = {"path": path, "output": output_path, "nodes_before": 0, "nodes_after": 0, "changes": 0}
+    try:
+        workflows, wrapped = load_export(path)
+        if not all(isinstance(workflow, dict) and "nodes" in workflow for workflow in workflows):
+            result.update(status="skipped", error="not a workflow export")
+        else:
+            result["nodes_before"] = sum(len(workflow["nodes"]) for workflow in workflows)
+            reasons = [skip_reason(workflow) for workflow in workflows]
+            pending = [workflow for workflow, reason in zip(workflows, reasons) if reason is None]
+            for workflow in pending:
+                log = upgrade_workflow(workflow)
+                result["changes"] += sum(1 for line in log if line.startswith("✅"))
+            result["nodes_after"] = sum(len(workflow["nodes"]) for workflow in workflows)
+            if not pending:
+                result.update(status="skipped", error=reasons[0] if reasons else "empty export")
+            else:
+                if not dry_run:
+                    save_export(output_path, workflows, wrapped)
+                result["status"] = "migrated"
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = time.perf_counter() - start
+    # process_time() is per process, and each file runs entirely in one worker
+    result["cpu_seconds"] = time.process_time() - cpu_start
+    return result
+
+def print_summary(results, elapsed):
+    print(f"\n{'File':58} {'Status':9} {'Nodes':>9} {'Changes':>7} {'Time':>8}")
+    print("-" * 95)
+    for result in results:
+        nodes = f"{result['nodes_before']}→{result['nodes_after']}" if result["nodes_before"] else "-"
+        print(f"{os.path.basename(result['path'])[:58]:58} {result['status']:9} {nodes:>9} "
+              f"{result['changes']:>7} {result['seconds'] * 1000:>6.0f}ms")
+        if result.get("error"):
+            print(f"  {'❌' if result['status'] == 'failed' else '↷'} {result['error']}")
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("migrated", "skipped", "failed")}
+    print("-" * 95)
+    print(f"{counts['migrated']} migrated, {counts['skipped']} skipped, {counts['failed']} failed "
+          f"in {elapsed:.2f}s (CPU time {sum(r['cpu_seconds'] for r in results):.2f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate n8n workflow exports from V4 to V5 in bulk')
+    parser.add_argument('inputs', nargs='+', metavar='PATH',
+                        help='Workflow files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', required=True,
+                        help='Directory for the migrated workflows (file names are kept)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (default: number of CPUs)')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='Also search subdirectories of directory inputs')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Run the migration without writing any output')
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("❌ No workflow files matched")
+        sys.exit(1)
+    outputs = [os.path.join(args.output_dir, os.path.basename(path)) for path in inputs]
+    duplicates = {output for output in outputs if outputs.count(output) > 1}
+    if duplicates:
+        print(f"❌ Several inputs would be written to: {', '.join(sorted(duplicates))}")
+        sys.exit(1)
+    if not args.dry_run:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Migrating {len(inputs)} file(s) with {min(args.jobs, len(inputs))} worker(s)...")
+    start = time.perf_counter()
+    if args.jobs <= 1 or len(inputs) == 1:
+        results = [migrate_file(path, output, args.dry_run) for path, output in zip(inputs, outputs)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(inputs))) as pool:
+            results = list(pool.map(migrate_file, inputs, outputs, [args.dry_run] * len(inputs)))
+    print_summary(results, time.perf_counter() - start)
+
+    if any(result["status"] == "failed" for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Turn n8n expressions interpolated into Postgres node queries into query parameters
+
+A query like
+    WHERE tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}'
+produces a different statement text for every tenant, so Postgres can't reuse a plan
+(and the value is spliced into SQL unescaped). parameterize_query() rewrites it to
+    WHERE tenant_id = $1
+and returns the Query Parameters (options.queryReplacement) binding $1 to the
+expression. The bindings are emitted as one expression returning an array,
+    ={{ [ $('Set Tenant Context').item.json.tenant_id, ... ] }}
+which the Postgres node passes through as-is (a comma separated list would be split
+again on commas inside the values).
+"""
+
+import re
+
+_EXPRESSION = re.compile(r"\{\{\s*(.*?)\s*\}\}", re.S)
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+_SINGLE_EXPRESSION = re.compile(r"^=?\{\{\s*(.*?)\s*\}\}$", re.S)
+
+def has_interpolation(query):
+    return bool(_EXPRESSION.search(query or ""))
+
+def is_dynamic_sql(query):
+    """True when the whole statement comes from an expression (e.g. $fromAI('sql_query'))."""
+    return bool(_SINGLE_EXPRESSION.match((query or "").strip()))
+
+def replacement_values(replacement):
+    """
+    The expressions bound by an existing queryReplacement, in placeholder order.
+    Raises ValueError for forms this module doesn't rewrite (plain comma lists, ...).
+    """
+    if not replacement:
+        return []
+    text = replacement.strip()
+    match = _SINGLE_EXPRESSION.match(text)
+    if not match:
+        raise ValueError(f"unsupported queryReplacement {replacement!r}")
+    inner = match.group(1).strip()
+    if inner.startswith("[") and inner.endswith("]"):
+        return split_top_level(inner[1:-1])
+    return [inner]
+
+def split_top_level(text):
+    """Split a JS argument list on commas that are not nested in brackets or strings."""
+    parts, depth, quote, current = [], 0, None, ""
+    for char in text:
+        if quote:
+            if char == quote and not current.endswith("\\"):
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+def format_replacement(values):
+    return "={{ [" + ", ".join(values) + "] }}" if values else ""
+
+def _literal_expression(body):
+    """JS expression building the text of a quoted literal with embedded expressions."""
+    pieces = []
+    position = 0
+    for match in _EXPRESSION.finditer(body):
+        if match.start() > position:
+            pieces.append(_js_string(body[position:match.start()]))
+        pieces.append(f"String({match.group(1)})")
+        position = match.end()
+    if position < len(body):
+        pieces.append(_js_string(body[position:]))
+    if len(pieces) == 1:
+        return _EXPRESSION.fullmatch(body).group(1)
+    return " + ".join(pieces)
+
+def _js_string(text):
+    return "'" + text.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def _tokens(query):
+    """
+    Split a query into ("sql", text), ("literal", body) and ("expression", code) parts.
+    Quotes inside {{ }} belong to the expression, so bare {{ $('Node') }} is safe.
+    """
+    position, literal = 0, None
+    while position < len(query):
+        if query.startswith("{{", position):
+            end = query.find("}}", position)
+            if end < 0:
+                break
+            if literal is None:
+                yield "expression", query[position + 2:end].strip()
+            else:
+                literal += query[position:end + 2]
+            position = end + 2
+        elif query[position] == "'":
+            if literal is None:
+                literal = ""
+            elif query.startswith("''", position):
+                literal += "''"
+                position += 1
+            else:
+                yield "literal", literal
+                literal = None
+            position += 1
+        else:
+            if literal is None:
+                yield "sql", query[position]
+            else:
+                literal += query[position]
+            position += 1
+    rest = query[position:] if literal is None else "'" + literal + query[position:]
+    if rest:
+        yield "sql", rest
+
+def parameterize_query(query, replacement=""):
+    """
+    Replace interpolated expressions in `query` with $N placeholders.
+
+    Quoted literals ('{{ x }}', also '{{ a }}_v{{ b }}') become one text parameter,
+    bare {{ x }} one value parameter. Numbering continues after the placeholders the
+    query already uses, and the existing bindings are kept. Identical expressions share
+    a placeholder.
+
+    Returns:
+        (query, queryReplacement)
+    Raises:
+        ValueError if the query is dynamic SQL or the existing bindings can't be read
+    """
+    if is_dynamic_sql(query):
+        raise ValueError("the whole statement is an expression")
+    values = replacement_values(replacement)
+    used = [int(number) for number in _PLACEHOLDER.findall(query)]
+    if len(values) < max(used, default=0):
+        raise ValueError(f"query uses ${max(used)} but only {len(values)} parameter(s) are bound")
+    numbers = {}
+
+    def placeholder(expression):
+        if expression not in numbers:
+            values.append(expression)
+            numbers[expression] = len(values)
+        return f"${numbers[expression]}"
+
+    parts = []
+    for kind, text in _tokens(query):
+        if kind == "expression":
+            parts.append(placeholder(text))
+        elif kind == "literal" and has_interpolation(text):
+            parts.append(placeholder(_literal_expression(text)))
+        elif kind == "literal":
+            parts.append("'" + text + "'")
+        else:
+            parts.append(text)
+    return "".join(parts), format_replacement(values)
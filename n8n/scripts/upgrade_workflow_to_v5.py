@@ -2,41 +2,68 @@
 """
 Upgrade n8n RAG Workflow from V4 to V5
 Adds multi-tenancy, versioning, and JWT authentication
+
+The workflow is loaded once into a WorkflowGraph (workflow_graph.py). Node rules are
+looked up by node name in a single pass over the nodes; structural steps (new nodes,
+rerouted connections) work on the graph's indexes.
+
+Rewritten queries bind their values as $N query parameters (query_params.py) and end
+with a report of the Phase 1 index each of them can use.
+
+Usage:
+    python3 upgrade_workflow_to_v5.py [INPUT] [OUTPUT]
 """
 
-import json
+import argparse
+import re
+import sys
 import uuid
-from copy import deepcopy
-
-# Load the workflow
-with open('/root/local-ai-packaged/n8n/backup/workflows/V5_Live_RAG_Workflow.json', 'r') as f:
-    workflow_array = json.load(f)
-    workflow = workflow_array[0]  # Workflow is in an array
 
-print(f"Original workflow: {workflow['name']}")
-print(f"Node count: {len(workflow['nodes'])}")
+from query_params import format_replacement, parameterize_query, replacement_values
+from workflow_graph import WorkflowGraph, load_export, save_export
+
+DEFAULT_INPUT = '/root/local-ai-packaged/n8n/backup/workflows/V5_Live_RAG_Workflow.json'
+DEFAULT_OUTPUT = '/root/local-ai-packaged/n8n/backup/workflows/V5_Multi_Tenant_RAG_Workflow.json'
+
+TENANT_EXPRESSION = "$('Set Tenant Context').item.json.tenant_id"
+TENANT_ID = "{{ " + TENANT_EXPRESSION + " }}"
+USER_ID = "{{ $('Set Tenant Context').item.json.user_id }}"
+CREATED_BY = "{{ $('Set Tenant Context').item.json.created_by }}"
+
+POSTGRES_TYPES = ('n8n-nodes-base.postgres', 'n8n-nodes-base.postgresTool')
+
+# Indexes of the Phase 1 schema (n8n/docs/PHASE1_SCHEMA_DESIGN.md), most specific first
+PHASE1_INDEXES = {
+    'documents_pg': [
+        ('idx_documents_pg_tenant_file', ('tenant_id', "metadata->>'file_id'")),
+        ('idx_documents_pg_tenant', ('tenant_id',)),
+    ],
+    'document_metadata': [
+        ('document_metadata_pkey', ('id',)),
+        ('idx_metadata_type', ('tenant_id', 'document_type')),
+        ('idx_metadata_tenant', ('tenant_id',)),
+    ],
+    'document_rows': [
+        ('idx_rows_tenant_dataset', ('tenant_id', 'dataset_id')),
+        ('idx_rows_tenant', ('tenant_id',)),
+    ],
+    'document_versions': [
+        ('idx_versions_file', ('tenant_id', 'original_file_id')),
+        ('idx_versions_tenant', ('tenant_id',)),
+    ],
+}
 
-# Update workflow metadata
-workflow['name'] = "LeadingAI RAG AI Agent V5 - Multi-Tenant"
-workflow['id'] = None  # Let n8n assign new ID on import
-workflow['active'] = False  # Start inactive for testing
+POSTGRES_CREDENTIALS = {"postgres": {"id": "AhhYBO8MS8JX6Lew", "name": "Postgres account"}}
 
 # Helper function to generate new node IDs
 def new_id():
     return str(uuid.uuid4())
 
 # ==============================================================================
-# STEP 1: ADD JWT VALIDATION AND TENANT CONTEXT NODES
+# STEP 1: JWT VALIDATION AND TENANT CONTEXT NODES
 # ==============================================================================
 
-# Find the Webhook and Chat Trigger nodes
-webhook_node = next((n for n in workflow['nodes'] if n['name'] == 'Webhook'), None)
-chat_trigger_node = next((n for n in workflow['nodes'] if n['name'] == 'When chat message received'), None)
-
-# JWT Validation Function Node
-jwt_validation_node = {
-    "parameters": {
-        "jsCode": """// JWT Validation and Tenant Extraction
+JWT_VALIDATION_CODE = """// JWT Validation and Tenant Extraction
 // Extract JWT from Authorization header
 const authHeader = $input.item.json.headers?.authorization ||
                    $input.item.json.headers?.Authorization ||
@@ -114,260 +141,253 @@ try {
     }];
 }
 """
-    },
-    "id": new_id(),
-    "name": "JWT Validate & Extract Tenant",
-    "type": "n8n-nodes-base.code",
-    "typeVersion": 2,
-    "position": [-80, -1184] if webhook_node else [32, -1184],
-    "notes": "Validates JWT and extracts tenant_id, user_id, and role for multi-tenant isolation"
-}
-
-# Tenant Context Set Node
-tenant_context_node = {
-    "parameters": {
-        "assignments": {
-            "assignments": [
-                {
-                    "id": new_id(),
-                    "name": "tenant_id",
-                    "value": "={{ $json.tenant_id }}",
-                    "type": "string"
-                },
-                {
-                    "id": new_id(),
-                    "name": "user_id",
-                    "value": "={{ $json.user_id }}",
-                    "type": "string"
-                },
-                {
-                    "id": new_id(),
-                    "name": "created_by",
-                    "value": "={{ $json.email }}",
-                    "type": "string"
-                },
-                {
-                    "id": new_id(),
-                    "name": "role",
-                    "value": "={{ $json.role }}",
-                    "type": "string"
-                }
-            ]
-        },
-        "options": {}
-    },
-    "id": new_id(),
-    "name": "Set Tenant Context",
-    "type": "n8n-nodes-base.set",
-    "typeVersion": 3.4,
-    "position": [80, -1184] if webhook_node else [192, -1184],
-    "notes": "Sets tenant context variables accessible throughout workflow"
-}
-
-# Add new nodes to workflow
-workflow['nodes'].extend([jwt_validation_node, tenant_context_node])
 
-print(f"✅ Added JWT validation and tenant context nodes")
-
-# ==============================================================================
-# STEP 2: UPDATE CONNECTIONS - Insert JWT nodes in flow
-# ==============================================================================
-
-# Store JWT validation node ID for connections
-jwt_node_name = jwt_validation_node['name']
-tenant_node_name = tenant_context_node['name']
-
-# Update webhook connection to go through JWT validation first
-if 'Edit Fields' in workflow['connections']:
-    # Webhook/Chat -> JWT -> Tenant Context -> Edit Fields
-    workflow['connections'][jwt_node_name] = {
-        "main": [[{"node": tenant_node_name, "type": "main", "index": 0}]]
+def jwt_validation_node(has_webhook):
+    return {
+        "parameters": {"jsCode": JWT_VALIDATION_CODE},
+        "id": new_id(),
+        "name": "JWT Validate & Extract Tenant",
+        "type": "n8n-nodes-base.code",
+        "typeVersion": 2,
+        "position": [-80, -1184] if has_webhook else [32, -1184],
+        "notes": "Validates JWT and extracts tenant_id, user_id, and role for multi-tenant isolation"
     }
-    workflow['connections'][tenant_node_name] = {
-        "main": [[{"node": "Edit Fields", "type": "main", "index": 0}]]
+
+def tenant_context_node(has_webhook):
+    return {
+        "parameters": {
+            "assignments": {
+                "assignments": [
+                    {"id": new_id(), "name": "tenant_id", "value": "={{ $json.tenant_id }}", "type": "string"},
+                    {"id": new_id(), "name": "user_id", "value": "={{ $json.user_id }}", "type": "string"},
+                    {"id": new_id(), "name": "created_by", "value": "={{ $json.email }}", "type": "string"},
+                    {"id": new_id(), "name": "role", "value": "={{ $json.role }}", "type": "string"},
+                ]
+            },
+            "options": {}
+        },
+        "id": new_id(),
+        "name": "Set Tenant Context",
+        "type": "n8n-nodes-base.set",
+        "typeVersion": 3.4,
+        "position": [80, -1184] if has_webhook else [192, -1184],
+        "notes": "Sets tenant context variables accessible throughout workflow"
     }
 
-    # Update Webhook and Chat Trigger to connect to JWT node
-    if 'Webhook' in workflow['connections']:
-        workflow['connections']['Webhook']['main'][0] = [
-            {"node": jwt_node_name, "type": "main", "index": 0}
-        ]
-    if 'When chat message received' in workflow['connections']:
-        workflow['connections']['When chat message received']['main'][0] = [
-            {"node": jwt_node_name, "type": "main", "index": 0}
-        ]
+def add_tenant_context(graph, log):
+    """Add the JWT and tenant context nodes and route both triggers through them."""
+    has_webhook = 'Webhook' in graph
+    jwt_node = graph.add_node(jwt_validation_node(has_webhook))
+    tenant_node = graph.add_node(tenant_context_node(has_webhook))
+    log.append("✅ Added JWT validation and tenant context nodes")
 
-print(f"✅ Updated connections to route through JWT validation")
+    # Webhook/Chat -> JWT -> Tenant Context -> Edit Fields
+    if graph.outgoing('Edit Fields'):
+        graph.connect(jwt_node['name'], tenant_node['name'])
+        graph.connect(tenant_node['name'], 'Edit Fields')
+        for trigger in ('Webhook', 'When chat message received'):
+            if graph.outgoing(trigger, 'main'):
+                graph.redirect(trigger, jwt_node['name'])
+    log.append("✅ Updated connections to route through JWT validation")
 
 # ==============================================================================
-# STEP 3: UPDATE ALL DATABASE QUERY NODES WITH TENANT FILTERING
+# STEPS 3-4: NODE RULES (tenant filtering, soft-delete)
 # ==============================================================================
-
-def add_tenant_filter_to_query(query, tenant_var="={{ $('Set Tenant Context').item.json.tenant_id }}"):
-    """Add tenant_id filter to SQL queries"""
-    if 'WHERE' in query.upper():
+# Queries are written with {{ }} expressions for readability and stored as
+# parameterized SQL: the expressions become $N placeholders bound through the node's
+# Query Parameters (options.queryReplacement), so every tenant shares one statement
+# text and one plan, and no value is spliced into the SQL.
+
+def bind_query(node, query):
+    """Store `query` on a Postgres node with its expressions bound as $N parameters."""
+    options = node['parameters'].setdefault('options', {})
+    node['parameters']['query'], replacement = parameterize_query(query, options.get('queryReplacement', ''))
+    if replacement:
+        options['queryReplacement'] = replacement
+
+def skip_unless_postgres(node):
+    """Log line for SQL rules matching a node that isn't a Postgres node (e.g. Supabase)."""
+    if node['type'] not in POSTGRES_TYPES:
+        return f"⚠️  Skipped: {node['name']} is a {node['type']} node, not Postgres"
+
+def add_tenant_filter_to_query(query, replacement=""):
+    """
+    Add a bound tenant_id filter to an SQL query.
+
+    Returns:
+        (query, queryReplacement) with the tenant bound as the next $N parameter
+    """
+    values = replacement_values(replacement) + [TENANT_EXPRESSION]
+    condition = f"tenant_id = ${len(values)}"
+    body = query.rstrip()
+    terminator = ';' if body.endswith(';') else ''
+    body = body.rstrip(';')
+    tail = re.search(r"\s(GROUP BY|ORDER BY|LIMIT)\b", body, re.I)
+    head, tail = (body[:tail.start()], body[tail.start():]) if tail else (body, '')
+    where = re.search(r"\bWHERE\b", head, re.I)
+    if where:
         # Add to existing WHERE clause
-        return query.replace('WHERE', f"WHERE tenant_id = '{tenant_var}' AND (")+ ')'
+        head = f"{head[:where.end()]} {condition} AND ({head[where.end():].strip()})"
     else:
-        # Add new WHERE clause before GROUP BY, ORDER BY, or at end
-        for keyword in [' GROUP BY', ' ORDER BY', ' LIMIT', ';']:
-            if keyword in query.upper():
-                return query.replace(keyword, f" WHERE tenant_id = '{tenant_var}'" + keyword)
-        return query + f" WHERE tenant_id = '{tenant_var}'"
-
-# Update Postgres Vector Store (RAG tool)
-for node in workflow['nodes']:
-    if node['name'] == 'Postgres PGVector Store':
-        # Add tenant filter to vector store retrieval
-        if 'options' not in node['parameters']:
-            node['parameters']['options'] = {}
-        node['parameters']['options']['filter'] = {
-            "tenant_id": "={{ $('Set Tenant Context').item.json.tenant_id }}"
-        }
-        node['notes'] = "RAG retrieval with tenant isolation"
-        print(f"✅ Updated: {node['name']} with tenant filter")
-
-# Update List Documents Tool
-for node in workflow['nodes']:
-    if node['name'] == 'List Documents':
-        # This is a SELECT query, add WHERE tenant_id = ...
-        if 'options' not in node['parameters']:
-            node['parameters']['options'] = {}
-        node['parameters']['options']['additionalWhereClause'] = "tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}' AND is_deleted = FALSE"
-        node['notes'] = "Lists documents for current tenant only"
-        print(f"✅ Updated: {node['name']} with tenant filter")
-
-# Update Get File Contents Tool
-for node in workflow['nodes']:
-    if node['name'] == 'Get File Contents':
-        # Update query to include tenant_id
-        original_query = node['parameters']['query']
-        node['parameters']['query'] = """SELECT
+        head = f"{head} WHERE {condition}"
+    return head + tail + terminator, format_replacement(values)
+
+def filter_vector_store(graph, node):
+    # Add tenant filter to vector store retrieval
+    node['parameters'].setdefault('options', {})['filter'] = {"tenant_id": "=" + TENANT_ID}
+    node['notes'] = "RAG retrieval with tenant isolation"
+    return f"✅ Updated: {node['name']} with tenant filter"
+
+def filter_list_documents(graph, node):
+    # Select conditions are sent as bound parameters by the Postgres node
+    node['parameters']['where'] = {
+        "values": [
+            {"column": "tenant_id", "value": "=" + TENANT_ID},
+            {"column": "is_deleted", "value": "false"},
+        ]
+    }
+    node['notes'] = "Lists documents for current tenant only"
+    return f"✅ Updated: {node['name']} with tenant filter"
+
+def filter_get_file_contents(graph, node):
+    skipped = skip_unless_postgres(node)
+    if skipped:
+        return skipped
+    bind_query(node, f"""SELECT
     string_agg(text, ' ') as document_text
 FROM documents_pg
-WHERE tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}'
+WHERE tenant_id = {TENANT_ID}
   AND is_deleted = FALSE
   AND metadata->>'file_id' = $1
-GROUP BY metadata->>'file_id';"""
-        node['notes'] = "Gets file contents with tenant isolation"
-        print(f"✅ Updated: {node['name']} with tenant filter")
+GROUP BY metadata->>'file_id';""")
+    node['notes'] = "Gets file contents with tenant isolation"
+    return f"✅ Updated: {node['name']} with tenant filter"
 
-# Update Query Document Rows Tool
-for node in workflow['nodes']:
-    if node['name'] == 'Query Document Rows':
-        # Update description to mention tenant filtering requirement
-        node['parameters']['toolDescription'] = """Run a SQL query - use this to query from the document_rows table once you know the file ID you are querying.
+def describe_query_document_rows(graph, node):
+    # The statement comes from the model; the tenant is still bound as $1
+    node['parameters']['toolDescription'] = """Run a SQL query - use this to query from the document_rows table once you know the file ID you are querying.
 
-IMPORTANT: Always include tenant_id filter:
-WHERE tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}' AND dataset_id = 'file_id' AND is_deleted = FALSE
+IMPORTANT: Always include the tenant filter exactly as written, with the $1 placeholder:
+WHERE tenant_id = $1 AND dataset_id = 'file_id' AND is_deleted = FALSE
 
 dataset_id is the file_id and you are always using the row_data for filtering, which is a jsonb field.
 
 Example query:
 SELECT AVG((row_data->>'revenue')::numeric)
 FROM document_rows
-WHERE tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}'
+WHERE tenant_id = $1
   AND dataset_id = '123'
   AND is_deleted = FALSE;"""
-        print(f"✅ Updated: {node['name']} tool description for tenant filtering")
-
-# Update Insert Document Metadata
-for node in workflow['nodes']:
-    if node['name'] == 'Insert Document Metadata':
-        # Add tenant_id, user_id, created_by columns
-        columns = node['parameters']['columns']['value']
-        columns['tenant_id'] = "={{ $('Set Tenant Context').item.json.tenant_id }}"
-        columns['user_id'] = "={{ $('Set Tenant Context').item.json.user_id }}"
-        columns['created_by'] = "={{ $('Set Tenant Context').item.json.created_by }}"
-        columns['version_number'] = "=1"
-        columns['is_current'] = "=TRUE"
-        columns['processing_status'] = "=completed"
-        print(f"✅ Updated: {node['name']} with tenant columns")
-
-# Update Insert Table Rows
-for node in workflow['nodes']:
-    if node['name'] == 'Insert Table Rows':
-        columns = node['parameters']['columns']['value']
-        columns['tenant_id'] = "={{ $('Set Tenant Context').item.json.tenant_id }}"
-        columns['user_id'] = "={{ $('Set Tenant Context').item.json.user_id }}"
-        columns['created_by'] = "={{ $('Set Tenant Context').item.json.created_by }}"
-        print(f"✅ Updated: {node['name']} with tenant columns")
-
-# Update Update Schema for Document Metadata
-for node in workflow['nodes']:
-    if node['name'] == 'Update Schema for Document Metadata':
-        columns = node['parameters']['columns']['value']
-        if 'tenant_id' not in columns:
-            columns['tenant_id'] = "={{ $('Set Tenant Context').item.json.tenant_id }}"
-        print(f"✅ Updated: {node['name']} with tenant_id")
-
-# ==============================================================================
-# STEP 4: CONVERT DELETE NODES TO SOFT-DELETE
-# ==============================================================================
-
-# Update Delete Old Data Rows -> Soft Delete Documents
-for node in workflow['nodes']:
-    if node['name'] == 'Delete Old Data Rows':
-        node['name'] = 'Soft Delete Old Documents'
-        node['parameters']['query'] = """SELECT soft_delete_document(
-    '{{ $('Set Tenant Context').item.json.tenant_id }}',
-    $1,
-    '{{ $('Set Tenant Context').item.json.created_by }}'
-);"""
-        node['notes'] = "Soft-deletes old document (preserves history)"
-        print(f"✅ Converted: Delete Old Data Rows -> Soft Delete")
-
-# Update Delete Old Doc Rows
-for node in workflow['nodes']:
-    if node['name'] == 'Delete Old Doc Rows':
-        node['name'] = 'Soft Delete Old Document Rows'
-        node['parameters']['query'] = """UPDATE document_rows
+    node['parameters'].setdefault('options', {})['queryReplacement'] = format_replacement([TENANT_EXPRESSION])
+    return f"✅ Updated: {node['name']} tool description for tenant filtering"
+
+def tenant_columns(graph, node):
+    columns = node['parameters']['columns']['value']
+    columns['tenant_id'] = "=" + TENANT_ID
+    columns['user_id'] = "=" + USER_ID
+    columns['created_by'] = "=" + CREATED_BY
+    return f"✅ Updated: {node['name']} with tenant columns"
+
+def versioned_tenant_columns(graph, node):
+    message = tenant_columns(graph, node)
+    columns = node['parameters']['columns']['value']
+    columns['version_number'] = "=1"
+    columns['is_current'] = "=TRUE"
+    columns['processing_status'] = "=completed"
+    return message
+
+def schema_tenant_column(graph, node):
+    node['parameters']['columns']['value'].setdefault('tenant_id', "=" + TENANT_ID)
+    return f"✅ Updated: {node['name']} with tenant_id"
+
+def soft_delete_document(new_name, file_id, deleted_by, notes=None):
+    """Rule replacing a delete by a soft_delete_document() call."""
+    def rule(graph, node):
+        skipped = skip_unless_postgres(node)
+        if skipped:
+            return skipped
+        old_name = node['name']
+        graph.rename(old_name, new_name)
+        bind_query(node, f"""SELECT soft_delete_document(
+    {TENANT_ID},
+    {file_id},
+    {deleted_by}
+);""")
+        if notes:
+            node['notes'] = notes
+        return f"✅ Converted: {old_name} -> Soft Delete"
+    return rule
+
+def soft_delete_rows(new_name, deleted_by, notes=None):
+    """Rule replacing a document_rows delete by an is_deleted update."""
+    def rule(graph, node):
+        skipped = skip_unless_postgres(node)
+        if skipped:
+            return skipped
+        old_name = node['name']
+        graph.rename(old_name, new_name)
+        # dataset_id holds the file id itself, so equality can use (tenant_id, dataset_id)
+        bind_query(node, f"""UPDATE document_rows
 SET is_deleted = TRUE,
     deleted_at = NOW(),
-    deleted_by = '{{ $('Set Tenant Context').item.json.created_by }}'
-WHERE tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}'
-  AND dataset_id LIKE '%' || $1 || '%';"""
-        node['notes'] = "Soft-deletes document rows"
-        print(f"✅ Converted: Delete Old Doc Rows -> Soft Delete")
-
-# Update cleanup flow DELETE nodes
-for node in workflow['nodes']:
-    if node['name'] == 'Delete Old Data Rows1':
-        node['name'] = 'Soft Delete Old Documents (Cleanup)'
-        node['parameters']['query'] = """SELECT soft_delete_document(
-    '{{ $('Set Tenant Context').item.json.tenant_id }}',
-    $1,
-    'system_cleanup'
-);"""
-        print(f"✅ Converted: Delete Old Data Rows1 -> Soft Delete")
-
-    if node['name'] == 'Delete Old Doc Rows1':
-        node['name'] = 'Soft Delete Old Doc Rows (Cleanup)'
-        node['parameters']['query'] = """UPDATE document_rows
-SET is_deleted = TRUE,
-    deleted_at = NOW(),
-    deleted_by = 'system_cleanup'
-WHERE tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}'
-  AND dataset_id LIKE '%' || $1 || '%';"""
-        print(f"✅ Converted: Delete Old Doc Rows1 -> Soft Delete")
-
-    if node['name'] == 'Delete Metadata':
-        node['name'] = 'Soft Delete Metadata (Cleanup)'
-        node['parameters']['query'] = """SELECT soft_delete_document(
-    '{{ $('Set Tenant Context').item.json.tenant_id }}',
-    '{{ $('Parse Trashed Files').first().json.file_id }}',
-    'system_cleanup'
-);"""
-        print(f"✅ Converted: Delete Metadata -> Soft Delete")
+    deleted_by = {deleted_by}
+WHERE tenant_id = {TENANT_ID}
+  AND dataset_id = $1
+  AND is_deleted = FALSE;""")
+        if notes:
+            node['notes'] = notes
+        return f"✅ Converted: {old_name} -> Soft Delete"
+    return rule
+
+# Node name -> rule(graph, node) returning a log line
+NODE_RULES = {
+    'Postgres PGVector Store': filter_vector_store,
+    'List Documents': filter_list_documents,
+    'Get File Contents': filter_get_file_contents,
+    'Query Document Rows': describe_query_document_rows,
+    'Insert Document Metadata': versioned_tenant_columns,
+    'Insert Table Rows': tenant_columns,
+    'Update Schema for Document Metadata': schema_tenant_column,
+    'Delete Old Data Rows': soft_delete_document(
+        'Soft Delete Old Documents', "$1", CREATED_BY,
+        notes="Soft-deletes old document (preserves history)"
+    ),
+    'Delete Old Doc Rows': soft_delete_rows(
+        'Soft Delete Old Document Rows', CREATED_BY, notes="Soft-deletes document rows"
+    ),
+    'Delete Old Data Rows1': soft_delete_document(
+        'Soft Delete Old Documents (Cleanup)', "$1", "'system_cleanup'"
+    ),
+    'Delete Old Doc Rows1': soft_delete_rows('Soft Delete Old Doc Rows (Cleanup)', "'system_cleanup'"),
+    'Delete Metadata': soft_delete_document(
+        'Soft Delete Metadata (Cleanup)', "{{ $('Parse Trashed Files').first().json.file_id }}",
+        "'system_cleanup'"
+    ),
+}
+
+def apply_node_rules(graph, log):
+    """
+    Run the rule of every node that has one, in a single pass over the nodes.
+
+    Returns:
+        names of the Postgres nodes whose query or conditions were rewritten
+    """
+    rewritten = []
+    for node in graph:
+        rule = NODE_RULES.get(node['name'])
+        if rule:
+            before = (node['parameters'].get('query'), node['parameters'].get('where'))
+            log.append(rule(graph, node))
+            after = (node['parameters'].get('query'), node['parameters'].get('where'))
+            if node['type'] in POSTGRES_TYPES and after != before:
+                rewritten.append(node['name'])
+    return rewritten
 
 # ==============================================================================
-# STEP 5: ADD VERSION DETECTION LOGIC
+# STEP 5: VERSION DETECTION NODES
 # ==============================================================================
 
-# Add Content Hash Calculation Node (after Download File, before processing)
-content_hash_node = {
-    "parameters": {
-        "jsCode": """// Calculate SHA-256 hash of document content
+CONTENT_HASH_CODE = """// Calculate SHA-256 hash of document content
 const crypto = require('crypto');
 
 const binaryData = $input.first().binary?.data;
@@ -391,147 +411,237 @@ return [{
     binary: $input.first().binary
 }];
 """
-    },
-    "id": new_id(),
-    "name": "Calculate Content Hash",
-    "type": "n8n-nodes-base.code",
-    "typeVersion": 2,
-    "position": [240, -496],
-    "notes": "Calculates SHA-256 hash for version detection"
-}
 
-# Add Version Check Node
-version_check_node = {
-    "parameters": {
-        "operation": "executeQuery",
-        "query": """SELECT
+def version_detection_nodes():
+    # Calculate Content Hash (after Download File, before processing)
+    content_hash_node = {
+        "parameters": {"jsCode": CONTENT_HASH_CODE},
+        "id": new_id(),
+        "name": "Calculate Content Hash",
+        "type": "n8n-nodes-base.code",
+        "typeVersion": 2,
+        "position": [240, -496],
+        "notes": "Calculates SHA-256 hash for version detection"
+    }
+
+    version_check_node = {
+        "parameters": {"operation": "executeQuery", "options": {}},
+        "id": new_id(),
+        "name": "Check Existing Version",
+        "type": "n8n-nodes-base.postgres",
+        "typeVersion": 2.5,
+        "position": [448, -496],
+        "credentials": POSTGRES_CREDENTIALS,
+        "continueOnFail": True,
+        "notes": "Checks if document exists and retrieves current version"
+    }
+    bind_query(version_check_node, f"""SELECT
     id,
     version_number,
     content_hash,
     is_current
 FROM document_metadata
-WHERE tenant_id = '{{ $('Set Tenant Context').item.json.tenant_id }}'
-  AND id = '{{ $('Set File ID').item.json.file_id }}'
+WHERE tenant_id = {TENANT_ID}
+  AND id = {{{{ $('Set File ID').item.json.file_id }}}}
   AND is_deleted = FALSE
 ORDER BY version_number DESC
-LIMIT 1;""",
-        "options": {}
-    },
-    "id": new_id(),
-    "name": "Check Existing Version",
-    "type": "n8n-nodes-base.postgres",
-    "typeVersion": 2.5,
-    "position": [448, -496],
-    "credentials": {"postgres": {"id": "AhhYBO8MS8JX6Lew", "name": "Postgres account"}},
-    "continueOnFail": True,
-    "notes": "Checks if document exists and retrieves current version"
-}
-
-# Add Version Decision Node (IF node)
-version_decision_node = {
-    "parameters": {
-        "conditions": {
-            "options": {
-                "caseSensitive": True,
-                "leftValue": "",
-                "typeValidation": "strict",
-                "version": 1
-            },
-            "conditions": [
-                {
-                    "id": new_id(),
-                    "leftValue": "={{ $('Check Existing Version').item.json.content_hash }}",
-                    "rightValue": "={{ $('Calculate Content Hash').item.json.content_hash }}",
-                    "operator": {
-                        "type": "string",
-                        "operation": "notEquals",
-                        "name": "filter.operator.notEquals"
+LIMIT 1;""")
+
+    version_decision_node = {
+        "parameters": {
+            "conditions": {
+                "options": {
+                    "caseSensitive": True,
+                    "leftValue": "",
+                    "typeValidation": "strict",
+                    "version": 1
+                },
+                "conditions": [
+                    {
+                        "id": new_id(),
+                        "leftValue": "={{ $('Check Existing Version').item.json.content_hash }}",
+                        "rightValue": "={{ $('Calculate Content Hash').item.json.content_hash }}",
+                        "operator": {
+                            "type": "string",
+                            "operation": "notEquals",
+                            "name": "filter.operator.notEquals"
+                        }
                     }
-                }
-            ],
-            "combinator": "and"
+                ],
+                "combinator": "and"
+            },
+            "options": {}
         },
-        "options": {}
-    },
-    "id": new_id(),
-    "name": "Content Changed?",
-    "type": "n8n-nodes-base.if",
-    "typeVersion": 2,
-    "position": [640, -496],
-    "notes": "Checks if content hash has changed (new version)"
-}
+        "id": new_id(),
+        "name": "Content Changed?",
+        "type": "n8n-nodes-base.if",
+        "typeVersion": 2,
+        "position": [640, -496],
+        "notes": "Checks if content hash has changed (new version)"
+    }
 
-# Add Create Version Node
-create_version_node = {
-    "parameters": {
-        "operation": "executeQuery",
-        "query": """SELECT create_document_version(
-    '{{ $('Set Tenant Context').item.json.tenant_id }}',
-    '{{ $('Set File ID').item.json.file_id }}',
-    '{{ $('Set File ID').item.json.file_id }}_v{{ $('Check Existing Version').item.json.version_number + 1 }}',
-    '{{ $('Calculate Content Hash').item.json.content_hash }}',
-    '{{ $('Set Tenant Context').item.json.created_by }}',
+    create_version_node = {
+        "parameters": {"operation": "executeQuery", "options": {}},
+        "id": new_id(),
+        "name": "Create New Version",
+        "type": "n8n-nodes-base.postgres",
+        "typeVersion": 2.5,
+        "position": [832, -560],
+        "credentials": POSTGRES_CREDENTIALS,
+        "notes": "Creates new document version if content changed"
+    }
+    bind_query(create_version_node, f"""SELECT create_document_version(
+    {TENANT_ID},
+    {{{{ $('Set File ID').item.json.file_id }}}},
+    '{{{{ $('Set File ID').item.json.file_id }}}}_v{{{{ $('Check Existing Version').item.json.version_number + 1 }}}}',
+    {{{{ $('Calculate Content Hash').item.json.content_hash }}}},
+    {CREATED_BY},
     'Document updated via workflow'
-) as new_version_number;""",
-        "options": {}
-    },
-    "id": new_id(),
-    "name": "Create New Version",
-    "type": "n8n-nodes-base.postgres",
-    "typeVersion": 2.5,
-    "position": [832, -560],
-    "credentials": {"postgres": {"id": "AhhYBO8MS8JX6Lew", "name": "Postgres account"}},
-    "notes": "Creates new document version if content changed"
-}
-
-# Add nodes to workflow
-workflow['nodes'].extend([
-    content_hash_node,
-    version_check_node,
-    version_decision_node,
-    create_version_node
-])
-
-print(f"✅ Added version detection nodes")
+) as new_version_number;""")
+    return [content_hash_node, version_check_node, version_decision_node, create_version_node]
+
+def add_version_detection(graph, log):
+    """
+    Returns:
+        names of the added Postgres nodes
+    """
+    nodes = version_detection_nodes()
+    for node in nodes:
+        graph.add_node(node)
+    log.append("✅ Added version detection nodes")
+    # Download File -> Calculate Content Hash -> Check Existing Version -> Content Changed? -> Switch
+    # is left to the n8n UI, as the branch layout differs between workflow variants
+    log.append("⚠️  Note: Version detection nodes added but connections need manual adjustment in n8n UI")
+    return [node['name'] for node in nodes if node['type'] in POSTGRES_TYPES]
 
 # ==============================================================================
-# STEP 6: UPDATE CONNECTIONS FOR VERSION DETECTION
+# STEP 6: INDEX REPORT
 # ==============================================================================
 
-# Insert version detection in the flow:
-# Download File -> Calculate Content Hash -> Check Existing Version -> Content Changed? -> Switch
-# If changed: Create New Version -> Switch
-# If not changed: Skip to Switch
-
-# Update connections (this is complex, would need detailed connection mapping)
-# For now, add note that manual connection adjustment may be needed
-
-print(f"⚠️  Note: Version detection nodes added but connections need manual adjustment in n8n UI")
+_TABLE = re.compile(r"\b(?:FROM|UPDATE|INTO)\s+(?:public\.)?(\w+)", re.I)
+_FUNCTION_CALL = re.compile(r"^\s*SELECT\s+(\w+)\s*\(", re.I)
+_BOUND_EQUALITY = re.compile(r"(\w+(?:->>'\w+')?)\s*=\s*\$\d+")
+
+def _parameter_value(value):
+    return value.get('value') if isinstance(value, dict) else value
+
+def index_for(table, columns):
+    """The first Phase 1 index of `table` whose leading columns all have equality conditions."""
+    for name, index_columns in PHASE1_INDEXES.get(table, []):
+        if all(column in columns for column in index_columns):
+            return name, index_columns
+    return None
+
+def index_usage(node):
+    """One line saying which index the lookup of a Postgres node can use."""
+    parameters = node['parameters']
+    if parameters.get('operation') == 'executeQuery':
+        query = parameters.get('query', '')
+        function = _FUNCTION_CALL.match(query)
+        if function and not _TABLE.search(query):
+            return "  " + f"ℹ️  {node['name']}: calls {function.group(1)}(), its lookups are planned inside the function"
+        table = _TABLE.search(query)
+        table = table.group(1) if table else None
+        columns = set(_BOUND_EQUALITY.findall(query))
+    else:
+        table = _parameter_value(parameters.get('table'))
+        conditions = parameters.get('where', {}).get('values', [])
+        columns = {c['column'] for c in conditions if c.get('condition', 'equal') == 'equal'}
+    index = index_for(table, columns)
+    if not index:
+        return "  " + f"⚠️  {node['name']}: no Phase 1 index on {table} matches, sequential scan"
+    return "  " + f"✅ {node['name']}: {table} via {index[0]} ({', '.join(index[1])})"
+
+def report_index_usage(graph, names, log):
+    log.append("📇 Index usage of the rewritten queries:")
+    for name in names:
+        log.append(index_usage(graph.node(name)))
 
 # ==============================================================================
-# STEP 7: UPDATE METADATA AND SAVE
+# PIPELINE
 # ==============================================================================
 
-workflow['updatedAt'] = None  # Reset to let n8n set
-del workflow['createdAt']  # Remove to avoid conflicts
-
-# Update node count
-print(f"\nFinal node count: {len(workflow['nodes'])}")
-
-# Save modified workflow
-output_path = '/root/local-ai-packaged/n8n/backup/workflows/V5_Multi_Tenant_RAG_Workflow.json'
-with open(output_path, 'w') as f:
-    json.dump([workflow], f, indent=2)
-
-print(f"\n✅ Workflow upgraded successfully!")
-print(f"📁 Saved to: {output_path}")
-print(f"\n📊 Summary:")
-print(f"  - Added 6 new nodes (JWT, tenant context, versioning)")
-print(f"  - Updated 8+ database query nodes with tenant filtering")
-print(f"  - Converted 5 DELETE nodes to soft-delete")
-print(f"  - Added version detection logic")
-print(f"\n🚀 Next steps:")
-print(f"  1. Import workflow into n8n")
-print(f"  2. Manually adjust version detection connections")
-print(f"  3. Update Postgres PGVector Store credentials")
-print(f"  4. Test with sample documents")
+# Nodes of the V3/V4 RAG workflows the upgrade hooks into
+RAG_ANCHORS = ('Edit Fields', 'Set File ID', 'Postgres PGVector Store')
+
+def skip_reason(workflow):
+    """
+    Why `workflow` must not be upgraded, or None if it is a V4 RAG workflow.
+    Upgrading is not idempotent, and other workflows (tools, tests) would only
+    gain unconnected V5 nodes.
+    """
+    names = {node.get('name') for node in workflow.get('nodes', [])}
+    if 'Set Tenant Context' in names:
+        return "already V5"
+    missing = [name for name in RAG_ANCHORS if name not in names]
+    if missing:
+        return f"not a V4 RAG workflow (no {', '.join(missing)} node)"
+    return None
+
+def v5_name(name):
+    """Keep the workflow's own name, marking it as the V5 multi-tenant version."""
+    name = re.sub(r"\bV4\b", "V5", name or "")
+    return name if name.endswith(" - Multi-Tenant") else f"{name} - Multi-Tenant".lstrip(" -")
+
+def upgrade_workflow(workflow):
+    """
+    Upgrade one workflow dict to V5 in place.
+
+    Returns:
+        list of log lines describing what was changed
+    """
+    log = []
+    workflow['name'] = v5_name(workflow.get('name'))
+    workflow['id'] = None  # Let n8n assign new ID on import
+    workflow['active'] = False  # Start inactive for testing
+
+    graph = WorkflowGraph(workflow)
+    add_tenant_context(graph, log)
+    rewritten = apply_node_rules(graph, log)
+    rewritten += add_version_detection(graph, log)
+    report_index_usage(graph, rewritten, log)
+
+    workflow['updatedAt'] = None  # Reset to let n8n set
+    workflow.pop('createdAt', None)  # Remove to avoid conflicts
+    return log
+
+def main():
+    parser = argparse.ArgumentParser(description='Upgrade the n8n RAG workflow from V4 to V5')
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT, help='V4 workflow export')
+    parser.add_argument('output', nargs='?', default=DEFAULT_OUTPUT, help='Where to write the V5 workflow')
+    args = parser.parse_args()
+
+    workflows, wrapped = load_export(args.input)
+    workflow = workflows[0]  # Workflow is in an array
+    print(f"Original workflow: {workflow['name']}")
+    reason = skip_reason(workflow)
+    if reason:
+        print(f"❌ Not upgrading: {reason}")
+        sys.exit(1)
+    nodes_before = len(workflow['nodes'])
+    print(f"Node count: {nodes_before}")
+
+    log = upgrade_workflow(workflow)
+    for line in log:
+        print(line)
+
+    print(f"\nFinal node count: {len(workflow['nodes'])}")
+    save_export(args.output, [workflow], wrapped)
+
+    print(f"\n✅ Workflow upgraded successfully!")
+    print(f"📁 Saved to: {args.output}")
+    print(f"\n📊 Summary:")
+    print(f"  - Added {len(workflow['nodes']) - nodes_before} new nodes (JWT, tenant context, versioning)")
+    print(f"  - Updated {sum(line.startswith('✅ Updated:') for line in log)} nodes with tenant filtering")
+    print(f"  - Converted {sum(line.startswith('✅ Converted:') for line in log)} DELETE nodes to soft-delete")
+    skipped = sum(line.startswith('⚠️  Skipped:') for line in log)
+    if skipped:
+        print(f"  - Skipped {skipped} nodes that are not Postgres")
+    print(f"\n🚀 Next steps:")
+    print(f"  1. Import workflow into n8n")
+    print(f"  2. Manually adjust version detection connections")
+    print(f"  3. Update Postgres PGVector Store credentials")
+    print(f"  4. Test with sample documents")
+
+if __name__ == "__main__":
+    main()
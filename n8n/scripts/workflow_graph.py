@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Indexed view of an n8n workflow for the workflow scripts
+
+Loads a workflow export once and keeps name, id and type indexes plus forward and
+reverse adjacency of the connections, so lookups, renames and edge edits don't rescan
+the node list. The graph edits the workflow dict in place; dump it with save_export().
+
+n8n stores connections by source node name:
+    connections[source][type][output] = [{"node": target, "type": type, "index": input}]
+"""
+
+import json
+import os
+import re
+from collections import defaultdict, namedtuple
+
+# One connection: output `output` of `source` feeds input `index` of `target`
+Edge = namedtuple("Edge", "source target type output index")
+
+# Expression forms that reference another node by name
+_REFERENCE_PATTERNS = (
+    "\\$\\(\\s*'{name}'\\s*\\)", '\\$\\(\\s*"{name}"\\s*\\)',
+    "\\$node\\[\\s*'{name}'\\s*\\]", '\\$node\\[\\s*"{name}"\\s*\\]',
+    "\\$items\\(\\s*'{name}'", '\\$items\\(\\s*"{name}"',
+)
+
+def load_export(path):
+    """
+    Read a workflow export file.
+
+    Returns:
+        (workflows, wrapped) - the list of workflow dicts, and whether the file held a
+        list (n8n CLI exports) rather than a single workflow (UI downloads)
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data, True
+    return [data], False
+
+def save_export(path, workflows, wrapped=True):
+    """
+    Write workflows in the same shape load_export() read them. The file is replaced
+    atomically, so readers never see a half-written export.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(workflows if wrapped else workflows[0], f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+class WorkflowGraph:
+    """Indexes over one workflow dict (the `nodes` and `connections` it holds are edited in place)."""
+
+    def __init__(self, workflow):
+        self.workflow = workflow
+        self.nodes = workflow.setdefault("nodes", [])
+        self.connections = workflow.setdefault("connections", {})
+        self._by_name = {}
+        self._by_id = {}
+        self._by_type = defaultdict(list)
+        for node in self.nodes:
+            self._index(node)
+        # target name -> edges into it
+        self._incoming = defaultdict(list)
+        for edge in self.edges():
+            self._incoming[edge.target].append(edge)
+
+    def _index(self, node):
+        self._by_name[node["name"]] = node
+        if node.get("id"):
+            self._by_id[node["id"]] = node
+        self._by_type[node.get("type")].append(node)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __iter__(self):
+        return iter(list(self.nodes))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # Lookups
+
+    def node(self, name):
+        """The node called `name`, or None."""
+        return self._by_name.get(name)
+
+    def node_by_id(self, node_id):
+        return self._by_id.get(node_id)
+
+    def nodes_of_type(self, node_type):
+        """Nodes of an n8n type such as "n8n-nodes-base.postgres"."""
+        return list(self._by_type.get(node_type, ()))
+
+    def edges(self):
+        """All connections as Edge tuples."""
+        for source, outputs in self.connections.items():
+            for connection_type, slots in outputs.items():
+                for output, targets in enumerate(slots):
+                    for target in targets or ():
+                        yield Edge(source, target["node"], connection_type, output, target.get("index", 0))
+
+    def outgoing(self, name, connection_type=None):
+        """Edges leaving `name`, optionally only of one connection type."""
+        edges = []
+        for current_type, slots in self.connections.get(name, {}).items():
+            if connection_type is not None and current_type != connection_type:
+                continue
+            for output, targets in enumerate(slots):
+                for target in targets or ():
+                    edges.append(Edge(name, target["node"], current_type, output, target.get("index", 0)))
+        return edges
+
+    def incoming(self, name, connection_type=None):
+        """Edges entering `name`, optionally only of one connection type."""
+        return [
+            edge for edge in self._incoming.get(name, ())
+            if connection_type is None or edge.type == connection_type
+        ]
+
+    # Edits
+
+    def add_node(self, node):
+        """Append a node; names must stay unique."""
+        if node["name"] in self._by_name:
+            raise ValueError(f"Node {node['name']!r} already exists")
+        self.nodes.append(node)
+        self._index(node)
+        return node
+
+    def remove_node(self, name):
+        """Remove a node and every connection from or to it."""
+        node = self._require(name)
+        for edge in self.outgoing(name) + self.incoming(name):
+            self.disconnect(edge.source, edge.target, edge.type, edge.output, edge.index)
+        self.connections.pop(name, None)
+        self.nodes.remove(node)
+        del self._by_name[name]
+        if node.get("id"):
+            self._by_id.pop(node["id"], None)
+        self._by_type[node.get("type")].remove(node)
+        return node
+
+    def rename(self, old, new):
+        """
+        Rename a node the way the n8n editor does: connections and expressions in
+        other nodes that reference it by name are rewritten as well.
+        """
+        node = self._require(old)
+        if new == old:
+            return node
+        if new in self._by_name:
+            raise ValueError(f"Node {new!r} already exists")
+        node["name"] = new
+        self._by_name[new] = self._by_name.pop(old)
+
+        if old in self.connections:
+            self.connections[new] = self.connections.pop(old)
+        for edge in self.outgoing(new):
+            self._incoming[edge.target] = [
+                e._replace(source=new) if e.source == old else e for e in self._incoming[edge.target]
+            ]
+        incoming = self._incoming.pop(old, [])
+        for edge in incoming:
+            for target in self.connections[edge.source][edge.type][edge.output]:
+                if target["node"] == old:
+                    target["node"] = new
+        if incoming:
+            self._incoming[new] = [edge._replace(target=new) for edge in incoming]
+
+        patterns = [re.compile(pattern.format(name=re.escape(old))) for pattern in _REFERENCE_PATTERNS]
+        def rewrite(value):
+            if isinstance(value, str):
+                if old in value:
+                    for regex in patterns:
+                        value = regex.sub(lambda m: m.group(0).replace(old, new), value)
+                return value
+            if isinstance(value, dict):
+                return {key: rewrite(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [rewrite(item) for item in value]
+            return value
+        for other in self.nodes:
+            if "parameters" in other:
+                other["parameters"] = rewrite(other["parameters"])
+        return node
+
+    def connect(self, source, target, connection_type="main", output=0, index=0):
+        """Add the connection source[output] -> target[index] unless it exists."""
+        self._require(source)
+        self._require(target)
+        slots = self.connections.setdefault(source, {}).setdefault(connection_type, [])
+        while len(slots) <= output:
+            slots.append([])
+        entry = {"node": target, "type": connection_type, "index": index}
+        if entry not in slots[output]:
+            slots[output].append(entry)
+            self._incoming[target].append(Edge(source, target, connection_type, output, index))
+
+    def disconnect(self, source, target, connection_type="main", output=0, index=0):
+        """Remove the connection source[output] -> target[index] if present."""
+        slots = self.connections.get(source, {}).get(connection_type, [])
+        if output >= len(slots):
+            return
+        entry = {"node": target, "type": connection_type, "index": index}
+        if entry in slots[output]:
+            slots[output].remove(entry)
+            self._incoming[target].remove(Edge(source, target, connection_type, output, index))
+
+    def redirect(self, source, target, connection_type="main", output=0):
+        """Make `target` the only node fed by output `output` of `source`."""
+        for edge in self.outgoing(source, connection_type):
+            if edge.output == output:
+                self.disconnect(edge.source, edge.target, edge.type, edge.output, edge.index)
+        self.connect(source, target, connection_type, output)
+
+    def insert_between(self, source, target, *names, connection_type="main"):
+        """
+        Route every source -> target connection through the chain `names`
+        (source -> names[0] -> ... -> names[-1] -> target).
+        """
+        edges = [edge for edge in self.outgoing(source, connection_type) if edge.target == target]
+        if not edges:
+            raise ValueError(f"No {connection_type} connection from {source!r} to {target!r}")
+        chain = list(names)
+        for first, second in zip(chain, chain[1:]):
+            self.connect(first, second, connection_type)
+        for edge in edges:
+            self.disconnect(*edge[:2], edge.type, edge.output, edge.index)
+            self.connect(source, chain[0], connection_type, edge.output)
+            self.connect(chain[-1], target, connection_type, 0, edge.index)
+
+    def _require(self, name):
+        node = self._by_name.get(name)
+        if node is None:
+            raise KeyError(f"No node named {name!r}")
+        return node
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Content-addressed snapshot store for n8n workflow exports
+
+The workflow backups are mostly copies of each other with a few nodes changed, so
+instead of storing whole files, every export is split into blobs: one per node, one
+for the connections and one for the remaining workflow fields. Blobs are zlib
+compressed JSON named by the sha256 of their content, so each distinct node is stored
+once no matter how many versions contain it. A snapshot is a small manifest blob
+listing the blob hashes of one export file; refs.json maps labels (by default the file
+name) to their snapshot history.
+
+Restores are byte-identical: the manifest records the JSON layout of the file (indent,
+separators, escaping, trailing newline). A file in a layout json.dumps() can't
+reproduce (e.g. hand-formatted position arrays) also gets its text stored as one blob.
+
+Blobs are appended to a single pack file rather than written as one file each: most
+are a few hundred bytes, and as loose files every one of them took a whole filesystem
+block.
+
+Store layout:
+    objects.pack         compressed blobs, one after another
+    objects.idx          {hash: [offset, length]} into objects.pack
+    objects/ab/cdef...   loose blobs of older stores (`pack` moves them into the pack)
+    refs.json            {label: [{"snapshot": hash, "added": iso time}, ...]}
+
+Versions are addressed as LABEL (latest), LABEL@N (N-th snapshot, from 1) or a
+snapshot hash prefix.
+
+Usage:
+    python3 workflow_store.py add ../backup/workflows
+    python3 workflow_store.py list
+    python3 workflow_store.py diff V5_Multi_Tenant_RAG_Workflow V5_Multi_Tenant_RAG_Workflow_Debug
+    python3 workflow_store.py restore V5_Live_RAG_Workflow@1 -o /tmp/restore
+    python3 workflow_store.py stats
+    python3 workflow_store.py pack
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+
+from migrate_workflows import find_inputs
+from workflow_graph import load_export
+
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backup", "store")
+
+# JSON layouts of the exports seen in the wild: CLI/`json.dump(indent=2)` and compact UI downloads
+LAYOUTS = [
+    {"indent": 2, "separators": [",", ": "]},
+    {"indent": None, "separators": [",", ":"]},
+    {"indent": None, "separators": [", ", ": "]},
+]
+
+def encode(obj):
+    """Serialized form of a blob; key order is kept so restores match the original."""
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+def render(data, layout):
+    """Text of an export in a layout recorded by detect_layout()."""
+    text = json.dumps(data, indent=layout["indent"], separators=tuple(layout["separators"]),
+                      ensure_ascii=layout["ensure_ascii"])
+    return text + "\n" if layout["newline"] else text
+
+def detect_layout(text, data):
+    """The layout that reproduces `text` from `data`, or None."""
+    for layout in LAYOUTS:
+        for ensure_ascii in (True, False):
+            candidate = {**layout, "ensure_ascii": ensure_ascii, "newline": text.endswith("\n")}
+            if render(data, candidate) == text:
+                return candidate
+    return None
+
+class WorkflowStore:
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.pack_path = os.path.join(root, "objects.pack")
+        self.index_path = os.path.join(root, "objects.idx")
+        self.refs_path = os.path.join(root, "refs.json")
+        self._index = None
+
+    # Blobs
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def index(self):
+        """{hash: [offset, length]} of the packed blobs."""
+        if self._index is None:
+            try:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        # Written after the pack, so the index never points past its end
+        tmp_path = f"{self.index_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index(), f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def _append(self, digest, compressed):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.pack_path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(compressed)
+        self.index()[digest] = [offset, len(compressed)]
+
+    def put(self, obj):
+        """
+        Store a JSON value; call flush() to make new blobs visible to other readers.
+
+        Returns:
+            (hash, stored bytes) - stored bytes is 0 when the blob already existed
+        """
+        data = encode(obj)
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.index() or os.path.exists(self._object_path(digest)):
+            return digest, 0
+        compressed = zlib.compress(data, 9)
+        self._append(digest, compressed)
+        return digest, len(compressed)
+
+    def flush(self):
+        self._save_index()
+
+    def get(self, digest):
+        entry = self.index().get(digest)
+        if entry is None:
+            with open(self._object_path(digest), "rb") as f:
+                return json.loads(zlib.decompress(f.read()))
+        with open(self.pack_path, "rb") as f:
+            f.seek(entry[0])
+            return json.loads(zlib.decompress(f.read(entry[1])))
+
+    def _loose_hashes(self):
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in os.listdir(self.objects_dir):
+            for rest in os.listdir(os.path.join(self.objects_dir, prefix)):
+                if ".tmp-" not in rest:
+                    yield prefix + rest
+
+    def object_hashes(self):
+        yield from self.index()
+        yield from (digest for digest in self._loose_hashes() if digest not in self.index())
+
+    def pack(self):
+        """Move loose blobs into the pack; returns how many were moved."""
+        moved = 0
+        for digest in list(self._loose_hashes()):
+            path = self._object_path(digest)
+            if digest not in self.index():
+                with open(path, "rb") as f:
+                    self._append(digest, f.read())
+                moved += 1
+        self._save_index()
+        for digest in list(self._loose_hashes()):
+            os.remove(self._object_path(digest))
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                os.rmdir(os.path.join(self.objects_dir, prefix))
+            os.rmdir(self.objects_dir)
+        return moved
+
+    # Refs
+
+    def refs(self):
+        try:
+            with open(self.refs_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_refs(self, refs):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.refs_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(refs, f, indent=2)
+        os.replace(tmp_path, self.refs_path)
+
+    def resolve(self, spec):
+        """Snapshot hash for LABEL, LABEL@N or a hash prefix; raises KeyError."""
+        refs = self.refs()
+        label, _, number = spec.partition("@")
+        if label in refs:
+            history = refs[label]
+            if not number:
+                return history[-1]["snapshot"]
+            if number.isdigit() and 1 <= int(number) <= len(history):
+                return history[int(number) - 1]["snapshot"]
+            raise KeyError(f"{label} has versions 1-{len(history)}")
+        matches = {
+            entry["snapshot"] for history in refs.values() for entry in history
+            if entry["snapshot"].startswith(spec)
+        }
+        if len(spec) >= 4 and len(matches) == 1:
+            return matches.pop()
+        raise KeyError(f"Unknown or ambiguous version: {spec}")
+
+    # Snapshots
+
+    def snapshot(self, path, label=None):
+        """
+        Split an export file into blobs and record it under `label`.
+
+        Returns:
+            dict with label, snapshot hash, whether it is a new version, and the number
+            and compressed size of newly stored blobs
+        """
+        workflows, wrapped = load_export(path)
+        with open(path, encoding="utf-8", newline="") as f:
+            text = f.read()
+        label = label or os.path.splitext(os.path.basename(path))[0]
+        new_blobs = new_bytes = 0
+
+        def put(obj):
+            nonlocal new_blobs, new_bytes
+            digest, size = self.put(obj)
+            new_blobs += bool(size)
+            new_bytes += size
+            return digest
+
+        layout = detect_layout(text, workflows if wrapped else workflows[0])
+        manifest = {"wrapped": wrapped, "layout": layout or {"text": put(text)}, "workflows": []}
+        for workflow in workflows:
+            rest = {key: value for key, value in workflow.items() if key not in ("nodes", "connections")}
+            manifest["workflows"].append({
+                "keys": list(workflow),
+                "fields": put(rest),
+                "nodes": [[node.get("name"), put(node)] for node in workflow.get("nodes", [])],
+                "connections": put(workflow.get("connections", {})),
+            })
+        snapshot = put(manifest)
+        self.flush()
+
+        refs = self.refs()
+        history = refs.setdefault(label, [])
+        changed = not history or history[-1]["snapshot"] != snapshot
+        if changed:
+            history.append({"snapshot": snapshot, "added": datetime.now().isoformat(timespec="seconds")})
+            self._save_refs(refs)
+        return {
+            "label": label, "snapshot": snapshot, "version": len(history), "changed": changed,
+            "size": os.path.getsize(path), "new_blobs": new_blobs, "new_bytes": new_bytes,
+        }
+
+    def reconstruct(self, spec):
+        """Return (workflows, wrapped) of a stored version, as load_export() would."""
+        manifest = self.get(self.resolve(spec))
+        workflows = []
+        for entry in manifest["workflows"]:
+            parts = self.get(entry["fields"])
+            parts["nodes"] = [self.get(digest) for _, digest in entry["nodes"]]
+            parts["connections"] = self.get(entry["connections"])
+            workflows.append({key: parts[key] for key in entry["keys"] if key in parts})
+        return workflows, manifest["wrapped"]
+
+    def export_text(self, spec):
+        """The exact text of the export file a stored version was snapshotted from."""
+        manifest = self.get(self.resolve(spec))
+        layout = manifest.get("layout")
+        if layout and "text" in layout:
+            return self.get(layout["text"])
+        workflows, wrapped = self.reconstruct(spec)
+        data = workflows if wrapped else workflows[0]
+        if layout is None:
+            # Snapshots from before layouts were recorded restore as save_export() writes
+            return json.dumps(data, indent=2)
+        return render(data, layout)
+
+    def diff(self, old_spec, new_spec):
+        """Node-level differences between two versions, as printable lines."""
+        old, new = self.get(self.resolve(old_spec)), self.get(self.resolve(new_spec))
+        lines = []
+        for index in range(max(len(old["workflows"]), len(new["workflows"]))):
+            if index >= len(old["workflows"]) or index >= len(new["workflows"]):
+                lines.append(f"workflow {index}: only in {old_spec if index < len(old['workflows']) else new_spec}")
+                continue
+            before, after = old["workflows"][index], new["workflows"][index]
+            before_nodes, after_nodes = dict(before["nodes"]), dict(after["nodes"])
+            for name, digest in after_nodes.items():
+                if name not in before_nodes:
+                    lines.append(f"+ node {name} ({self.get(digest).get('type')})")
+                elif before_nodes[name] != digest:
+                    fields = changed_fields(self.get(before_nodes[name]), self.get(digest))
+                    lines.append(f"~ node {name}: {', '.join(fields)}")
+            for name, digest in before_nodes.items():
+                if name not in after_nodes:
+                    lines.append(f"- node {name} ({self.get(digest).get('type')})")
+            if before["connections"] != after["connections"]:
+                before_connections = self.get(before["connections"])
+                after_connections = self.get(after["connections"])
+                sources = sorted(
+                    source for source in set(before_connections) | set(after_connections)
+                    if before_connections.get(source) != after_connections.get(source)
+                )
+                lines.append(f"~ connections from: {', '.join(sources)}")
+            if before["fields"] != after["fields"]:
+                fields = changed_fields(self.get(before["fields"]), self.get(after["fields"]))
+                lines.append(f"~ workflow fields: {', '.join(fields)}")
+        return lines
+
+    def disk_usage(self):
+        """Bytes the store occupies on disk, counting whole filesystem blocks."""
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for path in [directory] + [os.path.join(directory, name) for name in files]:
+                info = os.stat(path)
+                # st_blocks is in 512-byte units; it is missing on Windows
+                total += info.st_blocks * 512 if hasattr(info, "st_blocks") else info.st_size
+        return total
+
+    def stats(self):
+        """Logical size of all versions vs. the compressed blobs and the store's size on disk."""
+        refs = self.refs()
+        versions = sum(len(history) for history in refs.values())
+        blobs = list(self.object_hashes())
+        stored = sum(
+            self.index()[digest][1] if digest in self.index() else os.path.getsize(self._object_path(digest))
+            for digest in blobs
+        )
+        logical = 0
+        for history in refs.values():
+            for entry in history:
+                logical += len(self.export_text(entry["snapshot"]).encode())
+        return {"labels": len(refs), "versions": versions, "blobs": len(blobs),
+                "logical_bytes": logical, "stored_bytes": stored, "disk_bytes": self.disk_usage()}
+
+def changed_fields(before, after):
+    """Keys whose values differ; `parameters` is broken down one level."""
+    fields = []
+    for key in list(dict.fromkeys(list(before) + list(after))):
+        if before.get(key) == after.get(key):
+            continue
+        if key == "parameters" and isinstance(before.get(key), dict) and isinstance(after.get(key), dict):
+            fields.extend(f"parameters.{name}" for name in changed_fields(before[key], after[key]))
+        else:
+            fields.append(key)
+    return fields
+
+def human(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+def main():
+    parser = argparse.ArgumentParser(description='Content-addressed snapshot store for n8n workflow exports')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='Store directory (default: n8n/backup/store)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='Snapshot workflow files, directories or glob patterns')
+    add.add_argument('inputs', nargs='+', metavar='PATH')
+    add.add_argument('--label', help='Label for a single input (default: file name without .json)')
+    commands.add_parser('list', help='List labels and their versions')
+    restore = commands.add_parser('restore', help='Reconstruct versions as export files')
+    restore.add_argument('versions', nargs='*', metavar='VERSION')
+    restore.add_argument('--all', action='store_true', help='Restore the latest version of every label')
+    restore.add_argument('-o', '--output-dir', required=True)
+    diff = commands.add_parser('diff', help='Show node-level differences between two versions')
+    diff.add_argument('old')
+    diff.add_argument('new')
+    commands.add_parser('stats', help='Compare the stored size with the size of all versions')
+    commands.add_parser('pack', help='Move loose blobs of an older store into the pack file')
+    args = parser.parse_args()
+
+    store = WorkflowStore(args.store)
+    try:
+        if args.command == 'add':
+            inputs = find_inputs(args.inputs)
+            if args.label and len(inputs) != 1:
+                parser.error('--label needs exactly one input file')
+            total = stored = 0
+            for path in inputs:
+                result = store.snapshot(path, args.label)
+                total += result["size"]
+                stored += result["new_bytes"]
+                state = f"version {result['version']}" if result["changed"] else "unchanged"
+                print(f"{result['label'][:56]:56} {state:11} {result['snapshot'][:12]}  "
+                      f"{result['new_blobs']:>3} new blob(s), {human(result['new_bytes']):>7}")
+            print(f"\n{len(inputs)} file(s), {human(total)} in, {human(stored)} newly stored")
+        elif args.command == 'list':
+            for label, history in sorted(store.refs().items()):
+                latest = history[-1]
+                print(f"{label[:56]:56} {len(history):>3} version(s)  latest {latest['snapshot'][:12]} "
+                      f"({latest['added']})")
+        elif args.command == 'restore':
+            specs = sorted(store.refs()) if args.all else args.versions
+            if not specs:
+                parser.error('name versions to restore or use --all')
+            os.makedirs(args.output_dir, exist_ok=True)
+            for spec in specs:
+                path = os.path.join(args.output_dir, spec.replace("@", "_v") + ".json")
+                tmp_path = f"{path}.tmp-{os.getpid()}"
+                with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                    f.write(store.export_text(spec))
+                os.replace(tmp_path, path)
+                print(f"✅ {spec} -> {path}")
+        elif args.command == 'diff':
+            lines = store.diff(args.old, args.new)
+            print(f"--- {args.old}\n+++ {args.new}")
+            print("\n".join(lines) if lines else "(identical)")
+        elif args.command == 'stats':
+            stats = store.stats()
+            ratio = stats["logical_bytes"] / stats["disk_bytes"] if stats["disk_bytes"] else 0
+            print(f"{stats['labels']} label(s), {stats['versions']} version(s), {stats['blobs']} blob(s)")
+            print(f"All versions: {human(stats['logical_bytes'])}, blobs: {human(stats['stored_bytes'])}, "
+                  f"on disk: {human(stats['disk_bytes'])} " +
+                  (f"({ratio:.1f}x smaller)" if ratio >= 1 else "(larger than the files, run pack)"))
+        elif args.command == 'pack':
+            print(f"✅ Packed {store.pack()} loose blob(s) into {store.pack_path}")
+    except (KeyError, OSError, ValueError) as e:
+        print(f"❌ {e.args[0] if isinstance(e, KeyError) else e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,30 @@
 title: n8n Pipe Function
 author: Cole Medin
 author_url: https://www.youtube.com/@ColeMedin
-version: 0.1.0
+version: 0.2.0
 
 This module defines a Pipe class that utilizes N8N for an Agent
 """
 
-from typing import Optional, Callable, Awaitable
+from typing import Optional, Callable, Awaitable, AsyncGenerator, Literal, Union
+from collections import OrderedDict, deque
 from pydantic import BaseModel, Field
 import os
+import json
 import time
-import requests
+import hashlib
+import random
+import base64
+import gzip
+import logging
+import threading
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+import asyncio
+import aiohttp
+
+log = logging.getLogger(__name__)
 
 def extract_event_info(event_emitter) -> tuple[Optional[str], Optional[str]]:
     if not event_emitter or not event_emitter.__closure__:
@@ -23,11 +37,343 @@ def extract_event_info(event_emitter) -> tuple[Optional[str], Optional[str]]:
             return chat_id, message_id
     return None, None
 
+class ResponseCache:
+    """In-process TTL cache with LRU eviction bounded by entry count and total bytes."""
+
+    def __init__(self):
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, ttl: float):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > ttl:
+            self._evict(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key: tuple, value, max_entries: int, max_bytes: int):
+        raw = value if isinstance(value, str) else json.dumps(value)
+        size = len(raw.encode("utf-8"))
+        if size > max_bytes or max_entries <= 0:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (time.monotonic(), size, value)
+        self._bytes += size
+        while len(self._entries) > max_entries or self._bytes > max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: tuple):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+class QueueFullError(Exception):
+    """Raised when the pipe's wait queue for n8n slots is full."""
+
+class ConcurrencyLimiter:
+    """FIFO admission control: at most `limit` active n8n calls plus a bounded queue."""
+
+    def __init__(self):
+        self.active = 0
+        self._waiters: deque = deque()
+
+    async def acquire(
+        self,
+        limit: int,
+        max_queue: int,
+        on_queued: Callable[[int], Awaitable[None]],
+        report_interval: float,
+    ):
+        if limit <= 0 or (self.active < limit and not self._waiters):
+            self.active += 1
+            return
+        if len(self._waiters) >= max_queue:
+            raise QueueFullError(
+                f"Too many requests in progress ({len(self._waiters)} queued), "
+                "please retry shortly"
+            )
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            while not waiter.done():
+                await on_queued(self._waiters.index(waiter) + 1)
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(waiter), max(report_interval, 0.1)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # The slot was granted while we were being cancelled
+                self.release(limit)
+            raise
+
+    def release(self, limit: int):
+        self.active -= 1
+        while self._waiters and (limit <= 0 or self.active < limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+class CircuitOpenError(Exception):
+    """Raised without calling n8n while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Opens after N consecutive failures, then lets one probe through per cool-down."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    def before_call(self, reset_timeout: float) -> bool:
+        """Raise CircuitOpenError while open; return True when this call is the probe."""
+        if self.opened_at is None:
+            return False
+        remaining = reset_timeout - (time.monotonic() - self.opened_at)
+        if remaining > 0 or self._probing:
+            raise CircuitOpenError(
+                f"n8n is unavailable after {self.failures} consecutive failures, "
+                f"retrying in {max(remaining, 0):.1f}s"
+            )
+        # Half-open: this call is the probe
+        self._probing = True
+        return True
+
+    def end_probe(self):
+        """Let the next call probe again, however the current probe ended."""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self, threshold: int):
+        self.failures += 1
+        self._probing = False
+        if threshold > 0 and self.failures >= threshold:
+            self.opened_at = time.monotonic()
+
+class PipeMetrics:
+    """Prometheus-style counters, in-flight gauges and latency histograms per webhook."""
+
+    LATENCY_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+    )
+    SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+    HISTOGRAMS = {
+        "n8n_pipe_queue_wait_seconds": (
+            "Time spent waiting for a concurrency slot",
+            LATENCY_BUCKETS,
+        ),
+        "n8n_pipe_connect_seconds": (
+            "Time to open a new connection to n8n",
+            LATENCY_BUCKETS,
+        ),
+        "n8n_pipe_ttfb_seconds": (
+            "Time from sending the request to receiving response headers",
+            LATENCY_BUCKETS,
+        ),
+        "n8n_pipe_request_seconds": (
+            "Total time of a pipe request to n8n",
+            LATENCY_BUCKETS,
+        ),
+        "n8n_pipe_response_bytes": ("Size of n8n response bodies", SIZE_BUCKETS),
+    }
+    COUNTERS = {
+        "n8n_pipe_responses_total": ("HTTP attempts against n8n by status", "status"),
+        "n8n_pipe_requests_total": ("Pipe requests by outcome", "outcome"),
+    }
+
+    def __init__(self):
+        # (metric, webhook) -> [bucket counts..., +Inf count], sum
+        self._buckets: dict[tuple, list[int]] = {}
+        self._sums: dict[tuple, float] = {}
+        self._counters: dict[tuple, int] = {}
+        self.in_flight: dict[str, int] = {}
+
+    def observe(self, metric: str, webhook: str, value: float):
+        bounds = self.HISTOGRAMS[metric][1]
+        counts = self._buckets.setdefault((metric, webhook), [0] * (len(bounds) + 1))
+        for i, bound in enumerate(bounds):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self._sums[(metric, webhook)] = self._sums.get((metric, webhook), 0.0) + value
+
+    def inc(self, metric: str, webhook: str, label: str):
+        key = (metric, webhook, label)
+        self._counters[key] = self._counters.get(key, 0) + 1
+
+    def track_in_flight(self, webhook: str, delta: int):
+        self.in_flight[webhook] = self.in_flight.get(webhook, 0) + delta
+
+    def quantile(self, metric: str, webhook: str, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        counts = self._buckets.get((metric, webhook))
+        if not counts or not sum(counts):
+            return None
+        bounds = self.HISTOGRAMS[metric][1]
+        rank = q * sum(counts)
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i == len(bounds):
+                    return float(bounds[-1])
+                lower = bounds[i - 1] if i else 0.0
+                return lower + (bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return float(bounds[-1])
+
+    def summary(self) -> dict:
+        """p50/p95/p99 and counts for every histogram, keyed by webhook."""
+        result: dict = {}
+        for metric, webhook in self._buckets:
+            result.setdefault(webhook, {})[metric] = {
+                "count": sum(self._buckets[(metric, webhook)]),
+                "p50": self.quantile(metric, webhook, 0.5),
+                "p95": self.quantile(metric, webhook, 0.95),
+                "p99": self.quantile(metric, webhook, 0.99),
+            }
+        return result
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+
+        def label(value) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+        lines = []
+        for metric, (help_text, bounds) in self.HISTOGRAMS.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for (name, webhook), counts in self._buckets.items():
+                if name != metric:
+                    continue
+                webhook_label = f'webhook="{label(webhook)}"'
+                cumulative = 0
+                for bound, count in zip(list(bounds) + ["+Inf"], counts):
+                    cumulative += count
+                    lines.append(
+                        f'{metric}_bucket{{{webhook_label},le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f"{metric}_sum{{{webhook_label}}} {self._sums[(name, webhook)]}")
+                lines.append(f"{metric}_count{{{webhook_label}}} {cumulative}")
+        for metric, (help_text, label_name) in self.COUNTERS.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for (name, webhook, value), count in self._counters.items():
+                if name == metric:
+                    labels = f'webhook="{label(webhook)}",{label_name}="{label(value)}"'
+                    lines.append(f"{metric}{{{labels}}} {count}")
+        lines += [
+            "# HELP n8n_pipe_in_flight Requests currently being processed by n8n",
+            "# TYPE n8n_pipe_in_flight gauge",
+        ]
+        for webhook, count in self.in_flight.items():
+            lines.append(f'n8n_pipe_in_flight{{webhook="{label(webhook)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+class Endpoint:
+    """Load-balancing state of one n8n webhook URL."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.failures = 0
+        self.ejected_until = 0.0
+
+class EndpointBalancer:
+    """Health-aware choice between n8n webhook endpoints with passive ejection."""
+
+    def __init__(self):
+        self.endpoints: dict[str, Endpoint] = {}
+
+    def sync(self, urls: list[str]):
+        """Follow the configured URL list while keeping state of known endpoints."""
+        if list(self.endpoints) != urls:
+            self.endpoints = {
+                url: self.endpoints.get(url) or Endpoint(url) for url in urls
+            }
+
+    def pick(self, strategy: str, exclude: set) -> Endpoint:
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints.values() if e.url not in exclude]
+        candidates = candidates or list(self.endpoints.values())
+        # With everything ejected, fall back to the least bad endpoint
+        healthy = [e for e in candidates if e.ejected_until <= now] or candidates
+        random.shuffle(healthy)
+        if strategy == "ewma":
+            # Peak-EWMA: expected latency scaled by the queue already waiting on it
+            average = [e.ewma_latency for e in healthy if e.ewma_latency is not None]
+            default = sum(average) / len(average) if average else 0.0
+
+            def cost(e: Endpoint) -> float:
+                latency = e.ewma_latency if e.ewma_latency is not None else default
+                return latency * (e.outstanding + 1)
+
+        else:
+
+            def cost(e: Endpoint) -> float:
+                return e.outstanding
+
+        chosen = min(healthy, key=cost)
+        chosen.outstanding += 1
+        return chosen
+
+    def release(self, endpoint: Endpoint):
+        endpoint.outstanding = max(endpoint.outstanding - 1, 0)
+
+    def record_latency(self, endpoint: Endpoint, latency: float, alpha: float = 0.3):
+        if endpoint.ewma_latency is None:
+            endpoint.ewma_latency = latency
+        else:
+            endpoint.ewma_latency += alpha * (latency - endpoint.ewma_latency)
+
+    def reinstate(self, endpoint: Endpoint):
+        endpoint.failures = 0
+        endpoint.ejected_until = 0.0
+
+    def record_failure(
+        self, endpoint: Endpoint, threshold: int, ejection: float
+    ) -> bool:
+        """Count a failure and return True when the endpoint gets ejected."""
+        endpoint.failures += 1
+        if (
+            threshold > 0
+            and endpoint.failures >= threshold
+            and len(self.endpoints) > 1
+        ):
+            endpoint.ejected_until = time.monotonic() + ejection
+            return True
+        return False
+
+    def ejected(self) -> list[Endpoint]:
+        now = time.monotonic()
+        return [e for e in self.endpoints.values() if e.ejected_until > now]
+
 class Pipe:
     class Valves(BaseModel):
         n8n_url: str = Field(
             default="https://n8n.[your domain].com/webhook/[your webhook URL]"
         )
+        n8n_urls: str = Field(
+            default="",
+            description="Comma or newline separated webhook URLs of n8n workers; overrides n8n_url",
+        )
         n8n_bearer_token: str = Field(default="...")
         input_field: str = Field(default="chatInput")
         response_field: str = Field(default="output")
@@ -37,14 +383,475 @@ class Pipe:
         enable_status_indicator: bool = Field(
             default=True, description="Enable or disable status indicator emissions"
         )
+        stream_response: bool = Field(
+            default=False,
+            description="Stream tokens from a streaming n8n webhook (NDJSON/SSE) as they arrive",
+        )
+        send_history: bool = Field(
+            default=False,
+            description="Send a compacted window of recent messages so n8n can skip its memory lookup",
+        )
+        history_field: str = Field(default="history")
+        history_max_messages: int = Field(
+            default=10, description="Maximum earlier messages included in the history window"
+        )
+        history_max_chars: int = Field(
+            default=8000,
+            description="Character budget (~4 chars per token) for the history window",
+        )
+        compress_min_bytes: int = Field(
+            default=0,
+            description="Gzip request bodies at least this large (0 = never compress)",
+        )
+        enable_cache: bool = Field(
+            default=False, description="Answer repeated questions from an in-process cache"
+        )
+        cache_scope: Literal["session", "user", "global"] = Field(
+            default="user",
+            description="Share cached answers per chat session, per user or globally",
+        )
+        cache_ttl: float = Field(
+            default=300.0, description="Seconds a cached answer stays valid"
+        )
+        cache_max_entries: int = Field(
+            default=256, description="Maximum number of cached answers (LRU eviction)"
+        )
+        cache_max_bytes: int = Field(
+            default=5_000_000, description="Maximum total size of cached answers in bytes"
+        )
+        coalesce_requests: bool = Field(
+            default=False,
+            description="Let identical in-flight questions (same cache_scope) share one n8n run",
+        )
+        max_concurrent_requests: int = Field(
+            default=8,
+            description="Maximum simultaneous n8n calls from this pipe (0 = unlimited)",
+        )
+        max_queue_size: int = Field(
+            default=64,
+            description="Requests allowed to wait for a free slot before failing fast",
+        )
+        max_retries: int = Field(
+            default=2,
+            description="Retries for transient failures (connect errors, retry_status_codes)",
+        )
+        retry_backoff_base: float = Field(
+            default=0.5, description="Initial retry delay in seconds, doubled per attempt"
+        )
+        retry_backoff_max: float = Field(
+            default=8.0, description="Upper bound for a single retry delay in seconds"
+        )
+        retry_status_codes: str = Field(
+            default="502,503,504",
+            description="Comma-separated HTTP statuses that are safe to retry",
+        )
+        circuit_failure_threshold: int = Field(
+            default=5,
+            description="Consecutive failures that open the circuit breaker (0 = disabled)",
+        )
+        circuit_reset_timeout: float = Field(
+            default=30.0,
+            description="Seconds the circuit stays open before a probe request is allowed",
+        )
+        metrics_port: int = Field(
+            default=0,
+            description="Serve Prometheus metrics on this port at /metrics (0 = disabled)",
+        )
+        metrics_host: str = Field(
+            default="127.0.0.1",
+            description="Address the metrics endpoint binds to (0.0.0.0 = all interfaces)",
+        )
+        langfuse_host: str = Field(
+            default="",
+            description="Langfuse URL to forward request timings to (e.g. http://langfuse-web:3000)",
+        )
+        langfuse_public_key: str = Field(default="")
+        langfuse_secret_key: str = Field(default="")
+        load_balancing: Literal["least_outstanding", "ewma"] = Field(
+            default="least_outstanding",
+            description="How to pick between n8n_urls: fewest in-flight requests or EWMA latency",
+        )
+        endpoint_failure_threshold: int = Field(
+            default=3,
+            description="Consecutive failures that eject an endpoint from rotation (0 = never)",
+        )
+        endpoint_ejection_seconds: float = Field(
+            default=30.0, description="How long an ejected endpoint stays out of rotation"
+        )
+        endpoint_probe_interval: float = Field(
+            default=10.0,
+            description="Seconds between /healthz probes of ejected endpoints",
+        )
+        pool_size: int = Field(
+            default=100, description="Maximum open connections in the shared HTTP pool"
+        )
+        pool_size_per_host: int = Field(
+            default=20, description="Maximum open connections per n8n host"
+        )
+        keepalive_timeout: float = Field(
+            default=30.0, description="Seconds an idle pooled connection is kept alive"
+        )
+        connect_timeout: float = Field(
+            default=10.0, description="Timeout in seconds for establishing a connection"
+        )
+        read_timeout: float = Field(
+            default=300.0,
+            description="Timeout in seconds between bytes received from n8n",
+        )
 
     def __init__(self):
         self.type = "pipe"
         self.id = "n8n_pipe"
         self.name = "N8N Pipe"
         self.valves = self.Valves()
-        self.last_emit_time = 0
-        pass
+        self._last_emit_times: dict = {}
+        self._emit_tails: dict = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_key = None
+        self._cache = ResponseCache()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._limiter = ConcurrencyLimiter()
+        self._breaker = CircuitBreaker()
+        self.metrics = PipeMetrics()
+        self._metrics_runner = None
+        self._metrics_bind: Optional[tuple] = None
+        self._metrics_retry_at = 0.0
+        self._background_tasks: set = set()
+        self._balancer = EndpointBalancer()
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared keep-alive session, recreating it when pool valves change."""
+        loop = asyncio.get_running_loop()
+        settings = (
+            self.valves.pool_size,
+            self.valves.pool_size_per_host,
+            self.valves.keepalive_timeout,
+            self.valves.connect_timeout,
+            self.valves.read_timeout,
+        )
+        if (
+            self._session is not None
+            and not self._session.closed
+            and self._session_key == (settings, loop)
+        ):
+            return self._session
+
+        old_session = self._session
+        if old_session is not None and not old_session.closed:
+            old_loop = self._session_key[1]
+            if old_loop is loop:
+                # Let requests still running on the old pool finish before closing it
+                loop.call_later(
+                    self.valves.read_timeout,
+                    lambda: asyncio.ensure_future(old_session.close()),
+                )
+            elif old_loop.is_running():
+                # A loop in another thread still owns the session: close it there
+                asyncio.run_coroutine_threadsafe(old_session.close(), old_loop)
+            else:
+                self._discard_session(old_session, old_loop)
+
+        connector = aiohttp.TCPConnector(
+            limit=self.valves.pool_size,
+            limit_per_host=self.valves.pool_size_per_host,
+            keepalive_timeout=self.valves.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=self.valves.connect_timeout,
+            sock_read=self.valves.read_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._connection_trace_config()],
+        )
+        self._session_key = (settings, loop)
+        return self._session
+
+    @staticmethod
+    def _discard_session(session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop):
+        """Close a session whose event loop is no longer running.
+
+        A stopped loop is run once more in a helper thread to close it. A closed loop
+        can't run close() at all, so the session is only detached; its connections are
+        dropped together with the loop's transports.
+        """
+        if not loop.is_closed():
+            threading.Thread(
+                target=loop.run_until_complete, args=(session.close(),), daemon=True
+            ).start()
+        else:
+            session.detach()
+
+    def _connection_trace_config(self) -> aiohttp.TraceConfig:
+        """Record connect time of new pooled connections into the request trace."""
+
+        async def on_create_start(session, context, params):
+            context.connect_started = time.monotonic()
+
+        async def on_create_end(session, context, params):
+            trace = context.trace_request_ctx
+            if trace is not None:
+                trace["connect"] = (
+                    trace.get("connect", 0.0) + time.monotonic() - context.connect_started
+                )
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(on_create_start)
+        trace_config.on_connection_create_end.append(on_create_end)
+        return trace_config
+
+    def metrics_text(self) -> str:
+        """Prometheus text-format dump of the pipe's metrics."""
+        return self.metrics.render()
+
+    async def _ensure_metrics_server(self):
+        """Start (or move) the /metrics endpoint according to the metrics valves.
+
+        A failed bind (e.g. another worker already serves the port) is logged and
+        retried a minute later; it never fails the chat request.
+        """
+        port = self.valves.metrics_port
+        bind = (self.valves.metrics_host, port) if port > 0 else None
+        if bind == self._metrics_bind:
+            return
+        if self._metrics_runner is not None:
+            await self._metrics_runner.cleanup()
+            self._metrics_runner = None
+            self._metrics_bind = None
+        if bind is None or time.monotonic() < self._metrics_retry_at:
+            return
+        from aiohttp import web
+
+        async def handle_metrics(request):
+            return web.Response(text=self.metrics_text(), content_type="text/plain")
+
+        async def handle_summary(request):
+            return web.json_response(self.metrics.summary())
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        app.router.add_get("/metrics/summary", handle_summary)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, *bind).start()
+        except OSError as e:
+            await runner.cleanup()
+            self._metrics_retry_at = time.monotonic() + 60
+            log.warning("Metrics endpoint failed to bind %s:%s: %s", bind[0], bind[1], e)
+            return
+        self._metrics_runner = runner
+        self._metrics_bind = bind
+
+    def _endpoint_urls(self) -> list[str]:
+        urls = [
+            url.strip()
+            for url in self.valves.n8n_urls.replace("\n", ",").split(",")
+            if url.strip()
+        ]
+        return urls or [self.valves.n8n_url]
+
+    def _webhook_label(self) -> str:
+        """Name of the configured webhook (or pool of workers) for keys and metrics.
+
+        Every request-level metric uses this label, whether the request reached an
+        endpoint or was turned away (queue full, circuit open); only the attempt-level
+        response counter and in-flight gauge are labelled per endpoint URL.
+        """
+        return ",".join(self._endpoint_urls())
+
+    def _assign_endpoint(self, trace: dict, endpoint: Endpoint):
+        """Point the request trace at the endpoint chosen for the next attempt."""
+        previous = trace.get("endpoint")
+        if previous is not None:
+            self._balancer.release(previous)
+            if trace.get("in_flight"):
+                self.metrics.track_in_flight(previous.url, -1)
+        trace["endpoint"] = endpoint
+        trace["endpoint_url"] = endpoint.url
+        trace["in_flight"] = True
+        self.metrics.track_in_flight(endpoint.url, 1)
+
+    def _endpoint_failed(self, trace: dict):
+        ejected = self._balancer.record_failure(
+            trace["endpoint"],
+            self.valves.endpoint_failure_threshold,
+            self.valves.endpoint_ejection_seconds,
+        )
+        if ejected and (self._probe_task is None or self._probe_task.done()):
+            self._probe_task = asyncio.create_task(self._probe_ejected_endpoints())
+
+    async def _probe_ejected_endpoints(self):
+        """Probe ejected endpoints' /healthz and put them back once they answer."""
+
+        async def probe(endpoint: Endpoint):
+            parts = urlsplit(endpoint.url)
+            try:
+                async with self._get_session().get(
+                    f"{parts.scheme}://{parts.netloc}/healthz"
+                ) as response:
+                    if response.status == 200:
+                        self._balancer.reinstate(endpoint)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+
+        while self._balancer.ejected():
+            await asyncio.sleep(self.valves.endpoint_probe_interval)
+            await asyncio.gather(*(probe(e) for e in self._balancer.ejected()))
+
+    def _start_trace(self, chat_id: Optional[str]) -> dict:
+        return {
+            "webhook": self._webhook_label(),
+            "chat_id": chat_id,
+            "start": time.monotonic(),
+        }
+
+    def _finish_trace(self, trace: dict, outcome: str):
+        """Record a finished n8n call and forward it to Langfuse without blocking."""
+        webhook = trace["webhook"]
+        trace["total"] = time.monotonic() - trace["start"]
+        endpoint = trace.pop("endpoint", None)
+        if trace.pop("in_flight", False):
+            self.metrics.track_in_flight(endpoint.url, -1)
+        if endpoint is not None:
+            self._balancer.release(endpoint)
+            if outcome == "ok" and "ttfb" in trace:
+                self._balancer.record_latency(endpoint, trace["ttfb"])
+        for metric, field in (
+            ("n8n_pipe_queue_wait_seconds", "queue_wait"),
+            ("n8n_pipe_connect_seconds", "connect"),
+            ("n8n_pipe_ttfb_seconds", "ttfb"),
+            ("n8n_pipe_request_seconds", "total"),
+            ("n8n_pipe_response_bytes", "bytes"),
+        ):
+            if field in trace:
+                self.metrics.observe(metric, webhook, trace[field])
+        self.metrics.inc("n8n_pipe_requests_total", webhook, outcome)
+
+        if self.valves.langfuse_host and self.valves.langfuse_public_key:
+            task = asyncio.create_task(self._forward_to_langfuse(trace, outcome))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _forward_to_langfuse(self, trace: dict, outcome: str):
+        credentials = base64.b64encode(
+            f"{self.valves.langfuse_public_key}:{self.valves.langfuse_secret_key}".encode()
+        ).decode()
+        now = datetime.now(timezone.utc).isoformat()
+        metadata = {
+            key: value
+            for key, value in trace.items()
+            if key not in ("start", "chat_id")
+        }
+        event = {
+            "id": str(uuid.uuid4()),
+            "timestamp": now,
+            "type": "trace-create",
+            "body": {
+                "id": str(uuid.uuid4()),
+                "timestamp": now,
+                "name": "n8n_pipe",
+                "sessionId": trace["chat_id"],
+                "tags": [outcome],
+                "metadata": {**metadata, "outcome": outcome},
+            },
+        }
+        try:
+            async with self._get_session().post(
+                f"{self.valves.langfuse_host.rstrip('/')}/api/public/ingestion",
+                json={"batch": [event]},
+                headers={"Authorization": f"Basic {credentials}"},
+            ) as response:
+                if response.status >= 300:
+                    log.warning("Langfuse ingestion failed: HTTP %s", response.status)
+        except Exception as e:
+            log.warning("Langfuse ingestion failed: %s", e)
+
+    def _history_window(self, messages: list[dict]) -> list[dict]:
+        """Compact the earlier conversation into a budgeted, most-recent-first window.
+
+        Duplicate system prompts are dropped and only the latest one is kept at the
+        front; the remaining budget is filled with the newest turns.
+        """
+
+        def text_of(message: dict) -> str:
+            content = message.get("content", "")
+            if isinstance(content, list):
+                return "\n".join(
+                    part.get("text", "")
+                    for part in content
+                    if isinstance(part, dict) and part.get("type") == "text"
+                )
+            return str(content)
+
+        budget = self.valves.history_max_chars
+        system_prompt = None
+        turns = []
+        for message in messages[:-1]:
+            text = text_of(message)
+            if message.get("role") == "system":
+                system_prompt = {"role": "system", "content": text}
+            elif text:
+                turns.append({"role": message.get("role", "user"), "content": text})
+        if system_prompt:
+            system_prompt["content"] = system_prompt["content"][:budget]
+            budget -= len(system_prompt["content"])
+
+        # turns[-0:] would be the whole history
+        limit = self.valves.history_max_messages
+        recent = turns[-limit:] if limit > 0 else []
+        window = []
+        for turn in reversed(recent):
+            if len(turn["content"]) > budget:
+                break
+            window.append(turn)
+            budget -= len(turn["content"])
+        window.reverse()
+        return ([system_prompt] if system_prompt else []) + window
+
+    def _request_key(
+        self,
+        question: str,
+        chat_id: Optional[str],
+        __user__: Optional[dict],
+        context: Optional[list] = None,
+    ) -> tuple:
+        """Key a question on its normalized text, the configured scope and the webhook.
+
+        Used both for the response cache and for coalescing in-flight requests.
+        """
+        normalized = " ".join(question.lower().split()).rstrip("?!. ")
+        if self.valves.cache_scope == "session":
+            scope = f"session:{chat_id}"
+        elif self.valves.cache_scope == "user":
+            scope = f"user:{(__user__ or {}).get('id')}"
+        else:
+            scope = "global"
+        # The bearer token decides the tenant inside n8n, so never share across tokens
+        token = hashlib.sha256(self.valves.n8n_bearer_token.encode("utf-8")).hexdigest()
+        # With history in the payload the same question can mean something else
+        history = (
+            hashlib.sha256(json.dumps(context).encode("utf-8")).hexdigest()
+            if context
+            else None
+        )
+        return (normalized, scope, self._webhook_label(), token, history)
+
+    def _cache_store(self, cache_key: Optional[tuple], value):
+        if cache_key is not None and value is not None:
+            self._cache.put(
+                cache_key,
+                value,
+                self.valves.cache_max_entries,
+                self.valves.cache_max_bytes,
+            )
+
+    def _cache_stats(self) -> str:
+        return f"cache: {self._cache.hits} hits / {self._cache.misses} misses"
 
     async def emit_status(
         self,
@@ -53,26 +860,409 @@ class Pipe:
         message: str,
         done: bool,
     ):
+        """Queue a status update for the chat without waiting for it to be delivered.
+
+        Updates are throttled per chat to one per emit_interval (final updates always
+        go out) and delivered in order behind the chat's previous update.
+        """
+        if not (__event_emitter__ and self.valves.enable_status_indicator):
+            return
+        chat_key = extract_event_info(__event_emitter__)[0] or id(__event_emitter__)
         current_time = time.time()
-        if (
+        if done:
+            self._last_emit_times.pop(chat_key, None)
+        elif (
+            current_time - self._last_emit_times.get(chat_key, 0)
+            < self.valves.emit_interval
+        ):
+            return
+        else:
+            self._last_emit_times[chat_key] = current_time
+
+        event = {
+            "type": "status",
+            "data": {
+                "status": "complete" if done else "in_progress",
+                "level": level,
+                "description": message,
+                "done": done,
+            },
+        }
+        previous = self._emit_tails.get(chat_key)
+        task = asyncio.create_task(
+            self._deliver_status(__event_emitter__, event, previous)
+        )
+        self._emit_tails[chat_key] = task
+        self._background_tasks.add(task)
+
+        def forget(finished: asyncio.Task):
+            self._background_tasks.discard(finished)
+            if self._emit_tails.get(chat_key) is finished:
+                del self._emit_tails[chat_key]
+
+        task.add_done_callback(forget)
+
+    async def _deliver_status(
+        self,
+        __event_emitter__: Callable[[dict], Awaitable[None]],
+        event: dict,
+        previous: Optional[asyncio.Task],
+    ):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await __event_emitter__(event)
+        except Exception as e:
+            log.warning("Failed to emit status: %s", e)
+
+    def _start_heartbeat(
+        self, __event_emitter__: Callable[[dict], Awaitable[None]] = None
+    ) -> Optional[asyncio.Task]:
+        """Report "still working" progress every emit_interval until cancelled."""
+        if not (
             __event_emitter__
             and self.valves.enable_status_indicator
-            and (
-                current_time - self.last_emit_time >= self.valves.emit_interval or done
-            )
+            and self.valves.emit_interval > 0
         ):
-            await __event_emitter__(
-                {
-                    "type": "status",
-                    "data": {
-                        "status": "complete" if done else "in_progress",
-                        "level": level,
-                        "description": message,
-                        "done": done,
-                    },
-                }
+            return None
+
+        async def beat():
+            started = time.monotonic()
+            while True:
+                await asyncio.sleep(self.valves.emit_interval)
+                await self.emit_status(
+                    __event_emitter__,
+                    "info",
+                    f"Still working ({time.monotonic() - started:.0f}s)",
+                    False,
+                )
+
+        return asyncio.create_task(beat())
+
+    def _chunk_text(self, line: str) -> Optional[str]:
+        """Extract the text carried by one NDJSON/SSE line, or None for control events."""
+        event = json.loads(line)
+        if not isinstance(event, dict):
+            return None
+        event_type = event.get("type")
+        if event_type == "item":
+            return event.get("content") or ""
+        if event_type == "error":
+            raise Exception(f"Error: {event.get('content') or 'n8n stream error'}")
+        if event_type in ("begin", "end"):
+            return None
+        if self.valves.response_field in event:
+            return event[self.valves.response_field]
+        return None
+
+    async def _iter_response_text(
+        self, response: aiohttp.ClientResponse
+    ) -> AsyncGenerator[str, None]:
+        """Yield reply text from an n8n response, incrementally when it is streamed."""
+        content_type = response.headers.get("Content-Type", "")
+        if (
+            response.content_length is not None
+            and "json" in content_type
+            and "ndjson" not in content_type
+        ):
+            # Plain "Respond to Webhook" JSON: keep the buffered behaviour
+            yield (await response.json(content_type=None))[self.valves.response_field]
+            return
+
+        unparsed = []
+        streamed = False
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if not line or line.startswith(":"):
+                continue
+            if line.startswith("data:"):
+                line = line[5:].strip()
+            elif line.startswith(("event:", "id:", "retry:")):
+                continue
+            if line == "[DONE]":
+                break
+            try:
+                text = self._chunk_text(line)
+            except json.JSONDecodeError:
+                unparsed.append(line)
+                continue
+            if text:
+                streamed = True
+                yield text
+
+        # A chunked body that was not a stream at all (e.g. pretty-printed JSON)
+        if unparsed and not streamed:
+            raw = "\n".join(unparsed)
+            try:
+                yield json.loads(raw)[self.valves.response_field]
+            except (json.JSONDecodeError, TypeError, KeyError):
+                yield raw
+
+    async def _acquire_slot(
+        self,
+        trace: dict,
+        __event_emitter__: Callable[[dict], Awaitable[None]] = None,
+    ):
+        """Wait for a free n8n slot, reporting the queue position to the user."""
+
+        async def report_position(position: int):
+            await self.emit_status(
+                __event_emitter__, "info", f"Queued, position {position}", False
+            )
+
+        queued_at = time.monotonic()
+        await self._limiter.acquire(
+            self.valves.max_concurrent_requests,
+            self.valves.max_queue_size,
+            report_position,
+            self.valves.emit_interval,
+        )
+        trace["queue_wait"] = time.monotonic() - queued_at
+
+    def _release_slot(self):
+        self._limiter.release(self.valves.max_concurrent_requests)
+
+    def _retry_statuses(self) -> set[int]:
+        return {
+            int(code)
+            for code in self.valves.retry_status_codes.split(",")
+            if code.strip().isdigit()
+        }
+
+    async def _post(
+        self,
+        payload: dict,
+        headers: dict,
+        trace: dict,
+        __event_emitter__: Callable[[dict], Awaitable[None]] = None,
+    ) -> aiohttp.ClientResponse:
+        """POST to n8n and return the 200 response, retrying transient failures.
+
+        Only failures where n8n cannot have run the workflow are retried: refused
+        connections and the configured gateway statuses. The caller releases the
+        returned response.
+        """
+        retry_statuses = self._retry_statuses()
+        data = json.dumps(payload).encode("utf-8")
+        if 0 < self.valves.compress_min_bytes <= len(data):
+            data = gzip.compress(data, compresslevel=6)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        trace["request_bytes"] = len(data)
+        self._balancer.sync(self._endpoint_urls())
+        failed_endpoints = set()
+        attempt = 0
+        while True:
+            probe = self._breaker.before_call(self.valves.circuit_reset_timeout)
+            endpoint = self._balancer.pick(self.valves.load_balancing, failed_endpoints)
+            self._assign_endpoint(trace, endpoint)
+            webhook = endpoint.url
+            session = self._get_session()
+            sent_at = time.monotonic()
+            try:
+                response = await session.post(
+                    webhook, data=data, headers=headers, trace_request_ctx=trace
+                )
+            except aiohttp.ClientConnectorError as e:
+                self.metrics.inc("n8n_pipe_responses_total", webhook, "connect_error")
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.metrics.inc("n8n_pipe_responses_total", webhook, "transport_error")
+                self._endpoint_failed(trace)
+                self._breaker.record_failure(self.valves.circuit_failure_threshold)
+                raise
+            else:
+                self.metrics.inc("n8n_pipe_responses_total", webhook, str(response.status))
+                if response.status == 200:
+                    trace["ttfb"] = time.monotonic() - sent_at
+                    self._balancer.reinstate(endpoint)
+                    self._breaker.record_success()
+                    return response
+                async with response:
+                    error = Exception(
+                        f"Error: {response.status} - {await response.text()}"
+                    )
+                if response.status not in retry_statuses:
+                    if probe:
+                        self._breaker.record_failure(
+                            self.valves.circuit_failure_threshold
+                        )
+                    raise error
+            finally:
+                # Cancelled probes and probes ending in a non-retryable status must
+                # not leave the breaker half-open with no probe running
+                if probe:
+                    self._breaker.end_probe()
+
+            self._endpoint_failed(trace)
+            failed_endpoints.add(webhook)
+            self._breaker.record_failure(self.valves.circuit_failure_threshold)
+            if attempt >= self.valves.max_retries:
+                raise error
+            # Exponential backoff with full jitter
+            delay = random.uniform(
+                0,
+                min(
+                    self.valves.retry_backoff_max,
+                    self.valves.retry_backoff_base * 2**attempt,
+                ),
+            )
+            attempt += 1
+            await self.emit_status(
+                __event_emitter__,
+                "warning",
+                f"n8n unavailable ({error}), retry {attempt}/{self.valves.max_retries} "
+                f"in {delay:.1f}s",
+                False,
+            )
+            await asyncio.sleep(delay)
+
+    async def _fetch_reply(
+        self,
+        payload: dict,
+        headers: dict,
+        trace: dict,
+        __event_emitter__: Callable[[dict], Awaitable[None]] = None,
+    ):
+        """POST the payload to n8n and return the buffered response_field value."""
+        response = await self._post(payload, headers, trace, __event_emitter__)
+        async with response:
+            raw = await response.read()
+        trace["bytes"] = len(raw)
+        return json.loads(raw)[self.valves.response_field]
+
+    def _take_off(self, flight_key: Optional[tuple]) -> Optional[tuple]:
+        """Register a leader for `flight_key` unless another request already leads it."""
+        if flight_key is None or flight_key in self._inflight:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        return flight_key, future
+
+    def _land_flight(
+        self, flight: Optional[tuple], result=None, error: Optional[Exception] = None
+    ):
+        """Hand the leader's outcome to every coalesced follower."""
+        if flight is None:
+            return
+        flight_key, future = flight
+        if self._inflight.get(flight_key) is future:
+            del self._inflight[flight_key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Mark as retrieved so a flight without followers does not log a warning
+            future.exception()
+        else:
+            future.set_result(result)
+
+    async def _run_workflow(
+        self,
+        payload: dict,
+        headers: dict,
+        flight: Optional[tuple],
+        trace: dict,
+        __event_emitter__: Callable[[dict], Awaitable[None]] = None,
+    ):
+        """Call n8n for a buffered reply and share the outcome with coalesced followers."""
+        outcome = "cancelled"
+        try:
+            await self._acquire_slot(trace, __event_emitter__)
+            heartbeat = self._start_heartbeat(__event_emitter__)
+            try:
+                n8n_response = await self._fetch_reply(
+                    payload, headers, trace, __event_emitter__
+                )
+            finally:
+                if heartbeat:
+                    heartbeat.cancel()
+                self._release_slot()
+            outcome = "ok"
+            self._land_flight(flight, result=n8n_response)
+            return n8n_response
+        except Exception as e:
+            outcome = self._outcome(e)
+            self._land_flight(flight, error=e)
+            raise
+        finally:
+            self._finish_trace(trace, outcome)
+            self._land_flight(
+                flight, error=Exception("The coalesced request was cancelled")
             )
-            self.last_emit_time = current_time
+
+    async def _stream_reply(
+        self,
+        body: dict,
+        payload: dict,
+        headers: dict,
+        cache_key: Optional[tuple] = None,
+        flight_key: Optional[tuple] = None,
+        trace: Optional[dict] = None,
+        __event_emitter__: Callable[[dict], Awaitable[None]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Forward the n8n reply to Open WebUI chunk by chunk."""
+        chunks = []
+        acquired = False
+        heartbeat = None
+        outcome = "cancelled"
+        flight = self._take_off(flight_key)
+        try:
+            await self._acquire_slot(trace, __event_emitter__)
+            acquired = True
+            heartbeat = self._start_heartbeat(__event_emitter__)
+            response = await self._post(payload, headers, trace, __event_emitter__)
+            async with response:
+                async for text in self._iter_response_text(response):
+                    if heartbeat:
+                        # Tokens are visible from here on
+                        heartbeat.cancel()
+                        heartbeat = None
+                    chunks.append(text)
+                    yield text
+                trace["bytes"] = response.content.total_bytes
+            outcome = "ok"
+            n8n_response = "".join(chunks)
+            body["messages"].append({"role": "assistant", "content": n8n_response})
+            self._cache_store(cache_key, n8n_response)
+            self._land_flight(flight, result=n8n_response)
+        except Exception as e:
+            outcome = self._outcome(e)
+            self._land_flight(flight, error=e)
+            await self.emit_status(
+                __event_emitter__,
+                "error",
+                f"Error during sequence execution: {str(e)}",
+                True,
+            )
+            yield f"Error: {str(e)}"
+            return
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+            if acquired:
+                self._release_slot()
+            self._finish_trace(trace, outcome)
+            # The client may disconnect mid-stream (GeneratorExit); never leave
+            # followers hanging or the flight registered
+            self._land_flight(
+                flight, error=Exception("The coalesced request was cancelled")
+            )
+
+        await self.emit_status(
+            __event_emitter__, "info", self._complete_message(cache_key), True
+        )
+
+    def _outcome(self, error: Exception) -> str:
+        if isinstance(error, QueueFullError):
+            return "queue_full"
+        if isinstance(error, CircuitOpenError):
+            return "circuit_open"
+        return "error"
+
+    def _complete_message(self, cache_key: Optional[tuple]) -> str:
+        if cache_key is None:
+            return "Complete"
+        return f"Complete ({self._cache_stats()})"
 
     async def pipe(
         self,
@@ -80,34 +1270,94 @@ class Pipe:
         __user__: Optional[dict] = None,
         __event_emitter__: Callable[[dict], Awaitable[None]] = None,
         __event_call__: Callable[[dict], Awaitable[dict]] = None,
-    ) -> Optional[dict]:
+    ) -> Optional[Union[str, dict, AsyncGenerator[str, None]]]:
+        await self._ensure_metrics_server()
         await self.emit_status(
             __event_emitter__, "info", "/Calling N8N Workflow...", False
         )
         chat_id, _ = extract_event_info(__event_emitter__)
         messages = body.get("messages", [])
+        n8n_response = None
+        cache_key = None
 
         # Verify a message is available
         if messages:
             question = messages[-1]["content"]
-            try:
-                # Invoke N8N workflow
-                headers = {
-                    "Authorization": f"Bearer {self.valves.n8n_bearer_token}",
-                    "Content-Type": "application/json",
-                }
-                payload = {"sessionId": f"{chat_id}"}
-                payload[self.valves.input_field] = question
-                response = requests.post(
-                    self.valves.n8n_url, json=payload, headers=headers
+            headers = {
+                "Authorization": f"Bearer {self.valves.n8n_bearer_token}",
+                "Content-Type": "application/json",
+            }
+            payload = {"sessionId": f"{chat_id}"}
+            payload[self.valves.input_field] = question
+            history = None
+            if self.valves.send_history:
+                history = self._history_window(messages)
+                payload[self.valves.history_field] = history
+
+            if self.valves.enable_cache:
+                cache_key = self._request_key(question, chat_id, __user__, history)
+                cached = self._cache.get(cache_key, self.valves.cache_ttl)
+                if cached is not None:
+                    self.metrics.inc(
+                        "n8n_pipe_requests_total", self._webhook_label(), "cache_hit"
+                    )
+                    body["messages"].append({"role": "assistant", "content": cached})
+                    await self.emit_status(
+                        __event_emitter__,
+                        "info",
+                        f"Answered from cache ({self._cache_stats()})",
+                        True,
+                    )
+                    return cached
+
+            flight_key = None
+            leader_future = None
+            if self.valves.coalesce_requests:
+                flight_key = self._request_key(question, chat_id, __user__, history)
+                leader_future = self._inflight.get(flight_key)
+
+            if leader_future is None and (
+                self.valves.stream_response and body.get("stream", True)
+            ):
+                # The generator registers the flight once it runs, so a reply that
+                # is never iterated leaves no followers waiting on it
+                return self._stream_reply(
+                    body,
+                    payload,
+                    headers,
+                    cache_key,
+                    flight_key,
+                    self._start_trace(chat_id),
+                    __event_emitter__,
                 )
-                if response.status_code == 200:
-                    n8n_response = response.json()[self.valves.response_field]
+            flight = self._take_off(flight_key) if leader_future is None else None
+
+            try:
+                if leader_future is not None:
+                    # An identical request is already running: share its result
+                    await self.emit_status(
+                        __event_emitter__,
+                        "info",
+                        "Waiting for an identical request already in progress...",
+                        False,
+                    )
+                    n8n_response = await asyncio.shield(leader_future)
+                    self.metrics.inc(
+                        "n8n_pipe_requests_total", self._webhook_label(), "coalesced"
+                    )
                 else:
-                    raise Exception(f"Error: {response.status_code} - {response.text}")
+                    # Invoke N8N workflow
+                    n8n_response = await self._run_workflow(
+                        payload,
+                        headers,
+                        flight,
+                        self._start_trace(chat_id),
+                        __event_emitter__,
+                    )
 
                 # Set assitant message with chain reply
                 body["messages"].append({"role": "assistant", "content": n8n_response})
+                self._cache_store(cache_key, n8n_response)
             except Exception as e:
                 await self.emit_status(
                     __event_emitter__,
@@ -131,5 +1381,7 @@ class Pipe:
                 }
             )
 
-        await self.emit_status(__event_emitter__, "info", "Complete", True)
+        await self.emit_status(
+            __event_emitter__, "info", self._complete_message(cache_key), True
+        )
         return n8n_response
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+ollama_models.py
+
+Ollama model management for start_services.py. The models the stack needs are
+declared in ollama_models.json; once Ollama answers, the models already present in
+the ollama_storage volume are listed, only the missing ones are pulled (in parallel,
+while the other services keep starting), and the chat and embedding models are
+preloaded so the first request doesn't pay the model load time.
+
+When the host can't reach Ollama's port (it is only exposed, and Docker Desktop
+routes published ports alone), the same steps run through the ollama CLI inside
+the container.
+"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from docker_api import DockerAPIError, get_client
+from readiness import backoff, container_address
+from startup_timeline import run_process, timeline
+
+DEFAULT_MANIFEST = "ollama_models.json"
+OLLAMA_CONTAINER = "ollama"
+OLLAMA_PORT = 11434
+
+def load_manifest(path=DEFAULT_MANIFEST):
+    """Return the manifest dict: {"keep_alive": str, "models": [{"name", "role"}]}."""
+    with open(path) as f:
+        manifest = json.load(f)
+    for model in manifest.get("models", []):
+        if model.get("role") not in ("chat", "embedding"):
+            raise ValueError(f"Model {model.get('name')}: role must be 'chat' or 'embedding'")
+    return manifest
+
+def normalize_model_name(name):
+    """Ollama reports untagged models as name:latest."""
+    return name if ":" in name else f"{name}:latest"
+
+def _post(base_url, path, payload, timeout=None):
+    request = urllib.request.Request(
+        base_url + path, data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"}, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        # Ollama explains failures (unknown model, disk full, ...) in the body
+        try:
+            message = json.loads(e.read()).get("error")
+        except ValueError:
+            message = None
+        raise RuntimeError(message or f"HTTP {e.code} from {path}") from e
+
+def installed_models(base_url):
+    """Return the set of (normalized) model names present in Ollama's storage."""
+    with urllib.request.urlopen(base_url + "/api/tags", timeout=5) as response:
+        data = json.loads(response.read())
+    return {normalize_model_name(model["name"]) for model in data.get("models", [])}
+
+def pull_model(base_url, name):
+    """Pull one model; blocks until the download has finished."""
+    result = _post(base_url, "/api/pull", {"model": name, "stream": False})
+    if result.get("status") != "success":
+        raise RuntimeError(result.get("error") or f"unexpected pull status {result.get('status')}")
+
+def warm_model(base_url, name, role, keep_alive):
+    """Load a model into memory and keep it there for `keep_alive`."""
+    if role == "embedding":
+        _post(base_url, "/api/embed", {"model": name, "input": "warm up", "keep_alive": keep_alive})
+    else:
+        # A generate request without a prompt only loads the model
+        _post(base_url, "/api/generate", {"model": name, "keep_alive": keep_alive})
+
+def ollama_exec(args):
+    """Run the ollama CLI inside the Ollama container and return its output."""
+    client = get_client()
+    if client:
+        exit_code, output = client.exec(OLLAMA_CONTAINER, ["ollama"] + args)
+    else:
+        result = run_process(["docker", "exec", OLLAMA_CONTAINER, "ollama"] + args,
+                             capture_output=True, text=True, check=False)
+        exit_code, output = result.returncode, result.stdout + result.stderr
+    if exit_code != 0:
+        lines = output.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"ollama {args[0]} exited with code {exit_code}")
+    return output
+
+def installed_models_exec():
+    """installed_models through `ollama list` in the container."""
+    lines = ollama_exec(["list"]).strip().splitlines()[1:]  # skip the NAME ID SIZE MODIFIED header
+    return {normalize_model_name(line.split()[0]) for line in lines if line.strip()}
+
+def pull_model_exec(name):
+    """pull_model through `ollama pull` in the container."""
+    ollama_exec(["pull", name])
+
+def warm_model_exec(name, role, keep_alive):
+    """warm_model through `ollama run` in the container; an empty prompt only loads the model."""
+    ollama_exec(["run", "--keepalive", keep_alive, name, "warm up" if role == "embedding" else ""])
+
+class ModelManager:
+    """
+    Bring the Ollama models of a manifest into place in the background.
+
+    Args:
+        manifest: dict from load_manifest
+        base_url: Ollama URL, or None to reach the `ollama` container directly
+            (over its address, or with docker exec when the host can't reach it)
+        timeout: seconds to wait for Ollama to answer before giving up
+    """
+
+    def __init__(self, manifest, base_url=None, timeout=300):
+        self.manifest = manifest
+        self.base_url = base_url
+        self.timeout = timeout
+        self.report = {}
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start waiting for Ollama, pulling and warming; returns self for chaining."""
+        self._thread = threading.Thread(target=self._run, name="ollama-models", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Wait for all pulls and warm-ups; returns True if every model is ready."""
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        return not self.error and all(entry.get("ready") for entry in self.report.values())
+
+    def _record(self, name, **values):
+        with self._lock:
+            self.report.setdefault(name, {}).update(values)
+
+    def _resolve_base_url(self):
+        if self.base_url:
+            return self.base_url
+        address = container_address(OLLAMA_CONTAINER, OLLAMA_PORT)
+        return f"http://{address[0]}:{address[1]}" if address else None
+
+    def _wait_for_ollama(self):
+        deadline = time.monotonic() + self.timeout
+        for delay in backoff(maximum=5.0):
+            try:
+                # Resolving inspects the container, which fails while Docker is busy too
+                base_url = self._resolve_base_url()
+                if base_url:
+                    return base_url, installed_models(base_url)
+                # No reachable address: talk to Ollama through the CLI in its container
+                return None, installed_models_exec()
+            except (urllib.error.URLError, OSError, ValueError, DockerAPIError, RuntimeError):
+                pass
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Ollama did not answer within {self.timeout}s")
+            time.sleep(delay)
+
+    def _prepare(self, base_url, model, installed):
+        name = model["name"]
+        try:
+            if normalize_model_name(name) in installed:
+                self._record(name, status="present")
+            else:
+                start = timeline.now()
+                if base_url:
+                    pull_model(base_url, name)
+                else:
+                    pull_model_exec(name)
+                timeline.add_phase(f"pull {name}", start, timeline.now())
+                self._record(name, status="pulled", pull=timeline.now() - start)
+            start = timeline.now()
+            keep_alive = self.manifest.get("keep_alive", "30m")
+            if base_url:
+                warm_model(base_url, name, model["role"], keep_alive)
+            else:
+                warm_model_exec(name, model["role"], keep_alive)
+            timeline.add_phase(f"warm {name}", start, timeline.now())
+            self._record(name, ready=True, warm=timeline.now() - start)
+        except (urllib.error.URLError, OSError, ValueError, RuntimeError, DockerAPIError) as e:
+            self._record(name, ready=False, error=str(getattr(e, "reason", e)))
+
+    def _run(self):
+        models = self.manifest.get("models", [])
+        try:
+            base_url, installed = self._wait_for_ollama()
+        except Exception as e:
+            # wait() reports success unless the error is recorded
+            self.error = str(e) if isinstance(e, RuntimeError) else f"{type(e).__name__}: {e}"
+            return
+        if not models:
+            return
+        with ThreadPoolExecutor(max_workers=len(models)) as pool:
+            for model in models:
+                pool.submit(self._prepare, base_url, model, installed)
+
+    def print_report(self):
+        print("\n" + "="*60)
+        print("Ollama models")
+        print("="*60)
+        if self.error:
+            print(f"  ❌ {self.error}")
+        for model in self.manifest.get("models", []):
+            entry = self.report.get(model["name"], {})
+            if entry.get("ready"):
+                pulled = f"pulled in {entry['pull']:.1f}s, " if "pull" in entry else "already present, "
+                print(f"  ✅ {model['name']:32} {model['role']:9} {pulled}warmed in {entry['warm']:.1f}s")
+            else:
+                print(f"  ❌ {model['name']:32} {model['role']:9} {entry.get('error', 'not prepared')}")
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+readiness.py
+
+Readiness probes shared by the launch scripts. Instead of fixed sleeps, each service
+is probed until it actually accepts work: a Postgres protocol handshake for the
+database, HTTP health endpoints for Kong, n8n, Ollama and friends, and the Docker
+health status for everything else. Probes run concurrently with adaptive backoff and
+a per-service deadline, and end with a report of what is (not) ready and why.
+Container state can also be followed from the Docker event stream, so waiting on a
+healthcheck costs no polling at all.
+"""
+
+import json
+import platform
+import socket
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from docker_api import DockerAPIError, get_client
+from startup_graph import CONDITION_COMPLETED, CONDITION_HEALTHY, CONDITION_STARTED
+from startup_timeline import run_process
+
+class ProbeFailed(Exception):
+    """A probe saw a state that will not recover (exited, unhealthy, ...)."""
+
+class WatcherStopped(Exception):
+    """The Docker event stream ended; waiters fall back to polling."""
+
+class ProbeResult:
+    """Outcome of waiting on one probe; truthy when the service became ready."""
+
+    def __init__(self, name, ready, elapsed, attempts, detail):
+        self.name = name
+        self.ready = ready
+        self.elapsed = elapsed
+        self.attempts = attempts
+        self.detail = detail
+
+    def __bool__(self):
+        return self.ready
+
+def backoff(initial=0.1, factor=1.5, maximum=2.0):
+    """Yield growing delays: fast first checks, then gentle polling."""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+def container_state(project, service):
+    """Return the docker State dict of a compose service's container, or None."""
+    client = get_client()
+    if client:
+        containers = client.containers(all=True, filters={"label": [
+            f"com.docker.compose.project={project}",
+            f"com.docker.compose.service={service}",
+        ]})
+        if not containers:
+            return None
+        try:
+            return client.inspect(containers[0]["Id"])["State"]
+        except DockerAPIError:
+            return None
+    result = run_process(
+        ["docker", "ps", "-a", "-q",
+         "--filter", f"label=com.docker.compose.project={project}",
+         "--filter", f"label=com.docker.compose.service={service}"],
+        capture_output=True, text=True, check=False
+    )
+    container_ids = result.stdout.split()
+    if not container_ids:
+        return None
+    result = run_process(
+        ["docker", "inspect", "--format", "{{json .State}}", container_ids[0]],
+        capture_output=True, text=True, check=False
+    )
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout)
+
+def container_address(container, port):
+    """
+    Return a (host, port) the launcher can reach the container port on, or None.
+
+    On Linux the container IP is routable from the host; elsewhere (Docker Desktop)
+    only published ports are, so the published mapping is used. Probes fall back to
+    exec_probe() when this is None or the address can't be routed (rootless Docker).
+    """
+    client = get_client()
+    if client:
+        try:
+            settings = client.inspect(container)["NetworkSettings"]
+        except DockerAPIError:
+            return None
+        if platform.system() == "Linux":
+            addresses = [
+                network["IPAddress"] for network in (settings.get("Networks") or {}).values()
+                if network.get("IPAddress")
+            ]
+            return (addresses[0], port) if addresses else None
+        for binding in (settings.get("Ports") or {}).get(f"{port}/tcp") or []:
+            host = binding.get("HostIp") or "127.0.0.1"
+            return ("127.0.0.1" if host in ("0.0.0.0", "::") else host, int(binding["HostPort"]))
+        return None
+    if platform.system() == "Linux":
+        result = run_process(
+            ["docker", "inspect", "--format",
+             "{{range .NetworkSettings.Networks}}{{.IPAddress}} {{end}}", container],
+            capture_output=True, text=True, check=False
+        )
+        addresses = result.stdout.split()
+        return (addresses[0], port) if addresses else None
+    result = run_process(
+        ["docker", "port", container, str(port)],
+        capture_output=True, text=True, check=False
+    )
+    for line in result.stdout.splitlines():
+        host, _, published = line.rpartition(":")
+        if published.isdigit():
+            host = host.strip("[]")
+            return ("127.0.0.1" if host in ("0.0.0.0", "::") else host, int(published))
+    return None
+
+def exec_probe(container, cmd):
+    """
+    Run a check command inside the container, for ports the host can't reach
+    (unpublished ports on Docker Desktop, rootless Docker, ...).
+
+    Returns:
+        (ready, detail); an image without the probe tool counts as ready, as the
+        container state was already waited on
+    """
+    client = get_client()
+    try:
+        if client:
+            exit_code, output = client.exec(container, cmd)
+        else:
+            result = run_process(["docker", "exec", container] + cmd,
+                                 capture_output=True, text=True, check=False)
+            exit_code, output = result.returncode, result.stdout + result.stderr
+    except (DockerAPIError, OSError) as e:
+        return False, f"exec {cmd[0]}: {e}"
+    if exit_code in (126, 127):
+        return True, f"{cmd[0]} not in the image, container state only"
+    lines = output.strip().splitlines()
+    detail = f"{cmd[0]} in container: {lines[-1] if lines else f'exit code {exit_code}'}"
+    return exit_code == 0, detail
+
+def _unreachable(error):
+    """True when a connection error means the address can't be routed, not that nothing listens."""
+    return not isinstance(getattr(error, "reason", error), ConnectionRefusedError)
+
+# Conditions a container that already exited with code 0 satisfies
+SUCCESS_SATISFIES = (CONDITION_STARTED, CONDITION_COMPLETED)
+
+class DockerStateProbe:
+    """Wait for a compose service's container to reach a depends_on condition."""
+
+    def __init__(self, project, service, condition=CONDITION_HEALTHY):
+        self.name = service
+        self.project = project
+        self.service = service
+        self.condition = condition
+
+    def check(self):
+        state = container_state(self.project, self.service)
+        if not state:
+            return False, "container not created"
+        status = state.get("Status")
+        health = (state.get("Health") or {}).get("Status")
+        if status == "exited":
+            # Like compose, a clean exit also satisfies service_started (quick one-shots)
+            if self.condition in SUCCESS_SATISFIES and state.get("ExitCode") == 0:
+                return True, "completed successfully"
+            raise ProbeFailed(f"exited with code {state.get('ExitCode')}")
+        if self.condition == CONDITION_COMPLETED:
+            return False, f"still {status}"
+        if self.condition == CONDITION_HEALTHY and health is not None:
+            if health == "unhealthy":
+                raise ProbeFailed("container is unhealthy")
+            return health == "healthy", f"health {health}"
+        return bool(state.get("Running")), status
+
+class PostgresProbe:
+    """
+    Postgres startup handshake, the same test pg_isready performs. When the host
+    can't reach the port, pg_isready itself runs inside the container.
+    """
+
+    def __init__(self, container, port=5432, user="postgres", name=None):
+        self.name = name or container
+        self.container = container
+        self.port = port
+        self.user = user
+
+    def _in_container(self):
+        return exec_probe(self.container, [
+            "pg_isready", "-h", "localhost", "-p", str(self.port), "-U", self.user,
+        ])
+
+    def check(self):
+        address = container_address(self.container, self.port)
+        if address is None:
+            return self._in_container()
+        params = f"user\0{self.user}\0database\0postgres\0\0".encode()
+        startup = struct.pack("!ii", 8 + len(params), 196608) + params
+        try:
+            with socket.create_connection(address, timeout=2) as sock:
+                sock.sendall(startup)
+                kind = sock.recv(1)
+                if kind == b"R":
+                    # Authentication request: the server accepts connections
+                    sock.sendall(b"X\0\0\0\4")
+                    return True, "accepting connections"
+                if kind == b"E":
+                    length = struct.unpack("!i", _recv_exact(sock, 4))[0]
+                    fields = {
+                        field[:1].decode(): field[1:].decode(errors="replace")
+                        for field in _recv_exact(sock, length - 4).split(b"\0") if field
+                    }
+                    if fields.get("C") == "57P03":  # cannot_connect_now
+                        return False, fields.get("M", "starting up")
+                    return True, f"accepting connections ({fields.get('M')})"
+                return False, f"unexpected reply {kind!r}"
+        except OSError as e:
+            if _unreachable(e):
+                return self._in_container()
+            return False, str(e)
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise OSError("connection closed during handshake")
+        data += chunk
+    return data
+
+class HttpProbe:
+    """
+    HTTP GET against a container port; ready when the status is accepted.
+
+    When the host can't reach the port, `exec_cmd` runs inside the container instead;
+    without one the container state (already waited on) decides.
+    """
+
+    def __init__(self, container, port, path="/", accept=None, name=None, exec_cmd=None):
+        self.name = name or container
+        self.container = container
+        self.port = port
+        self.path = path
+        self.accept = accept or (lambda status: status == 200)
+        self.exec_cmd = exec_cmd
+
+    def _in_container(self, reason):
+        if self.exec_cmd:
+            return exec_probe(self.container, self.exec_cmd)
+        return True, f"{reason}, container state only"
+
+    def check(self):
+        address = container_address(self.container, self.port)
+        if address is None:
+            return self._in_container("port not reachable from the host")
+        url = f"http://{address[0]}:{address[1]}{self.path}"
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError) as e:
+            if _unreachable(e):
+                return self._in_container(f"{address[0]} not routable")
+            return False, str(getattr(e, "reason", e))
+        return self.accept(status), f"HTTP {status} from {self.path}"
+
+OLLAMA_EXEC = ["ollama", "list"]
+
+# Application-level probes for services whose Docker state alone says little. The
+# exec commands are the in-container fallbacks, using tools each image ships with.
+SERVICE_PROBES = {
+    "db": lambda: PostgresProbe("supabase-db", name="db"),
+    "kong": lambda: HttpProbe("supabase-kong", 8000, "/", accept=lambda s: s < 500, name="kong",
+                              exec_cmd=["kong", "health"]),
+    "n8n": lambda: HttpProbe("n8n", 5678, "/healthz", name="n8n",
+                             exec_cmd=["wget", "-q", "-O", "-", "http://localhost:5678/healthz"]),
+    "open-webui": lambda: HttpProbe("open-webui", 8080, "/health", name="open-webui",
+                                    exec_cmd=["curl", "-fsS", "http://localhost:8080/health"]),
+    "neo4j": lambda: HttpProbe("local-ai-packaged-neo4j-1", 7474, "/", name="neo4j"),
+    "ollama-cpu": lambda: HttpProbe("ollama", 11434, "/api/tags", name="ollama-cpu", exec_cmd=OLLAMA_EXEC),
+    "ollama-gpu": lambda: HttpProbe("ollama", 11434, "/api/tags", name="ollama-gpu", exec_cmd=OLLAMA_EXEC),
+    "ollama-gpu-amd": lambda: HttpProbe("ollama", 11434, "/api/tags", name="ollama-gpu-amd",
+                                        exec_cmd=OLLAMA_EXEC),
+}
+
+def wait_until_ready(probe, deadline):
+    """Check `probe` with adaptive backoff until it is ready, fails, or the deadline passes."""
+    started = time.monotonic()
+    attempts = 0
+    detail = "not checked"
+    for delay in backoff():
+        attempts += 1
+        try:
+            ready, detail = probe.check()
+        except ProbeFailed as e:
+            return ProbeResult(probe.name, False, time.monotonic() - started, attempts, str(e))
+        if ready:
+            return ProbeResult(probe.name, True, time.monotonic() - started, attempts, detail)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return ProbeResult(probe.name, False, time.monotonic() - started, attempts,
+                               f"timed out: {detail}")
+        time.sleep(min(delay, remaining))
+
+class ContainerEventWatcher:
+    """
+    Resolve container readiness from the Docker event stream instead of polling.
+
+    One subscription to start/die/health_status events of the compose project feeds
+    a future per (service, condition); a single state check when a future is
+    registered covers containers that were already up. Without the Engine API, or
+    if the stream drops, `alive` is False and callers fall back to polling.
+    """
+
+    def __init__(self, project, client=None):
+        self.project = project
+        self.client = client or get_client()
+        self.alive = False
+        self._stream = None
+        self._pending = {}
+        self._last_seen = {}
+        self._event_counts = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Subscribe to the event stream; returns self for chaining."""
+        if self.client is None:
+            return self
+        try:
+            self._stream = self.client.events(filters={
+                "type": ["container"],
+                "label": [f"com.docker.compose.project={self.project}"],
+                "event": ["start", "die", "health_status"],
+            })
+        except (DockerAPIError, OSError):
+            return self
+        self.alive = True
+        threading.Thread(target=self._consume, name="docker-events", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.close()
+
+    def _consume(self):
+        try:
+            for event in self._stream:
+                self._handle(event)
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        for entries in pending.values():
+            for _, _, future in entries:
+                self._settle(future, error=WatcherStopped())
+
+    def _settle(self, future, detail=None, error=None):
+        with self._lock:
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(detail)
+
+    def _handle(self, event):
+        attributes = (event.get("Actor") or {}).get("Attributes") or {}
+        service = attributes.get("com.docker.compose.service")
+        action = event.get("Action") or event.get("status") or ""
+        with self._lock:
+            self._last_seen[service] = action
+            self._event_counts[service] = self._event_counts.get(service, 0) + 1
+            # Events from before a wait was registered (e.g. the preceding down) don't count
+            entries = [
+                (condition, future)
+                for condition, registered, future in self._pending.get(service, [])
+                if event.get("timeNano", registered) >= registered
+            ]
+
+        for condition, future in entries:
+            if action == "start":
+                if condition == CONDITION_STARTED:
+                    self._settle(future, "started")
+                elif condition == CONDITION_HEALTHY:
+                    # No health events will follow for containers without a healthcheck
+                    try:
+                        state = self.client.inspect(event["Actor"]["ID"])["State"]
+                    except DockerAPIError:
+                        continue
+                    if not state.get("Health"):
+                        self._settle(future, "started (no healthcheck)")
+            elif action.startswith("health_status"):
+                health = action.split(":", 1)[-1].strip()
+                if health == "healthy" and condition != CONDITION_COMPLETED:
+                    self._settle(future, "health healthy")
+                elif health == "unhealthy" and condition == CONDITION_HEALTHY:
+                    self._settle(future, error=ProbeFailed("container is unhealthy"))
+            elif action == "die":
+                exit_code = attributes.get("exitCode")
+                if condition in SUCCESS_SATISFIES and exit_code == "0":
+                    self._settle(future, "completed successfully")
+                else:
+                    self._settle(future, error=ProbeFailed(f"exited with code {exit_code}"))
+
+    def watch(self, service, condition):
+        """Return a Future resolved with a detail string once `service` meets `condition`."""
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                future.set_exception(WatcherStopped())
+                return future
+            self._pending.setdefault(service, []).append((condition, time.time_ns(), future))
+        try:
+            ready, detail = DockerStateProbe(self.project, service, condition).check()
+            if ready:
+                self._settle(future, detail)
+        except ProbeFailed as e:
+            self._settle(future, error=e)
+        return future
+
+    def _forget(self, service, future):
+        with self._lock:
+            self._pending[service] = [
+                entry for entry in self._pending.get(service, []) if entry[2] is not future
+            ]
+
+    def wait(self, service, condition, timeout):
+        """Wait for `service` to meet `condition`; returns a ProbeResult."""
+        started = time.monotonic()
+        future = self.watch(service, condition)
+        try:
+            detail = future.result(timeout)
+            ready = True
+        except FutureTimeoutError:
+            detail = f"timed out: last event {self._last_seen.get(service, 'none')}"
+            ready = False
+        except ProbeFailed as e:
+            detail = str(e)
+            ready = False
+        except WatcherStopped:
+            remaining = max(timeout - (time.monotonic() - started), 0)
+            return wait_until_ready(
+                DockerStateProbe(self.project, service, condition), time.monotonic() + remaining
+            )
+        finally:
+            self._forget(service, future)
+        return ProbeResult(service, ready, time.monotonic() - started,
+                           1 + self._event_counts.get(service, 0), detail)
+
+def wait_for_service(project, service, condition, timeout, watcher=None):
+    """
+    Wait until a compose service meets `condition`, then until its application
+    probe (if any) answers. Used as the StartupEngine's wait_for.
+
+    With a live ContainerEventWatcher the container part is event driven.
+    """
+    deadline = time.monotonic() + timeout
+    if watcher is not None and watcher.alive:
+        result = watcher.wait(service, condition, timeout)
+    else:
+        result = wait_until_ready(DockerStateProbe(project, service, condition), deadline)
+    if not result or condition == CONDITION_COMPLETED or service not in SERVICE_PROBES:
+        return result
+    return wait_until_ready(SERVICE_PROBES[service](), deadline)
+
+def wait_for_all(probes, timeout=60):
+    """
+    Run probes concurrently, each with its own deadline.
+
+    Args:
+        probes: list of probes, or (probe, timeout) tuples for per-service deadlines
+        timeout: default deadline in seconds
+    Returns:
+        list of ProbeResult in the order given
+    """
+    entries = [entry if isinstance(entry, tuple) else (entry, timeout) for entry in probes]
+    if not entries:
+        return []
+    now = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(entries)) as pool:
+        futures = [pool.submit(wait_until_ready, probe, now + deadline) for probe, deadline in entries]
+        return [future.result() for future in futures]
+
+def wait_for_stack(project, services, timeout=120, watcher=None):
+    """Wait for several compose services to be healthy (or running) concurrently."""
+    if not services:
+        return []
+    with ThreadPoolExecutor(max_workers=len(services)) as pool:
+        futures = [
+            pool.submit(wait_for_service, project, service, CONDITION_HEALTHY, timeout, watcher)
+            for service in services
+        ]
+        return [future.result() for future in futures]
+
+def print_readiness_report(results):
+    """Print one line per probe with its outcome, wait time and last observation."""
+    for result in results:
+        icon = "✅" if result.ready else "❌"
+        print(f"  {icon} {result.name:20} {result.elapsed:6.1f}s  "
+              f"({result.attempts} checks)  {result.detail}")
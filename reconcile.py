@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+reconcile.py
+
+Incremental startup for the launch scripts. Each service's effective configuration
+(its fragment of the resolved compose config, which already carries the interpolated
+environment values, plus the ID of the local image it runs) is hashed and stored in a
+state file. On the next run only services whose hash changed, or that are not
+running, are (re)created; everything else is left alone.
+"""
+
+import hashlib
+import json
+import os
+
+from startup_timeline import run_process
+
+STATE_FILE_NAME = ".startup_state.json"
+
+def load_effective_config(compose_cmd, cwd=None):
+    """Return the resolved compose config as a dict."""
+    result = run_process(
+        compose_cmd + ["config", "--format", "json"],
+        cwd=cwd, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+def image_id(image):
+    """Return the ID (content digest) of a local image, or "" if it is not pulled yet."""
+    result = run_process(
+        ["docker", "image", "inspect", "--format", "{{.Id}}", image],
+        capture_output=True, text=True, check=False
+    )
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+def service_hashes(config, services=None):
+    """
+    Hash the effective configuration of each service.
+
+    Args:
+        config: resolved compose config from load_effective_config
+        services: service names to hash, or None for all
+    Returns:
+        {service: sha256 hex digest}
+    """
+    images = {}
+    hashes = {}
+    for name, spec in config.get("services", {}).items():
+        if services is not None and name not in services:
+            continue
+        image = spec.get("image", "")
+        if image and image not in images:
+            images[image] = image_id(image)
+        material = json.dumps(
+            {"config": spec, "image_id": images.get(image, "")},
+            sort_keys=True, separators=(",", ":")
+        )
+        hashes[name] = hashlib.sha256(material.encode()).hexdigest()
+    return hashes
+
+def running_services(compose_cmd, cwd=None):
+    """Return the set of services of the compose project that are currently running."""
+    result = run_process(
+        compose_cmd + ["ps", "--services", "--status", "running"],
+        cwd=cwd, capture_output=True, text=True, check=False
+    )
+    return set(result.stdout.split())
+
+def completed_services(compose_cmd, config, cwd=None):
+    """
+    Return the one-shot services (no restart policy, e.g. n8n-import) whose container
+    ran to completion with exit code 0. They are done, not stopped, and starting them
+    again would repeat their work.
+    """
+    result = run_process(
+        compose_cmd + ["ps", "--all", "--format", "json"],
+        cwd=cwd, capture_output=True, text=True, check=False
+    )
+    if result.returncode != 0:
+        return set()
+    output = result.stdout.strip()
+    try:
+        # Older Compose versions print one JSON array, newer ones one object per line
+        containers = json.loads(output) if output.startswith("[") else [
+            json.loads(line) for line in output.splitlines() if line.strip()
+        ]
+    except ValueError:
+        return set()
+    specs = config.get("services", {})
+    completed = set()
+    for container in containers:
+        name = container.get("Service")
+        if (name in specs and specs[name].get("restart", "no") == "no"
+                and container.get("State") == "exited" and container.get("ExitCode") == 0):
+            completed.add(name)
+    return completed
+
+def load_state(project_dir):
+    """Return the stored service hashes, or {} if there is no state yet."""
+    path = os.path.join(project_dir, STATE_FILE_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(project_dir, state):
+    """Write the service hashes atomically so an interrupted run leaves the old state."""
+    path = os.path.join(project_dir, STATE_FILE_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def plan(current, previous, running):
+    """
+    Decide what to do with each service.
+
+    Returns:
+        (changed, stopped, unchanged): services whose hash differs and must be
+        recreated, services with an unchanged hash that are neither running
+        nor completed (see completed_services), and services that can be left as they are
+    """
+    changed, stopped, unchanged = [], [], []
+    for name, digest in sorted(current.items()):
+        if previous.get(name) != digest:
+            changed.append(name)
+        elif name not in running:
+            stopped.append(name)
+        else:
+            unchanged.append(name)
+    return changed, stopped, unchanged
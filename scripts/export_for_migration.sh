@@ -43,10 +43,21 @@ if container_running "n8n"; then
     docker exec n8n n8n export:workflow --all --output=/tmp/workflows_export.json 2>/dev/null || true
     docker cp n8n:/tmp/workflows_export.json "$MIGRATION_DIR/workflows/all_workflows.json" 2>/dev/null || true
 
-    # Also export individual workflow files from backup directory
+    # Also export individual workflow files from backup directory. With python3 they are
+    # snapshotted into the content-addressed store (only new nodes are added) and the
+    # store is shipped instead of the near-identical copies.
     if [ -d "$PROJECT_ROOT/n8n/backup/workflows" ]; then
-        log "  - Copying workflow backup files..."
-        cp -r "$PROJECT_ROOT/n8n/backup/workflows" "$MIGRATION_DIR/workflows/backup_files"
+        if command -v python3 >/dev/null 2>&1; then
+            log "  - Snapshotting workflow backup files..."
+            python3 "$PROJECT_ROOT/n8n/scripts/workflow_store.py" add "$PROJECT_ROOT/n8n/backup/workflows" | tail -n 1
+            # Stores created before blobs were packed still have loose objects
+            python3 "$PROJECT_ROOT/n8n/scripts/workflow_store.py" pack >/dev/null
+            tar cf "$MIGRATION_DIR/workflows/backup_store.tar" -C "$PROJECT_ROOT/n8n/backup" store
+            log "    Restore with: tar xf backup_store.tar && python3 workflow_store.py --store store restore --all -o workflows"
+        else
+            log "  - Copying workflow backup files..."
+            cp -r "$PROJECT_ROOT/n8n/backup/workflows" "$MIGRATION_DIR/workflows/backup_files"
+        fi
     fi
 
     # Export credentials (encrypted)
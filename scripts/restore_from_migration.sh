@@ -200,6 +200,14 @@ else
     log "  ⚠️  No workflows file found - skipping"
 fi
 
+# Exports made with the workflow store ship a snapshot store instead of the files
+if [ -f "$MIGRATION_DIR/workflows/backup_store.tar" ] && [ ! -d "$MIGRATION_DIR/workflows/backup_files" ]; then
+    log "  - Reconstructing backup workflows from the snapshot store..."
+    tar xf "$MIGRATION_DIR/workflows/backup_store.tar" -C "$MIGRATION_DIR/workflows"
+    python3 "$PROJECT_ROOT/n8n/scripts/workflow_store.py" --store "$MIGRATION_DIR/workflows/store" \
+        restore --all -o "$MIGRATION_DIR/workflows/backup_files" >/dev/null
+fi
+
 # Import individual workflow backups if available
 if [ -d "$MIGRATION_DIR/workflows/backup_files" ]; then
     log "  - Importing backup workflows..."
@@ -2,26 +2,49 @@
 """
 start_services.py
 
-This script starts the Supabase stack first, waits for it to initialize, and then starts
-the local AI stack. Both stacks use the same Docker Compose project name ("localai")
-so they appear together in Docker Desktop.
+This script starts the Supabase stack and the local AI stack. Services are started
+through a dependency graph built from the compose files, so each one starts as soon as
+what it depends on is ready (use --sequential for the old Supabase-first start). Both
+stacks use the same Docker Compose project name ("localai") so they appear together
+in Docker Desktop.
 """
 
 import os
-import subprocess
 import shutil
-import time
 import argparse
 import platform
 import sys
 
+from compose_overlay import (
+    STACK_MAIN, STACK_SUPABASE, Override, Reset, ensure_overlay, overlay_args
+)
+from docker_api import get_client
+from ollama_models import DEFAULT_MANIFEST, ModelManager, load_manifest
+from readiness import (
+    ContainerEventWatcher, print_readiness_report, wait_for_service, wait_for_stack
+)
+from startup_graph import ServiceGraph, StartupEngine, load_compose_services, print_report
+import startup_timeline
+from startup_timeline import run_process, timeline
+from supabase_checkout import SupabaseCheckout
+
 def run_command(cmd, cwd=None):
-    """Run a shell command and print it."""
+    """Run a shell command and print it, with its output."""
     print("Running:", " ".join(cmd))
-    subprocess.run(cmd, cwd=cwd, check=True)
+    run_process(cmd, cwd=cwd, check=True, tee=True)
+
+def clone_supabase_repo(ref=None):
+    """
+    Clone the Supabase repository using sparse checkout if not already present.
+
+    With a pinned `ref`, the checkout instead comes from a local mirror cache in the
+    background; the returned SupabaseCheckout must be waited on before Supabase's
+    compose file is used.
+    """
+    if ref:
+        print(f"Checking out Supabase {ref} from the local mirror in the background...")
+        return SupabaseCheckout(os.path.abspath("supabase"), ref).start()
 
-def clone_supabase_repo():
-    """Clone the Supabase repository using sparse checkout if not already present."""
     if not os.path.exists("supabase"):
         print("Cloning the Supabase repository...")
         run_command([
@@ -38,12 +61,14 @@ def clone_supabase_repo():
         os.chdir("supabase")
         run_command(["git", "pull"])
         os.chdir("..")
+    return None
 
 def prepare_supabase_env():
     """Copy .env to .env in supabase/docker."""
     env_path = os.path.join("supabase", "docker", ".env")
     env_example_path = os.path.join(".env")
     print("Copying .env in root to .env in supabase/docker...")
+    os.makedirs(os.path.dirname(env_path), exist_ok=True)
     shutil.copyfile(env_example_path, env_path)
 
 def stop_existing_containers(profile=None):
@@ -54,18 +79,16 @@ def stop_existing_containers(profile=None):
     cmd.extend(["-f", "docker-compose.yml", "down"])
     run_command(cmd)
 
-def start_supabase(environment=None):
-    """Start the Supabase services (using its compose file)."""
-    print("Starting Supabase services...")
+def supabase_compose_command(environment=None):
+    """Base docker compose command for the Supabase stack."""
     cmd = ["docker", "compose", "-p", "localai", "-f", "supabase/docker/docker-compose.yml"]
     if environment and environment == "public":
         cmd.extend(["-f", "docker-compose.override.public.supabase.yml"])
-    cmd.extend(["up", "-d"])
-    run_command(cmd)
+    cmd.extend(overlay_args(".", STACK_SUPABASE))
+    return cmd
 
-def start_local_ai(profile=None, environment=None):
-    """Start the local AI services (using its compose file)."""
-    print("Starting local AI services...")
+def local_ai_compose_command(profile=None, environment=None):
+    """Base docker compose command for the local AI stack."""
     cmd = ["docker", "compose", "-p", "localai"]
     if profile and profile != "none":
         cmd.extend(["--profile", profile])
@@ -74,8 +97,67 @@ def start_local_ai(profile=None, environment=None):
         cmd.extend(["-f", "docker-compose.override.private.yml"])
     if environment and environment == "public":
         cmd.extend(["-f", "docker-compose.override.public.yml"])
-    cmd.extend(["up", "-d"])
-    run_command(cmd)
+    cmd.extend(overlay_args(".", STACK_MAIN))
+    return cmd
+
+def start_supabase(environment=None):
+    """Start the Supabase services (using its compose file)."""
+    print("Starting Supabase services...")
+    run_command(supabase_compose_command(environment) + ["up", "-d"])
+
+def start_local_ai(profile=None, environment=None):
+    """Start the local AI services (using its compose file)."""
+    print("Starting local AI services...")
+    run_command(local_ai_compose_command(profile, environment) + ["up", "-d"])
+
+def start_all_services(profile=None, environment=None, max_workers=8):
+    """
+    Start both stacks through the dependency graph.
+
+    Containers are created up front (one `up --no-start` per stack, which also pulls
+    missing images and creates networks), then every service is started as soon as
+    its depends_on conditions hold, with independent services started in parallel.
+    Returns True when every service became ready.
+    """
+    supabase_cmd = supabase_compose_command(environment)
+    local_ai_cmd = local_ai_compose_command(profile, environment)
+
+    # The local AI compose file includes Supabase, so its config holds the full graph
+    with timeline.phase("load compose graph"):
+        supabase_services = set(load_compose_services(supabase_cmd))
+        graph = ServiceGraph(load_compose_services(local_ai_cmd))
+    local_ai_services = sorted(set(graph.services) - supabase_services)
+    print(f"Starting {len(graph.services)} services in {len(graph.levels())} dependency levels...")
+
+    with timeline.phase("create containers"):
+        run_command(supabase_cmd + ["up", "--no-start"])
+        run_command(local_ai_cmd + ["up", "--no-start", "--no-deps"] + local_ai_services)
+
+    def start_service(service):
+        cmd = supabase_cmd if service in supabase_services else local_ai_cmd
+        run_command(cmd + ["up", "-d", "--no-deps", "--no-recreate", service])
+
+    # Subscribe before anything starts so readiness comes from Docker events, not polling
+    watcher = ContainerEventWatcher("localai").start()
+
+    def wait_for(service, condition, timeout):
+        return wait_for_service("localai", service, condition, timeout, watcher=watcher)
+
+    engine = StartupEngine(graph, start_service, wait_for, max_workers=max_workers)
+    engine_start = timeline.now()
+    try:
+        report = engine.run()
+    finally:
+        watcher.stop()
+    for service, entry in report.items():
+        if "started" in entry:
+            end = entry.get("ready", timeline.now() - engine_start)
+            timeline.add_phase(f"ready {service}", engine_start + entry["started"],
+                               engine_start + end, error=entry.get("error"))
+    print_report(report)
+    if engine.failed:
+        print(f"Services that did not become ready: {', '.join(engine.failed)}")
+    return not engine.failed
 
 def generate_searxng_secret_key():
     """Generate a secret key for SearXNG based on the current platform."""
@@ -118,23 +200,23 @@ def generate_searxng_secret_key():
                 "$secretKey = -join ($randomBytes | ForEach-Object { \"{0:x2}\" -f $_ }); " +
                 "(Get-Content searxng/settings.yml) -replace 'ultrasecretkey', $secretKey | Set-Content searxng/settings.yml"
             ]
-            subprocess.run(ps_command, check=True)
+            run_process(ps_command, check=True)
 
         elif system == "Darwin":  # macOS
             print("Detected macOS platform, using sed command with empty string parameter...")
             # macOS sed command requires an empty string for the -i parameter
             openssl_cmd = ["openssl", "rand", "-hex", "32"]
-            random_key = subprocess.check_output(openssl_cmd).decode('utf-8').strip()
+            random_key = run_process(openssl_cmd, capture_output=True, text=True, check=True).stdout.strip()
             sed_cmd = ["sed", "-i", "", f"s|ultrasecretkey|{random_key}|g", settings_path]
-            subprocess.run(sed_cmd, check=True)
+            run_process(sed_cmd, check=True)
 
         else:  # Linux and other Unix-like systems
             print("Detected Linux/Unix platform, using standard sed command...")
             # Standard sed command for Linux
             openssl_cmd = ["openssl", "rand", "-hex", "32"]
-            random_key = subprocess.check_output(openssl_cmd).decode('utf-8').strip()
+            random_key = run_process(openssl_cmd, capture_output=True, text=True, check=True).stdout.strip()
             sed_cmd = ["sed", "-i", f"s|ultrasecretkey|{random_key}|g", settings_path]
-            subprocess.run(sed_cmd, check=True)
+            run_process(sed_cmd, check=True)
 
         print("SearXNG secret key generated successfully.")
 
@@ -149,73 +231,90 @@ def generate_searxng_secret_key():
         print("    $secretKey = -join ($randomBytes | ForEach-Object { \"{0:x2}\" -f $_ })")
         print("    (Get-Content searxng/settings.yml) -replace 'ultrasecretkey', $secretKey | Set-Content searxng/settings.yml")
 
-def check_and_fix_docker_compose_for_searxng():
-    """Check and modify docker-compose.yml for SearXNG first run."""
-    docker_compose_path = "docker-compose.yml"
-    if not os.path.exists(docker_compose_path):
-        print(f"Warning: Docker Compose file not found at {docker_compose_path}")
-        return
-
+def find_running_container(name):
+    """Return the name of the first running container whose name matches, or None."""
+    client = get_client()
+    if client:
+        for container in client.containers(filters={"name": [name]}):
+            return container["Names"][0].lstrip("/")
+        return None
+    result = run_process(
+        ["docker", "ps", "--filter", f"name={name}", "--format", "{{.Names}}"],
+        capture_output=True, text=True, check=True
+    )
+    names = result.stdout.split()
+    return names[0] if names else None
+
+def exec_in_container(container, cmd):
+    """Run a command inside a container and return its exit code."""
+    client = get_client()
+    if client:
+        exit_code, _ = client.exec(container, cmd)
+        return exit_code
+    return run_process(["docker", "exec", container] + cmd,
+                       capture_output=True, check=False).returncode
+
+def prepare_searxng_overlay():
+    """
+    Generate the compose overlay SearXNG needs on its first run.
+
+    On first run SearXNG writes its uwsgi.ini, which the `cap_drop: - ALL` in
+    docker-compose.yml prevents, so until the container has initialized an overlay
+    resets cap_drop. docker-compose.yml itself is never modified.
+    """
+    # Default to first run
+    is_first_run = True
+
+    # Check if Docker is running and if the SearXNG container exists
     try:
-        # Read the docker-compose.yml file
-        with open(docker_compose_path, 'r') as file:
-            content = file.read()
+        searxng_container = find_running_container("searxng")
 
-        # Default to first run
-        is_first_run = True
+        # If SearXNG container is running, check inside for uwsgi.ini
+        if searxng_container:
+            print(f"Found running SearXNG container: {searxng_container}")
 
-        # Check if Docker is running and if the SearXNG container exists
-        try:
-            # Check if the SearXNG container is running
-            container_check = subprocess.run(
-                ["docker", "ps", "--filter", "name=searxng", "--format", "{{.Names}}"],
-                capture_output=True, text=True, check=True
-            )
-            searxng_containers = container_check.stdout.strip().split('\n')
-
-            # If SearXNG container is running, check inside for uwsgi.ini
-            if any(container for container in searxng_containers if container):
-                container_name = next(container for container in searxng_containers if container)
-                print(f"Found running SearXNG container: {container_name}")
-
-                # Check if uwsgi.ini exists inside the container
-                container_check = subprocess.run(
-                    ["docker", "exec", container_name, "sh", "-c", "[ -f /etc/searxng/uwsgi.ini ] && echo 'found' || echo 'not_found'"],
-                    capture_output=True, text=True, check=False
-                )
-
-                if "found" in container_check.stdout:
-                    print("Found uwsgi.ini inside the SearXNG container - not first run")
-                    is_first_run = False
-                else:
-                    print("uwsgi.ini not found inside the SearXNG container - first run")
-                    is_first_run = True
+            # Check if uwsgi.ini exists inside the container
+            if exec_in_container(searxng_container, ["test", "-f", "/etc/searxng/uwsgi.ini"]) == 0:
+                print("Found uwsgi.ini inside the SearXNG container - not first run")
+                is_first_run = False
             else:
-                print("No running SearXNG container found - assuming first run")
-        except Exception as e:
-            print(f"Error checking Docker container: {e} - assuming first run")
-
-        if is_first_run and "cap_drop: - ALL" in content:
-            print("First run detected for SearXNG. Temporarily removing 'cap_drop: - ALL' directive...")
-            # Temporarily comment out the cap_drop line
-            modified_content = content.replace("cap_drop: - ALL", "# cap_drop: - ALL  # Temporarily commented out for first run")
-
-            # Write the modified content back
-            with open(docker_compose_path, 'w') as file:
-                file.write(modified_content)
-
-            print("Note: After the first run completes successfully, you should re-add 'cap_drop: - ALL' to docker-compose.yml for security reasons.")
-        elif not is_first_run and "# cap_drop: - ALL  # Temporarily commented out for first run" in content:
-            print("SearXNG has been initialized. Re-enabling 'cap_drop: - ALL' directive for security...")
-            # Uncomment the cap_drop line
-            modified_content = content.replace("# cap_drop: - ALL  # Temporarily commented out for first run", "cap_drop: - ALL")
-
-            # Write the modified content back
-            with open(docker_compose_path, 'w') as file:
-                file.write(modified_content)
-
+                print("uwsgi.ini not found inside the SearXNG container - first run")
+        else:
+            print("No running SearXNG container found - assuming first run")
     except Exception as e:
-        print(f"Error checking/modifying docker-compose.yml for SearXNG: {e}")
+        print(f"Error checking Docker container: {e} - assuming first run")
+
+    def build():
+        if not is_first_run:
+            return None
+        return {"services": {"searxng": {"cap_drop": Reset([])}}}
+
+    path, _ = ensure_overlay(
+        ".", STACK_MAIN, "searxng-first-run", ["docker-compose.yml"], build,
+        extra=f"first_run={is_first_run}"
+    )
+    if path:
+        print(f"First run detected for SearXNG. 'cap_drop: - ALL' is reset by {path} until it has initialized.")
+    else:
+        print("SearXNG has been initialized. Using 'cap_drop: - ALL' from docker-compose.yml.")
+
+# init-ollama containers that pull a fixed model list on every start
+OLLAMA_PULL_SERVICES = ["ollama-pull-llama-cpu", "ollama-pull-llama-gpu", "ollama-pull-llama-gpu-amd"]
+
+def prepare_ollama_overlay(manage_models):
+    """
+    When the launcher manages the Ollama models, move the init-ollama pull containers
+    behind an `ollama-init` profile so they no longer run on every start.
+    """
+    def build():
+        if not manage_models:
+            return None
+        return {"services": {
+            service: {"profiles": Override(["ollama-init"])} for service in OLLAMA_PULL_SERVICES
+        }}
+
+    ensure_overlay(".", STACK_MAIN, "ollama-models", ["docker-compose.yml"], build,
+                   extra=f"manage_models={manage_models}")
 
 def main():
     parser = argparse.ArgumentParser(description='Start the local AI and Supabase services.')
@@ -223,26 +322,100 @@ def main():
                       help='Profile to use for Docker Compose (default: cpu)')
     parser.add_argument('--environment', choices=['private', 'public'], default='private',
                       help='Environment to use for Docker Compose (default: private)')
+    parser.add_argument('--sequential', action='store_true',
+                      help='Start Supabase first, then the local AI stack (no dependency graph)')
+    parser.add_argument('--max-workers', type=int, default=8,
+                      help='Services started in parallel by the dependency graph (default: 8)')
+    parser.add_argument('--models-manifest', default=DEFAULT_MANIFEST,
+                      help=f'Ollama models to pull if missing and preload (default: {DEFAULT_MANIFEST})')
+    parser.add_argument('--no-model-manager', action='store_true',
+                      help='Leave model pulls to the init-ollama container instead of the manifest')
+    parser.add_argument('--supabase-ref', default=os.environ.get('SUPABASE_REF'),
+                      help='Pin Supabase to this commit, tag or branch, checked out from a local '
+                           'mirror cache instead of git pull (default: $SUPABASE_REF)')
+    startup_timeline.add_arguments(parser)
     args = parser.parse_args()
 
-    clone_supabase_repo()
-    prepare_supabase_env()
-
-    # Generate SearXNG secret key and check docker-compose.yml
-    generate_searxng_secret_key()
-    check_and_fix_docker_compose_for_searxng()
+    if args.bench:
+        argv = startup_timeline.bench_argv(sys.argv[1:])
+        ok = startup_timeline.run_bench(os.path.abspath(__file__), argv, args.bench, args.timeline,
+                                        stop=lambda: stop_existing_containers(args.profile))
+        sys.exit(0 if ok else 1)
 
-    stop_existing_containers(args.profile)
+    try:
+        start(args)
+    finally:
+        startup_timeline.finish(args.timeline)
+
+def start(args):
+    """Run the startup phases, each recorded on the startup timeline."""
+    with timeline.phase("clone supabase repo"):
+        checkout = clone_supabase_repo(args.supabase_ref)
+    with timeline.phase("prepare supabase env"):
+        prepare_supabase_env()
+
+    # Generate SearXNG secret key and its first-run compose overlay
+    with timeline.phase("searxng setup"):
+        generate_searxng_secret_key()
+        prepare_searxng_overlay()
+
+    if checkout:
+        with timeline.phase("wait for supabase checkout"):
+            try:
+                revision = checkout.wait()
+            except RuntimeError as e:
+                print(e)
+                sys.exit(1)
+        print(f"Supabase checked out at {revision}")
+
+    # Ollama runs on the host with --profile none, so there is nothing to manage then
+    manage_models = not args.no_model_manager and args.profile != "none"
+    prepare_ollama_overlay(manage_models)
+
+    with timeline.phase("stop existing containers"):
+        stop_existing_containers(args.profile)
+
+    # Pull missing models and warm them up while the rest of the stack starts
+    models = ModelManager(load_manifest(args.models_manifest)).start() if manage_models else None
+
+    if not args.sequential:
+        with timeline.phase("start all services"):
+            started = start_all_services(args.profile, args.environment, args.max_workers)
+        if not started:
+            sys.exit(1)
+        wait_for_models(models)
+        return
 
     # Start Supabase first
-    start_supabase(args.environment)
+    watcher = ContainerEventWatcher("localai").start()
+    with timeline.phase("start supabase"):
+        start_supabase(args.environment)
 
-    # Give Supabase some time to initialize
+    # Wait until the database and API gateway actually accept connections
     print("Waiting for Supabase to initialize...")
-    time.sleep(10)
+    with timeline.phase("wait for supabase"):
+        results = wait_for_stack("localai", ["db", "kong"], timeout=120, watcher=watcher)
+    watcher.stop()
+    print_readiness_report(results)
+    if not all(results):
+        print("Supabase did not become ready; not starting the local AI services.")
+        sys.exit(1)
 
     # Then start the local AI services
-    start_local_ai(args.profile, args.environment)
+    with timeline.phase("start local ai"):
+        start_local_ai(args.profile, args.environment)
+    wait_for_models(models)
+
+def wait_for_models(models):
+    """Wait for the model manager (if any) and print its report."""
+    if models is None:
+        return
+    print("Waiting for Ollama models to be pulled and loaded...")
+    with timeline.phase("wait for models"):
+        ready = models.wait()
+    models.print_report()
+    if not ready:
+        print("Some models are not ready; the services are running, but requests using them will fail or be slow.")
 
 if __name__ == "__main__":
     main()
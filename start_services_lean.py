@@ -25,10 +25,25 @@ Usage examples:
 import os
 import subprocess
 import shutil
-import time
+import sys
 import argparse
 from datetime import datetime
 
+from compose_overlay import STACK_MAIN, STACK_SUPABASE, ensure_overlay, overlay_args
+from docker_api import get_client
+from readiness import (
+    SERVICE_PROBES, ContainerEventWatcher, print_readiness_report, wait_for_stack
+)
+from reconcile import (
+    completed_services, load_effective_config, load_state, plan, running_services, save_state,
+    service_hashes
+)
+from startup_graph import ServiceGraph, load_compose_services
+import startup_timeline
+from startup_timeline import run_process, timeline
+from supabase_checkout import SupabaseCheckout
+from supervisor import Supervisor
+
 # Define absolute paths
 PROJECT_DIR = '/root/local-ai-packaged'
 SUPABASE_DOCKER_DIR = os.path.join(PROJECT_DIR, 'supabase', 'docker')
@@ -47,7 +62,7 @@ AVAILABLE_SERVICES = {
 def run_command(cmd, cwd=None, check=True, show_output=True):
     """Run a shell command with better error handling."""
     print("Running:", " ".join(cmd))
-    result = subprocess.run(cmd, cwd=cwd, check=False, capture_output=True, text=True)
+    result = run_process(cmd, cwd=cwd, check=False, capture_output=True, text=True)
 
     if result.returncode != 0:
         print(f"❌ Command failed with exit code {result.returncode}")
@@ -63,9 +78,19 @@ def run_command(cmd, cwd=None, check=True, show_output=True):
 
     return result
 
-def clone_supabase_repo():
-    """Clone the Supabase repository using sparse checkout if not already present."""
+def clone_supabase_repo(ref=None):
+    """
+    Clone the Supabase repository using sparse checkout if not already present.
+
+    With a pinned `ref`, the checkout instead comes from a local mirror cache in the
+    background; the returned SupabaseCheckout must be waited on before Supabase's
+    compose file is used.
+    """
     supabase_dir = os.path.join(PROJECT_DIR, 'supabase')
+    if ref:
+        print(f"📦 Checking out Supabase {ref} from the local mirror in the background...")
+        return SupabaseCheckout(supabase_dir, ref).start()
+
     if not os.path.exists(supabase_dir):
         print("Cloning the Supabase repository...")
         run_command([
@@ -77,78 +102,96 @@ def clone_supabase_repo():
         run_command(["git", "checkout", "master"], cwd=supabase_dir)
     else:
         print("Supabase repository already exists, assuming it is up to date.")
+    return None
 
 def prepare_supabase_env():
     """Copy .env to .env in supabase/docker."""
     if not os.path.exists(SUPABASE_ENV_FILE) or os.path.getmtime(ROOT_ENV_FILE) > os.path.getmtime(SUPABASE_ENV_FILE):
         print("Copying .env from root to supabase/docker/.env...")
+        os.makedirs(SUPABASE_DOCKER_DIR, exist_ok=True)
         shutil.copyfile(ROOT_ENV_FILE, SUPABASE_ENV_FILE)
     else:
         print("Supabase .env file is already up to date.")
 
-def patch_supabase_compose():
-    """Patch the Supabase docker-compose.yml to add traefik network configuration."""
-    print("Patching Supabase docker-compose.yml for Traefik integration...")
+def prepare_supabase_overlay():
+    """
+    Generate the compose override that puts Supabase's Kong on the Traefik network.
 
-    with open(SUPABASE_COMPOSE_FILE, 'r') as f:
-        content = f.read()
+    The tracked Supabase compose file is left untouched; the override is only rebuilt
+    when that file changes.
+    """
+    def build():
+        config = load_effective_config(
+            ["docker", "compose", "-p", "localai", "-f", SUPABASE_COMPOSE_FILE], cwd=PROJECT_DIR
+        )
+        kong = config.get("services", {}).get("kong", {})
+        if "traefik" in (kong.get("networks") or {}):
+            return None
+        return {
+            "services": {"kong": {"networks": {"default": {}, "traefik": {}}}},
+            "networks": {"traefik": {"external": True}},
+        }
+
+    path, rebuilt = ensure_overlay(
+        PROJECT_DIR, STACK_SUPABASE, "traefik", [SUPABASE_COMPOSE_FILE], build
+    )
+    if not rebuilt:
+        print("✅ Supabase compose overlay is up to date.")
+    elif path:
+        print(f"✅ Generated Supabase compose overlay for Traefik: {path}")
+    else:
+        print("✅ Supabase compose file already joins Traefik, no overlay needed.")
 
-    # Check if already patched
-    if 'networks:' in content and 'traefik:' in content and 'external: true' in content:
-        print("Supabase docker-compose.yml already patched.")
-        return
+def check_db_ready():
+    """
+    Check if the database is ready to accept connections: the startup handshake
+    when the host can reach the port, else pg_isready inside supabase-db.
+    """
+    ready, _ = SERVICE_PROBES["db"]().check()
+    return ready
 
-    # Add networks to kong service if not present
-    kong_section_found = False
-    lines = content.split('\n')
-    new_lines = []
-    i = 0
-
-    while i < len(lines):
-        line = lines[i]
-        new_lines.append(line)
-
-        # Find kong service and add networks after ports
-        if '  kong:' in line:
-            kong_section_found = True
-        elif kong_section_found and '    ports:' in line:
-            # Skip to end of ports section
-            i += 1
-            while i < len(lines) and lines[i].startswith('      -'):
-                new_lines.append(lines[i])
-                i += 1
-            # Add networks section
-            new_lines.append('    networks:')
-            new_lines.append('      - default')
-            new_lines.append('      - traefik')
-            kong_section_found = False
-            continue
-
-        i += 1
-
-    # Add networks definition at the end if not present
-    if 'networks:' not in content or 'traefik:' not in content:
-        # Find volumes section and add networks after it
-        content = '\n'.join(new_lines)
-        if 'volumes:\n  db-config:' in content:
-            content = content.replace(
-                'volumes:\n  db-config:',
-                'volumes:\n  db-config:\n\nnetworks:\n  traefik:\n    external: true'
-            )
-
-    # Write patched content
-    with open(SUPABASE_COMPOSE_FILE, 'w') as f:
-        f.write(content)
-
-    print("✅ Supabase docker-compose.yml patched successfully.")
+def wait_for_services(services, timeout=120, watcher=None):
+    """
+    Wait concurrently until services are healthy and answer their application
+    probes, and print the readiness report.
 
-def check_db_ready():
-    """Check if the database is ready to accept connections."""
-    result = run_command([
-        "docker", "exec", "supabase-db",
-        "pg_isready", "-U", "postgres"
-    ], check=False, show_output=False)
-    return result.returncode == 0
+    Args:
+        services: compose service names
+        timeout: per-service deadline in seconds
+        watcher: running ContainerEventWatcher, so container state comes from
+            Docker events instead of polling
+    Returns:
+        True if every service became ready
+    """
+    results = wait_for_stack("localai", services, timeout=timeout, watcher=watcher)
+    print_readiness_report(results)
+    return all(results)
+
+def print_container_table():
+    """Print name, status and published ports of running containers, like `docker ps`."""
+    client = get_client()
+    if not client:
+        run_command([
+            "docker", "ps",
+            "--format", "table {{.Names}}\t{{.Status}}\t{{.Ports}}"
+        ], check=False)
+        return
+
+    rows = []
+    for container in client.containers():
+        ports = sorted({
+            f"{port['IP']}:{port['PublicPort']}->{port['PrivatePort']}/{port['Type']}"
+            if port.get("PublicPort") else f"{port['PrivatePort']}/{port['Type']}"
+            for port in container.get("Ports") or []
+        })
+        rows.append((container["Names"][0].lstrip("/"), container["Status"], ", ".join(ports)))
+    rows.sort()
+
+    name_width = max([len("NAMES")] + [len(row[0]) for row in rows])
+    status_width = max([len("STATUS")] + [len(row[1]) for row in rows])
+    print(f"{'NAMES':{name_width}}   {'STATUS':{status_width}}   PORTS")
+    for name, status, ports in rows:
+        print(f"{name:{name_width}}   {status:{status_width}}   {ports}")
 
 def stop_existing_containers(services=None):
     """
@@ -165,39 +208,107 @@ def stop_existing_containers(services=None):
     print("="*60)
 
     # Stop specific services from main stack or all main services
-    cmd = [
-        "docker", "compose", "-p", "localai",
-        "-f", MAIN_COMPOSE_FILE,
-        "down", "--remove-orphans", "-t", "1"
-    ]
+    cmd = compose_command() + ["down", "--remove-orphans", "-t", "1"]
     if services:
         # When specific services are provided, stop only those
-        cmd = [
-            "docker", "compose", "-p", "localai",
-            "-f", MAIN_COMPOSE_FILE,
-            "stop", "-t", "1"
-        ] + services
+        cmd = compose_command() + ["stop", "-t", "1"] + services
 
     run_command(cmd, check=False)
 
     # Stop Supabase services if not selective mode
     if not services:
-        run_command([
-            "docker", "compose", "-p", "localai",
-            "-f", SUPABASE_COMPOSE_FILE,
-            "down", "--remove-orphans", "-t", "1"
-        ], check=False)
+        run_command(
+            compose_command(SUPABASE_COMPOSE_FILE) + ["down", "--remove-orphans", "-t", "1"],
+            check=False
+        )
+
+def compose_command(compose_file=MAIN_COMPOSE_FILE):
+    """Base docker compose command for the localai project, including generated overlays."""
+    stack = STACK_SUPABASE if compose_file == SUPABASE_COMPOSE_FILE else STACK_MAIN
+    return ["docker", "compose", "-p", "localai", "-f", compose_file] + overlay_args(PROJECT_DIR, stack)
+
+def select_services(services=None, skip_supabase=False, only_supabase=False):
+    """
+    Resolve the command line selection to compose service names.
+
+    The main compose file includes the Supabase one, so its config covers both stacks.
+    """
+    if services:
+        return set(services)
+    all_services = set(load_effective_config(compose_command(), cwd=PROJECT_DIR)["services"])
+    supabase_services = set(load_effective_config(
+        compose_command(SUPABASE_COMPOSE_FILE), cwd=PROJECT_DIR
+    )["services"])
+    if only_supabase:
+        return supabase_services
+    if skip_supabase:
+        return all_services - supabase_services
+    return all_services
+
+def record_state(services):
+    """Store the config hashes of services that were just started."""
+    config = load_effective_config(compose_command(), cwd=PROJECT_DIR)
+    state = load_state(PROJECT_DIR)
+    state.update(service_hashes(config, services))
+    save_state(PROJECT_DIR, state)
+
+def reconcile_services(services):
+    """
+    Recreate only the services whose effective config changed, and start stopped ones.
+
+    Args:
+        services: set of compose service names to reconcile
+    Returns:
+        list of services that were (re)started, or None on failure
+    """
+    print("\n" + "="*60)
+    print("Reconciling services...")
+    print("="*60)
+
+    config = load_effective_config(compose_command(), cwd=PROJECT_DIR)
+    current = service_hashes(config, services)
+    state = load_state(PROJECT_DIR)
+    running = running_services(compose_command(), cwd=PROJECT_DIR)
+    running |= completed_services(compose_command(), config, cwd=PROJECT_DIR)
+    changed, stopped, unchanged = plan(current, state, running)
+
+    for name in changed:
+        print(f"  🔄 {name:28} config changed, recreating")
+    for name in stopped:
+        print(f"  ▶️  {name:28} not running, starting")
+    print(f"  ✅ {len(unchanged)} service(s) unchanged")
+
+    if not changed and not stopped:
+        print("\n✅ Nothing to do - everything is up to date.")
+        return []
+
+    if changed:
+        result = run_command(
+            compose_command() + ["up", "-d", "--no-deps", "--force-recreate"] + changed,
+            cwd=PROJECT_DIR, check=False
+        )
+        if result.returncode != 0:
+            print("\n❌ Failed to recreate changed services!")
+            return None
+    if stopped:
+        result = run_command(
+            compose_command() + ["up", "-d", "--no-deps"] + stopped,
+            cwd=PROJECT_DIR, check=False
+        )
+        if result.returncode != 0:
+            print("\n❌ Failed to start stopped services!")
+            return None
+
+    state.update({name: current[name] for name in changed + stopped})
+    save_state(PROJECT_DIR, state)
+    return changed + stopped
 
 def start_supabase():
     """Start the Supabase services."""
     print("\n" + "="*60)
     print("Starting Supabase services...")
     print("="*60)
-    cmd = [
-        "docker", "compose", "-p", "localai",
-        "-f", SUPABASE_COMPOSE_FILE,
-        "up", "-d", "--remove-orphans"
-    ]
+    cmd = compose_command(SUPABASE_COMPOSE_FILE) + ["up", "-d", "--remove-orphans"]
     run_command(cmd, cwd=PROJECT_DIR)
 
 def start_services(services=None):
@@ -216,11 +327,9 @@ def start_services(services=None):
 
     # Validate the compose file first
     print("Validating docker-compose.yml...")
-    validate_result = run_command([
-        "docker", "compose", "-p", "localai",
-        "-f", MAIN_COMPOSE_FILE,
-        "config"
-    ], check=False, show_output=False)
+    validate_result = run_command(
+        compose_command() + ["config"], check=False, show_output=False
+    )
 
     if validate_result.returncode != 0:
         print("❌ docker-compose.yml validation failed!")
@@ -230,11 +339,7 @@ def start_services(services=None):
     print("✅ docker-compose.yml is valid")
 
     # Build the command
-    cmd = [
-        "docker", "compose", "-p", "localai",
-        "-f", MAIN_COMPOSE_FILE,
-        "up", "-d", "--remove-orphans"
-    ]
+    cmd = compose_command() + ["up", "-d", "--remove-orphans"]
 
     # Add specific services if provided
     if services:
@@ -294,6 +399,12 @@ Examples:
   Start only Supabase:
     python start_services_lean.py --only-supabase
 
+  Re-run without restarting unchanged services:
+    python start_services_lean.py --reconcile
+
+  Start, then keep watching and restarting failing services:
+    python start_services_lean.py --supervise
+
   List available services:
     python start_services_lean.py --list
         """
@@ -310,7 +421,20 @@ Examples:
                        help='List all available services and exit')
     parser.add_argument('--no-stop', action='store_true',
                        help='Skip stopping existing containers (useful for adding services)')
-
+    parser.add_argument('--supabase-ref', default=os.environ.get('SUPABASE_REF'),
+                       help='Pin Supabase to this commit, tag or branch, checked out from a local '
+                            'mirror cache (default: $SUPABASE_REF)')
+    parser.add_argument('--reconcile', action='store_true',
+                       help='Only recreate services whose config or image changed since the last run')
+    parser.add_argument('--supervise', action='store_true',
+                       help='Keep running after startup: restart failing services and track '
+                            'CPU/memory, with a status endpoint on 127.0.0.1')
+    parser.add_argument('--status-port', type=int, default=8765,
+                       help='Port of the --supervise status endpoint (default: 8765)')
+    parser.add_argument('--sample-interval', type=float, default=15,
+                       help='Seconds between --supervise resource samples (default: 15)')
+
+    startup_timeline.add_arguments(parser)
     args = parser.parse_args()
 
     # Handle --list
@@ -322,54 +446,118 @@ Examples:
     if args.skip_supabase and args.only_supabase:
         print("❌ Error: Cannot use --skip-supabase and --only-supabase together")
         return
+    if args.bench and args.supervise:
+        parser.error("--bench cannot be combined with --supervise (each run would supervise forever)")
+
+    if args.bench:
+        argv = startup_timeline.bench_argv(sys.argv[1:])
+        ok = startup_timeline.run_bench(os.path.abspath(__file__), argv, args.bench, args.timeline,
+                                        stop=lambda: stop_existing_containers(services=args.services))
+        sys.exit(0 if ok else 1)
+
+    try:
+        ok = start(args)
+    finally:
+        startup_timeline.finish(args.timeline)
+    if not ok:
+        sys.exit(1)
+
+    if args.supervise:
+        supervise(args)
+
+def supervise(args):
+    """Run the supervisor over the whole localai project until Ctrl+C."""
+    client = get_client()
+    if client is None:
+        print("❌ --supervise needs access to the Docker socket")
+        sys.exit(1)
+    graph = ServiceGraph(load_compose_services(compose_command(), cwd=PROJECT_DIR))
+    Supervisor(
+        "localai", graph, client,
+        status_port=args.status_port, interval=args.sample_interval
+    ).run_forever()
+
+def start(args):
+    """
+    Prepare and start the selected stacks, recording each phase on the timeline.
 
+    Returns:
+        True if everything started
+    """
     # Prepare Supabase if needed
-    if not args.skip_supabase and not args.only_supabase:
-        clone_supabase_repo()
-        prepare_supabase_env()
-        patch_supabase_compose()
-    elif args.only_supabase:
-        clone_supabase_repo()
-        prepare_supabase_env()
-        patch_supabase_compose()
-
-    # Stop existing containers (unless --no-stop)
-    if not args.no_stop:
-        stop_existing_containers(services=args.services)
-
-    # Start Supabase if needed
-    if args.only_supabase or (not args.skip_supabase):
-        start_supabase()
-
-        print("\n⏳ Waiting for database to be ready...")
-        max_wait = 60  # Maximum 60 seconds
-        waited = 0
-        while waited < max_wait:
-            if check_db_ready():
-                print(f"✅ Database is ready (waited {waited} seconds)")
-                break
-            time.sleep(2)
-            waited += 2
-            if waited % 10 == 0:
-                print(f"   Still waiting... ({waited}/{max_wait} seconds)")
-
-        if waited >= max_wait:
-            print("⚠️  Database didn't become ready in time, but continuing anyway...")
-
-        # Extra buffer to ensure all Supabase services are stable
-        print("⏳ Waiting for Supabase services to stabilize (5 more seconds)...")
-        time.sleep(5)
-
-    # Start main services if needed
-    if not args.only_supabase:
-        if not start_services(services=args.services):
-            print("\n⚠️  Services failed to start. Check the errors above.")
-            print("\nManual troubleshooting:")
-            print("  docker compose -p localai -f docker-compose.yml config")
-            print("  docker compose -p localai -f docker-compose.yml up")
-            if args.services:
-                print(f"  docker logs {args.services[0]}")
-            return
+    if not args.skip_supabase:
+        with timeline.phase("clone supabase repo"):
+            checkout = clone_supabase_repo(args.supabase_ref)
+        with timeline.phase("prepare supabase"):
+            prepare_supabase_env()
+            if checkout:
+                try:
+                    revision = checkout.wait()
+                except RuntimeError as e:
+                    print(f"❌ {e}")
+                    return False
+                print(f"✅ Supabase checked out at {revision}")
+            prepare_supabase_overlay()
+
+    # Follow container start/health events from here on, before anything is started
+    watcher = ContainerEventWatcher("localai").start()
+
+    if args.reconcile:
+        with timeline.phase("reconcile"):
+            selected = select_services(args.services, args.skip_supabase, args.only_supabase)
+            touched = reconcile_services(selected)
+        if touched is None:
+            return False
+        if touched:
+            print("\n⏳ Waiting for services to answer their health checks...")
+            with timeline.phase("wait for services"):
+                ready = wait_for_services(touched, watcher=watcher)
+            if not ready:
+                print("\n⚠️  Some services are not answering yet. Check the report above.")
+    else:
+        # Stop existing containers (unless --no-stop)
+        if not args.no_stop:
+            with timeline.phase("stop existing containers"):
+                stop_existing_containers(services=args.services)
+
+        # Start Supabase if needed
+        if args.only_supabase or (not args.skip_supabase):
+            with timeline.phase("start supabase"):
+                start_supabase()
+
+            print("\n⏳ Waiting for the database and API gateway to accept connections...")
+            with timeline.phase("wait for supabase"):
+                ready = wait_for_services(["db", "kong"], timeout=60, watcher=watcher)
+            if not ready:
+                print("❌ Supabase did not become ready. Check the report above and:")
+                print("  docker logs supabase-db")
+                print("  docker logs supabase-kong")
+                return False
+
+        # Start main services if needed
+        if not args.only_supabase:
+            with timeline.phase("start services"):
+                started = start_services(services=args.services)
+            if not started:
+                print("\n⚠️  Services failed to start. Check the errors above.")
+                print("\nManual troubleshooting:")
+                print("  docker compose -p localai -f docker-compose.yml config")
+                print("  docker compose -p localai -f docker-compose.yml up")
+                if args.services:
+                    print(f"  docker logs {args.services[0]}")
+                return False
+
+            print("\n⏳ Waiting for services to answer their health checks...")
+            with timeline.phase("wait for services"):
+                ready = wait_for_services(args.services or list(AVAILABLE_SERVICES), watcher=watcher)
+            if not ready:
+                print("\n⚠️  Some services are not answering yet. Check the report above.")
+
+        # Remember what is running now so a later --reconcile run can skip it
+        with timeline.phase("record state"):
+            record_state(select_services(args.services, args.skip_supabase, args.only_supabase))
+
+    watcher.stop()
 
     print("\n" + "="*60)
     print("✅ Services started successfully!")
@@ -377,10 +565,7 @@ Examples:
 
     # Show running containers
     print("\n📊 Running containers:")
-    run_command([
-        "docker", "ps",
-        "--format", "table {{.Names}}\t{{.Status}}\t{{.Ports}}"
-    ], check=False)
+    print_container_table()
 
     # Show access URLs
     print("\n💡 Access URLs:")
@@ -395,5 +580,7 @@ Examples:
     if args.only_supabase or not args.skip_supabase:
         print("  • Supabase: https://db.leadingai.info")
 
+    return True
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+startup_graph.py
+
+Dependency-graph startup engine for the launch scripts. The resolved compose
+configuration (`docker compose config --format json`, which already follows the
+Supabase `include:` and the active profiles) is turned into a DAG from each
+service's `depends_on`. Every service is started as soon as the services it depends
+on have reached the required condition, so independent services start concurrently
+instead of one stack after the other behind fixed sleeps.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from startup_timeline import run_process
+
+CONDITION_STARTED = "service_started"
+CONDITION_HEALTHY = "service_healthy"
+CONDITION_COMPLETED = "service_completed_successfully"
+
+def load_compose_services(compose_cmd, cwd=None):
+    """
+    Read the resolved compose config and return the dependency data per service.
+
+    Returns:
+        {service: {"depends_on": {dependency: condition}, "healthcheck": bool, "restart": policy}}
+    """
+    result = run_process(
+        compose_cmd + ["config", "--format", "json"],
+        cwd=cwd, capture_output=True, text=True, check=True
+    )
+    config = json.loads(result.stdout)
+
+    services = {}
+    for name, spec in config.get("services", {}).items():
+        depends_on = spec.get("depends_on") or {}
+        if isinstance(depends_on, list):
+            depends_on = {dependency: {} for dependency in depends_on}
+        healthcheck = spec.get("healthcheck") or {}
+        services[name] = {
+            "depends_on": {
+                dependency: (options or {}).get("condition", CONDITION_STARTED)
+                for dependency, options in depends_on.items()
+            },
+            "healthcheck": bool(healthcheck) and not healthcheck.get("disable", False),
+            "restart": spec.get("restart") or "no",
+        }
+    return services
+
+class ServiceGraph:
+    """Services and their depends_on edges, with topological helpers."""
+
+    def __init__(self, services):
+        # Drop edges to services that are not part of the config (e.g. other profiles)
+        self.services = {
+            name: {
+                **spec,
+                "depends_on": {
+                    dependency: condition
+                    for dependency, condition in spec["depends_on"].items()
+                    if dependency in services
+                },
+            }
+            for name, spec in services.items()
+        }
+
+    def select(self, names):
+        """Return the subgraph of `names` plus everything they transitively depend on."""
+        selected = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in selected or name not in self.services:
+                continue
+            selected.add(name)
+            pending.extend(self.services[name]["depends_on"])
+        return ServiceGraph({name: self.services[name] for name in selected})
+
+    def levels(self):
+        """
+        Group services into start levels (Kahn's algorithm).
+
+        Every service only depends on services of earlier levels; services within a
+        level are independent of each other. Raises ValueError on a dependency cycle.
+        """
+        remaining = {name: set(spec["depends_on"]) for name, spec in self.services.items()}
+        levels = []
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps)
+            if not ready:
+                raise ValueError(f"Dependency cycle between services: {', '.join(sorted(remaining))}")
+            levels.append(ready)
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return levels
+
+    def required_conditions(self, name):
+        """Conditions other services wait for on `name` (always includes started)."""
+        conditions = {CONDITION_STARTED}
+        for spec in self.services.values():
+            if name in spec["depends_on"]:
+                conditions.add(spec["depends_on"][name])
+        return conditions
+
+class StartupEngine:
+    """
+    Start the services of a ServiceGraph concurrently, gated on their dependencies.
+
+    Args:
+        graph: the ServiceGraph to start
+        start_service: callable(service) that starts one service and raises on error
+        wait_for: callable(service, condition, timeout) returning a truthy result
+            when ready (a readiness.ProbeResult explains failures via .detail)
+        max_workers: size of the thread pool running start/wait steps
+        timeout: per-service deadline in seconds for reaching a condition
+    """
+
+    def __init__(self, graph, start_service, wait_for, max_workers=8, timeout=300):
+        self.graph = graph
+        self.start_service = start_service
+        self.wait_for = wait_for
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.report = {}
+        self._events = {
+            name: {
+                CONDITION_STARTED: threading.Event(),
+                CONDITION_HEALTHY: threading.Event(),
+                CONDITION_COMPLETED: threading.Event(),
+            }
+            for name in graph.services
+        }
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def _record(self, service, **values):
+        with self._lock:
+            self.report.setdefault(service, {}).update(values)
+
+    def _fail(self, service, error):
+        self._record(service, error=error)
+        with self._lock:
+            self._failed.add(service)
+        # Wake every dependent so it can fail fast instead of timing out
+        for event in self._events[service].values():
+            event.set()
+
+    def _run_service(self, service, started_at):
+        # The pool discards task exceptions; an escaped error (e.g. DockerAPIError or
+        # OSError while waiting) would leave dependents blocked until the timeout
+        try:
+            self._start_and_wait(service, started_at)
+        except Exception as e:
+            self._fail(service, f"{type(e).__name__}: {e}")
+
+    def _start_and_wait(self, service, started_at):
+        spec = self.graph.services[service]
+        for dependency, condition in spec["depends_on"].items():
+            # No deadline of our own: the dependency's wait is bounded by its own
+            # timeout, counted from its start, and _fail sets the event when it expires
+            self._events[dependency][condition].wait()
+            if dependency in self._failed:
+                return self._fail(service, f"dependency {dependency} failed")
+
+        try:
+            self.start_service(service)
+        except Exception as e:
+            return self._fail(service, f"start failed: {e}")
+        self._record(service, started=time.monotonic() - started_at)
+        self._events[service][CONDITION_STARTED].set()
+
+        required = self.graph.required_conditions(service)
+        if CONDITION_COMPLETED in required:
+            condition = CONDITION_COMPLETED
+        else:
+            condition = CONDITION_HEALTHY if spec["healthcheck"] else CONDITION_STARTED
+        result = self.wait_for(service, condition, self.timeout)
+        if not result:
+            detail = getattr(result, "detail", None) or f"not {condition.replace('service_', '')}"
+            return self._fail(service, detail)
+        if condition == CONDITION_COMPLETED:
+            self._events[service][CONDITION_COMPLETED].set()
+        # Services without a healthcheck count as healthy once running, like compose does
+        self._events[service][CONDITION_HEALTHY].set()
+        self._record(service, ready=time.monotonic() - started_at)
+
+    def run(self):
+        """Start everything and return {service: {"started", "ready", "error"}}."""
+        started_at = time.monotonic()
+        # Submitting in topological order keeps the pool deadlock-free: every task
+        # only waits on tasks that were dispatched before it.
+        order = [service for level in self.graph.levels() for service in level]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for service in order:
+                pool.submit(self._run_service, service, started_at)
+        return self.report
+
+    @property
+    def failed(self):
+        return sorted(self._failed)
+
+def print_report(report):
+    """Print per-service start and ready times, slowest last."""
+    print("\n" + "="*60)
+    print("Service readiness")
+    print("="*60)
+    for service, entry in sorted(report.items(), key=lambda item: item[1].get("ready", float("inf"))):
+        started = f"{entry['started']:6.1f}s" if "started" in entry else "     -"
+        ready = f"{entry['ready']:6.1f}s" if "ready" in entry else "     -"
+        status = f"❌ {entry['error']}" if entry.get("error") else "✅"
+        print(f"  {service:28} started {started}   ready {ready}   {status}")
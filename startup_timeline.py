@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+startup_timeline.py
+
+Startup profiler for the launch scripts. Every phase (clone, env preparation, compose
+validation, per-service readiness, ...) and every subprocess is recorded with its
+start and end offset, exit code and output size. The timeline is written as JSON and
+summarized as a Gantt-style chart, and `--bench N` repeats a start N times and reports
+the median and p95 duration of each phase, for the cold first run (after compose down)
+separately from the warm ones.
+"""
+
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+class Timeline:
+    """Phases and subprocesses of one launcher run, as offsets from its start."""
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.phases = []
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def now(self):
+        """Seconds since the timeline started."""
+        return time.monotonic() - self.origin
+
+    @contextmanager
+    def phase(self, name):
+        """Record the enclosed block as a phase; exceptions are noted and re-raised."""
+        start = self.now()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.add_phase(name, start, self.now(), error=error)
+
+    def add_phase(self, name, start, end, error=None):
+        entry = {"name": name, "start": round(start, 3), "end": round(end, 3),
+                 "duration": round(end - start, 3)}
+        if error:
+            entry["error"] = error
+        with self._lock:
+            self.phases.append(entry)
+
+    def record_command(self, cmd, start, end, returncode, output_bytes):
+        entry = {"cmd": " ".join(cmd), "start": round(start, 3), "end": round(end, 3),
+                 "duration": round(end - start, 3), "returncode": returncode,
+                 "output_bytes": output_bytes}
+        with self._lock:
+            self.commands.append(entry)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "duration": round(self.now(), 3),
+                "phases": sorted(self.phases, key=lambda entry: entry["start"]),
+                "commands": sorted(self.commands, key=lambda entry: entry["start"]),
+            }
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print_summary(self, width=40, top_commands=10):
+        """Print phases and the slowest subprocesses as bars on a shared time axis."""
+        data = self.to_dict()
+        total = max(data["duration"], 0.001)
+
+        def bar(entry):
+            left = int(entry["start"] / total * width)
+            length = max(1, int(entry["duration"] / total * width))
+            return " " * left + "█" * min(length, width - left)
+
+        print("\n" + "="*60)
+        print(f"Startup timeline ({total:.1f}s total)")
+        print("="*60)
+        for entry in data["phases"]:
+            mark = " ❌" if entry.get("error") else ""
+            print(f"  {entry['name'][:28]:28} |{bar(entry):{width}}| "
+                  f"{entry['start']:6.1f}s +{entry['duration']:.1f}s{mark}")
+
+        slowest = sorted(data["commands"], key=lambda entry: entry["duration"], reverse=True)
+        if slowest[:top_commands]:
+            print("\n  Slowest commands:")
+            for entry in slowest[:top_commands]:
+                print(f"  {entry['cmd'][:28]:28} |{bar(entry):{width}}| "
+                      f"{entry['start']:6.1f}s +{entry['duration']:.1f}s (exit {entry['returncode']})")
+
+# The timeline of the current process
+timeline = Timeline()
+
+def _run_tee(cmd, **kwargs):
+    """Run `cmd`, passing its combined output through to stdout; returns (returncode, bytes)."""
+    output_bytes = 0
+    sys.stdout.flush()
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs) as process:
+        for chunk in iter(lambda: process.stdout.read1(65536), b""):
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            output_bytes += len(chunk)
+    return process.returncode, output_bytes
+
+def run_process(cmd, tee=False, **kwargs):
+    """
+    subprocess.run() that records the command on the timeline.
+
+    With `tee`, the output is not captured for the caller but still shown as it
+    arrives, and counted for the timeline.
+    """
+    start = timeline.now()
+    returncode = None
+    output_bytes = None
+    try:
+        if tee:
+            check = kwargs.pop("check", False)
+            returncode, output_bytes = _run_tee(cmd, **kwargs)
+            result = subprocess.CompletedProcess(cmd, returncode)
+            if check:
+                result.check_returncode()
+            return result
+        result = subprocess.run(cmd, **kwargs)
+        returncode = result.returncode
+        outputs = [output for output in (result.stdout, result.stderr) if output]
+        if kwargs.get("capture_output") or kwargs.get("stdout") == subprocess.PIPE:
+            output_bytes = sum(
+                len(output.encode() if isinstance(output, str) else output) for output in outputs
+            )
+        return result
+    except subprocess.CalledProcessError as e:
+        returncode = e.returncode
+        raise
+    finally:
+        timeline.record_command(cmd, start, timeline.now(), returncode, output_bytes)
+
+def add_arguments(parser):
+    """Add the --timeline and --bench options to a launcher's argument parser."""
+    parser.add_argument('--timeline', nargs='?', const='startup_timeline.json', metavar='PATH',
+                        help='Write a JSON startup timeline to PATH (default: startup_timeline.json) '
+                             'and print a Gantt-style summary')
+    parser.add_argument('--bench', type=int, metavar='N',
+                        help='Run the start N times (the first after compose down) and report '
+                             'median and p95 per phase, cold and warm separately')
+
+def finish(path):
+    """Write the timeline to `path` and print its summary, if a path was requested."""
+    if path:
+        timeline.save(path)
+        timeline.print_summary()
+        print(f"\nTimeline written to {path}")
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def _print_bench_table(title, durations):
+    """Print median/p95/max per phase and return them as a dict."""
+    print(f"\n  {title}")
+    print(f"  {'phase':28} {'runs':>4} {'median':>8} {'p95':>8} {'max':>8}")
+    summary = {}
+    for name, values in sorted(durations.items(), key=lambda item: -statistics.median(item[1])):
+        summary[name] = {"runs": len(values), "median": statistics.median(values),
+                         "p95": percentile(values, 0.95), "max": max(values)}
+        print(f"  {name[:28]:28} {len(values):4} {summary[name]['median']:7.2f}s "
+              f"{summary[name]['p95']:7.2f}s {summary[name]['max']:7.2f}s")
+    return summary
+
+def run_bench(script, argv, iterations, output_path=None, stop=None):
+    """
+    Re-run `script` with `argv` `iterations` times, each writing its own timeline,
+    and print median/p95 per phase.
+
+    The first run is a cold start: `stop` (the launcher's compose down) runs before
+    it. The others are warm starts on what the previous run left behind (containers,
+    images, the Supabase checkout), and are reported separately.
+
+    Returns:
+        True if every run exited successfully
+    """
+    durations = {"cold": {}, "warm": {}}
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(iterations):
+            kind = "cold" if i == 0 else "warm"
+            path = os.path.join(tmp, f"run{i}.json")
+            print(f"\n🏁 Benchmark run {i + 1}/{iterations} ({kind})")
+            if kind == "cold" and stop:
+                stop()
+            result = subprocess.run([sys.executable, script] + argv + ["--timeline", path])
+            if result.returncode != 0 or not os.path.exists(path):
+                print(f"❌ Run {i + 1} failed with exit code {result.returncode}")
+                ok = False
+                continue
+            with open(path) as f:
+                data = json.load(f)
+            durations[kind].setdefault("total", []).append(data["duration"])
+            for entry in data["phases"]:
+                durations[kind].setdefault(entry["name"], []).append(entry["duration"])
+
+    print("\n" + "="*60)
+    print(f"Benchmark: {iterations} runs of {os.path.basename(script)} {' '.join(argv)}")
+    print("="*60)
+    summary = {
+        kind: _print_bench_table(f"{kind.capitalize()} start", durations[kind])
+        for kind in ("cold", "warm") if durations[kind]
+    }
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump({"argv": argv, "iterations": iterations, **summary}, f, indent=2)
+        print(f"\nBenchmark summary written to {output_path}")
+    return ok
+
+def bench_argv(argv):
+    """Strip the --bench/--timeline options from a launcher's argv for the repeated runs."""
+    stripped = []
+    skip = False
+    for i, arg in enumerate(argv):
+        if skip:
+            skip = False
+            continue
+        if arg == "--bench":
+            skip = True
+        elif arg == "--timeline":
+            skip = i + 1 < len(argv) and not argv[i + 1].startswith("-")
+        elif not arg.startswith("--bench=") and not arg.startswith("--timeline="):
+            stripped.append(arg)
+    return stripped
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+supabase_checkout.py
+
+Pinned, cached Supabase checkout for the launch scripts. A bare mirror of the Supabase
+repository is kept under ~/.cache (a partial clone, so only the blobs actually used
+are downloaded) and the `docker/` directory of the pinned revision is extracted from
+it into supabase/. The extraction runs in a background thread so the other preparation
+steps proceed meanwhile; git only blocks startup when the pinned revision is not in
+the mirror yet. Warm starts with an unchanged pin don't touch git at all, and offline
+starts work as long as the revision was fetched once.
+"""
+
+import io
+import os
+import re
+import tarfile
+import threading
+
+from startup_timeline import run_process
+
+SUPABASE_REPO_URL = "https://github.com/supabase/supabase.git"
+DEFAULT_MIRROR_DIR = os.path.join(os.path.expanduser("~"), ".cache", "local-ai-packaged", "supabase.git")
+REVISION_STAMP = ".supabase-revision"
+
+_FULL_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+class SupabaseCheckout:
+    """
+    Materialize `paths` of the Supabase repository at `ref` into `target_dir`.
+
+    Args:
+        target_dir: the supabase/ directory of the project
+        ref: commit SHA, tag or branch to pin to
+        mirror_dir: location of the bare mirror cache
+        url: repository to mirror
+        paths: repository paths to extract
+    """
+
+    def __init__(self, target_dir, ref, mirror_dir=DEFAULT_MIRROR_DIR,
+                 url=SUPABASE_REPO_URL, paths=("docker",)):
+        self.target_dir = target_dir
+        self.ref = ref
+        self.mirror_dir = mirror_dir
+        self.url = url
+        self.paths = list(paths)
+        self.revision = None
+        self.error = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """Start checking out in the background; returns self for chaining."""
+        threading.Thread(target=self._run, name="supabase-checkout", daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until the pinned revision is in place; raises if it could not be."""
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"Supabase checkout of {self.ref} did not finish in time")
+        if self.error:
+            raise RuntimeError(f"Supabase checkout of {self.ref} failed: {self.error}")
+        return self.revision
+
+    def _git(self, *args, **kwargs):
+        return run_process(["git", "--git-dir", self.mirror_dir] + list(args),
+                           capture_output=True, check=False, **kwargs)
+
+    def _stamp_path(self):
+        return os.path.join(self.target_dir, REVISION_STAMP)
+
+    def _stamped_revision(self):
+        try:
+            with open(self._stamp_path()) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _resolve(self):
+        """Return the commit SHA of the ref in the mirror, or None if it isn't there."""
+        if not os.path.isdir(self.mirror_dir):
+            return None
+        result = self._git("rev-parse", "--verify", "--quiet", f"{self.ref}^{{commit}}", text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def _fetch(self):
+        """Create the mirror, or bring it up to date."""
+        if not os.path.isdir(self.mirror_dir):
+            os.makedirs(os.path.dirname(self.mirror_dir), exist_ok=True)
+            result = run_process(
+                ["git", "clone", "--mirror", "--filter=blob:none", self.url, self.mirror_dir],
+                capture_output=True, text=True, check=False
+            )
+        else:
+            result = self._git("fetch", "--prune", "origin", text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"git exited with {result.returncode}")
+
+    def _materialize(self, revision):
+        """Extract the pinned paths into the target directory, unless already there."""
+        if self._stamped_revision() == revision:
+            return
+        result = self._git("archive", "--format=tar", revision, *self.paths)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors="replace").strip())
+        os.makedirs(self.target_dir, exist_ok=True)
+        # Extracting over the existing tree keeps local files such as docker/.env
+        # and the database volume.
+        with tarfile.open(fileobj=io.BytesIO(result.stdout)) as archive:
+            if hasattr(tarfile, "data_filter"):
+                archive.extractall(self.target_dir, filter="data")
+            else:
+                archive.extractall(self.target_dir)
+        with open(self._stamp_path(), "w") as f:
+            f.write(revision + "\n")
+
+    def _run(self):
+        fetched = False
+        try:
+            if _FULL_SHA.match(self.ref) and self._stamped_revision() == self.ref:
+                # Pinned to an exact commit that is already in place: nothing to do
+                self.revision = self.ref
+                return
+            revision = self._resolve()
+            if revision is None:
+                self._fetch()
+                fetched = True
+                revision = self._resolve()
+                if revision is None:
+                    raise RuntimeError(f"revision {self.ref} not found in {self.url}")
+            self._materialize(revision)
+            self.revision = revision
+        except Exception as e:
+            self.error = e
+        finally:
+            self._ready.set()
+
+        # Refresh branch/tag refs for the next start; never waited on, and fine to fail offline
+        if not fetched and not _FULL_SHA.match(self.ref):
+            try:
+                self._fetch()
+            except Exception:
+                pass
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+supervisor.py
+
+Long-running supervisor for the localai stack (start_services_lean.py --supervise).
+It follows Docker events for the project, samples container CPU and memory at a fixed
+interval into a per-service ring buffer, and restarts services that turn unhealthy or
+stay down, with exponential backoff and dependencies before their dependents. The
+current state and the recent history are served as JSON on a local HTTP endpoint.
+
+Crashes of containers with a restart policy are left to Docker; the supervisor steps
+in for what Docker doesn't handle (unhealthy containers, containers that stay exited)
+and never restarts a service that was stopped on purpose, nor a one-shot (n8n-import,
+ollama-pull-*) that finished with exit code 0.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from docker_api import DockerAPIError
+from readiness import wait_for_service
+from startup_graph import CONDITION_HEALTHY, CONDITION_STARTED
+
+# Restart policies under which Docker brings a container back after a clean exit
+RESTART_ON_SUCCESS = ("always", "unless-stopped")
+
+class ServiceHistory:
+    """Bounded resource samples and restart/failure events of one service."""
+
+    def __init__(self, size):
+        # (timestamp, cpu percent, memory bytes, memory percent)
+        self.samples = deque(maxlen=size)
+        # (timestamp, kind, detail)
+        self.events = deque(maxlen=size)
+        self.restarts = 0
+        self.failures = 0
+        self.last_failure = None
+        self.health = None
+        self.state = None
+        self.stopped_on_purpose = False
+        # (failures, last_failure) before the last `die` was counted
+        self.before_die = None
+
+    def summary(self):
+        latest = self.samples[-1] if self.samples else None
+        cpu = [sample[1] for sample in self.samples if sample[1] is not None]
+        return {
+            "state": self.state,
+            "health": self.health,
+            "restarts": self.restarts,
+            "cpu_percent": latest[1] if latest else None,
+            "memory_bytes": latest[2] if latest else None,
+            "memory_percent": latest[3] if latest else None,
+            "cpu_percent_peak": max(cpu) if cpu else None,
+            "memory_bytes_peak": max(sample[2] for sample in self.samples) if self.samples else None,
+            "last_event": list(self.events[-1]) if self.events else None,
+        }
+
+    def detail(self):
+        return {
+            **self.summary(),
+            "samples": [list(sample) for sample in self.samples],
+            "events": [list(event) for event in self.events],
+        }
+
+def _completed(exit_code, policy):
+    """True for a clean exit that no restart policy undoes: a finished one-shot."""
+    return str(exit_code) == "0" and policy not in RESTART_ON_SUCCESS
+
+def _cpu_total(stats):
+    cpu = stats.get("cpu_stats") or {}
+    return (cpu.get("cpu_usage") or {}).get("total_usage"), cpu.get("system_cpu_usage"), cpu.get("online_cpus") or 1
+
+def _memory(stats):
+    memory = stats.get("memory_stats") or {}
+    usage = memory.get("usage") or 0
+    details = memory.get("stats") or {}
+    # Page cache is reclaimable; subtract it like `docker stats` does (cgroup v1/v2)
+    usage -= details.get("inactive_file", details.get("cache", 0))
+    limit = memory.get("limit") or 0
+    return usage, (usage / limit * 100 if limit else None)
+
+class Supervisor:
+    """
+    Args:
+        project: compose project name
+        graph: startup_graph.ServiceGraph of the project (for restart ordering)
+        client: docker_api.DockerClient
+        status_port: local port of the HTTP status endpoint
+        interval: seconds between resource samples
+        history: samples/events kept per service
+        backoff_base, backoff_max: restart backoff bounds in seconds
+        grace: seconds a crashed container may stay down before it is restarted
+        stable_after: seconds without failures after which the backoff resets
+    """
+
+    def __init__(self, project, graph, client, status_port=8765, interval=15, history=240,
+                 backoff_base=5, backoff_max=300, grace=30, stable_after=600):
+        self.project = project
+        self.graph = graph
+        self.client = client
+        self.status_port = status_port
+        self.interval = interval
+        self.history_size = history
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.grace = grace
+        self.stable_after = stable_after
+        self.history = {}
+        self._order = {
+            service: index
+            for index, level in enumerate(graph.levels()) for service in level
+        }
+        self._dependencies = {
+            service: set(graph.select([service]).services) - {service}
+            for service in graph.services
+        }
+        self._pending = {}  # service -> time the restart is due
+        self._previous_cpu = {}
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+        self._events = None
+
+    def _service(self, name):
+        if name not in self.history:
+            self.history[name] = ServiceHistory(self.history_size)
+        return self.history[name]
+
+    def _container_id(self, service):
+        containers = self.client.containers(all=True, filters={"label": [
+            f"com.docker.compose.project={self.project}",
+            f"com.docker.compose.service={service}",
+        ]})
+        return containers[0]["Id"] if containers else None
+
+    # Events
+
+    def _consume_events(self):
+        while not self._stop.is_set():
+            try:
+                self._events = self.client.events(filters={
+                    "type": ["container"],
+                    "label": [f"com.docker.compose.project={self.project}"],
+                    "event": ["start", "stop", "die", "oom", "health_status"],
+                })
+                for event in self._events:
+                    self._handle_event(event)
+            except (DockerAPIError, OSError, ValueError):
+                pass
+            # Stream dropped (daemon restart, ...): resubscribe after a pause
+            self._stop.wait(5)
+
+    def _handle_event(self, event):
+        attributes = (event.get("Actor") or {}).get("Attributes") or {}
+        service = attributes.get("com.docker.compose.service")
+        if not service:
+            return
+        action = event.get("Action") or ""
+        now = time.time()
+        with self._lock:
+            history = self._service(service)
+            if action == "start":
+                history.state = "running"
+                history.stopped_on_purpose = False
+                self._pending.pop(service, None)
+            elif action == "stop":
+                # `docker stop` / `compose down`: a deliberate stop, not a failure.
+                # Docker sends `die` first, so take back the failure it counted
+                history.state = "stopped"
+                history.stopped_on_purpose = True
+                if self._pending.pop(service, None) is not None and history.before_die:
+                    history.failures, history.last_failure = history.before_die
+                history.before_die = None
+            elif action == "oom":
+                history.events.append((round(now, 1), "oom", "out of memory"))
+            elif action == "die":
+                exit_code = attributes.get("exitCode")
+                policy = self.graph.services.get(service, {}).get("restart", "no")
+                if _completed(exit_code, policy):
+                    history.state = "completed"
+                    history.events.append((round(now, 1), "completed", "exit code 0"))
+                    return
+                history.state = "exited"
+                history.events.append((round(now, 1), "die", f"exit code {exit_code}"))
+                if not history.stopped_on_purpose:
+                    history.before_die = (history.failures, history.last_failure)
+                    # Docker's restart policy gets the first chance; check back after the grace period
+                    self._schedule(service, history, now + self.grace)
+            elif action.startswith("health_status"):
+                health = action.split(":", 1)[-1].strip()
+                history.health = health
+                if health == "unhealthy":
+                    history.events.append((round(now, 1), "unhealthy", "healthcheck failing"))
+                    self._schedule(service, history, now)
+
+    def _schedule(self, service, history, earliest):
+        """Queue a restart with backoff; must be called with the lock held."""
+        now = time.time()
+        if history.last_failure and now - history.last_failure > self.stable_after:
+            history.failures = 0
+        history.failures += 1
+        history.last_failure = now
+        # The first failure is handled right away, repeated ones back off exponentially
+        delay = 0 if history.failures == 1 else min(
+            self.backoff_base * 2 ** (history.failures - 2), self.backoff_max
+        )
+        due = max(earliest, now + delay)
+        self._pending[service] = min(self._pending.get(service, due), due)
+        self._lock.notify_all()
+
+    # Restarts
+
+    def _next_restart(self):
+        """Pick the due service that has no pending dependency, dependencies first."""
+        pending = set(self._pending)
+        candidates = []
+        for service, due in self._pending.items():
+            if self._dependencies.get(service, set()) & pending:
+                continue
+            candidates.append((self._order.get(service, 0), due, service))
+        return min(candidates) if candidates else None
+
+    def _restart_loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                choice = self._next_restart()
+                if choice is None:
+                    self._lock.wait(1)
+                    continue
+                _, due, service = choice
+                if due > time.time():
+                    self._lock.wait(min(due - time.time(), 1))
+                    continue
+                del self._pending[service]
+                history = self._service(service)
+            try:
+                self._restart(service, history)
+            except (DockerAPIError, OSError) as e:
+                with self._lock:
+                    history.events.append((round(time.time(), 1), "restart_failed", str(e)))
+
+    def _restart(self, service, history):
+        container_id = self._container_id(service)
+        if container_id is None:
+            return  # removed (compose down): nothing to supervise
+        container = self.client.inspect(container_id)
+        state = container["State"]
+        health = (state.get("Health") or {}).get("Status")
+        if state.get("Running") and health != "unhealthy":
+            return  # Docker's restart policy already brought it back
+        policy = ((container.get("HostConfig") or {}).get("RestartPolicy") or {}).get("Name") or "no"
+        if state.get("Status") == "exited" and _completed(state.get("ExitCode"), policy):
+            with self._lock:
+                history.state = "completed"
+                history.events.append((round(time.time(), 1), "completed", "exit code 0"))
+            return
+        print(f"🔁 Restarting {service} (failure #{history.failures})")
+        try:
+            self.client.restart(container_id)
+        except DockerAPIError as e:
+            with self._lock:
+                history.events.append((round(time.time(), 1), "restart_failed", str(e)))
+                self._schedule(service, history, time.time())
+            return
+        spec = self.graph.services.get(service, {})
+        condition = CONDITION_HEALTHY if spec.get("healthcheck") else CONDITION_STARTED
+        result = wait_for_service(self.project, service, condition, timeout=120)
+        with self._lock:
+            history.restarts += 1
+            history.events.append((round(time.time(), 1), "restart", "ready" if result else result.detail))
+            if not result:
+                self._schedule(service, history, time.time())
+
+    # Resource sampling
+
+    def _sample_loop(self):
+        while not self._stop.is_set():
+            try:
+                containers = self.client.containers(filters={
+                    "label": [f"com.docker.compose.project={self.project}"]
+                })
+            except (DockerAPIError, OSError):
+                containers = []
+            for container in containers:
+                service = (container.get("Labels") or {}).get("com.docker.compose.service")
+                if service:
+                    self._sample(service, container["Id"])
+            self._stop.wait(self.interval)
+
+    def _sample(self, service, container_id):
+        try:
+            stats = self.client.stats(container_id)
+        except (DockerAPIError, OSError):
+            return
+        total, system, cpus = _cpu_total(stats)
+        previous = self._previous_cpu.get(container_id)
+        self._previous_cpu[container_id] = (total, system)
+        cpu_percent = None
+        if previous and None not in (total, system, previous[0], previous[1]) and system > previous[1]:
+            cpu_percent = round((total - previous[0]) / (system - previous[1]) * cpus * 100, 2)
+        memory_bytes, memory_percent = _memory(stats)
+        with self._lock:
+            history = self._service(service)
+            history.state = history.state or "running"
+            history.samples.append((
+                round(time.time(), 1), cpu_percent, memory_bytes,
+                round(memory_percent, 2) if memory_percent is not None else None
+            ))
+
+    # Status endpoint
+
+    def status(self, service=None):
+        with self._lock:
+            if service:
+                history = self.history.get(service)
+                return history.detail() if history else None
+            return {
+                "project": self.project,
+                "pending_restarts": {name: round(due, 1) for name, due in self._pending.items()},
+                "services": {name: history.summary() for name, history in sorted(self.history.items())},
+            }
+
+    def _serve_status(self):
+        supervisor = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.rstrip("/")
+                if path == "/status":
+                    body = supervisor.status()
+                elif path.startswith("/status/"):
+                    body = supervisor.status(path[len("/status/"):])
+                else:
+                    body = None
+                data = json.dumps(body if body is not None else {"error": "not found"}).encode()
+                self.send_response(200 if body is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", self.status_port), StatusHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="supervisor-status", daemon=True).start()
+        return server
+
+    def start(self):
+        """Start the event, sampling, restart and status threads."""
+        for target, name in ((self._consume_events, "supervisor-events"),
+                             (self._sample_loop, "supervisor-stats"),
+                             (self._restart_loop, "supervisor-restarts")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+        self._server = self._serve_status()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._events is not None:
+            self._events.close()
+        self._server.shutdown()
+        with self._lock:
+            self._lock.notify_all()
+
+    def run_forever(self):
+        """Supervise until interrupted with Ctrl+C."""
+        self.start()
+        print(f"👀 Supervising project '{self.project}' - status at "
+              f"http://127.0.0.1:{self.status_port}/status (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("\nStopping supervisor.")
+        finally:
+            self.stop()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for docker_api.py against a fake Docker daemon on a temporary Unix socket.
+
+Usage:
+    python3 -m unittest discover tests
+"""
+
+import http.server
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docker_api import API_VERSION, DockerAPIError, DockerClient  # noqa: E402
+
+DROP = object()  # Route result: close the connection without answering
+CLOSE = "close"  # Optional third route result item: close the connection after answering
+
+class FakeDockerHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def address_string(self):
+        return "fake-docker"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        path = self.path.split("?")[0]
+        prefix = f"/{API_VERSION}"
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+        with self.server.lock:
+            self.server.requests.append((self.command, path, body))
+        route = self.server.routes.get((self.command, path))
+        if route is None:
+            result = (404, {"message": f"no route {self.command} {path}"})
+        else:
+            result = route(body)
+        if result is DROP:
+            self.close_connection = True
+            return
+        status, payload = result[:2]
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except BrokenPipeError:
+            # The client gave up (timeout test)
+            self.close_connection = True
+        if CLOSE in result[2:]:
+            # Like the daemon closing an idle kept-alive connection, without telling the client
+            self.close_connection = True
+
+    do_GET = _handle
+    do_POST = _handle
+
+class FakeDockerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Engine API stand-in: routes map (method, path) to body -> (status, payload[, CLOSE]) or DROP."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        super().__init__(socket_path, FakeDockerHandler)
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def count(self, method, path):
+        with self.lock:
+            return sum(1 for request in self.requests if request[:2] == (method, path))
+
+def exec_frame(stream, text):
+    data = text.encode()
+    return struct.pack(">BxxxL", stream, len(data)) + data
+
+class DockerClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = FakeDockerDaemon(os.path.join(self.tmp.name, "docker.sock"))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = DockerClient(self.server.server_address, timeout=2)
+        self.server.routes[("GET", "/containers/json")] = lambda body: (200, [{"Names": ["/db"]}])
+
+    def tearDown(self):
+        conn = getattr(self.client._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_requests_share_one_connection(self):
+        self.assertEqual(self.client.containers(), [{"Names": ["/db"]}])
+        self.assertEqual(self.client.containers(all=True), [{"Names": ["/db"]}])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_error_status_raises(self):
+        with self.assertRaises(DockerAPIError) as raised:
+            self.client.inspect("missing")
+        self.assertEqual(raised.exception.status, 404)
+
+    def test_get_is_retried_when_the_connection_drops(self):
+        answers = iter([DROP, (200, {"State": {"Status": "running"}})])
+        self.server.routes[("GET", "/containers/db/json")] = lambda body: next(answers)
+        self.client.containers()  # open the kept-alive connection first
+        self.assertEqual(self.client.inspect("db")["State"]["Status"], "running")
+        self.assertEqual(self.server.count("GET", "/containers/db/json"), 2)
+
+    def test_post_is_not_replayed_when_the_connection_drops(self):
+        self.server.routes[("POST", "/containers/db/restart")] = lambda body: DROP
+        self.client.containers()
+        with self.assertRaises(ConnectionError):
+            self.client.restart("db")
+        self.assertEqual(self.server.count("POST", "/containers/db/restart"), 1)
+
+    def test_timeout_is_not_retried(self):
+        def slow(body):
+            time.sleep(0.5)
+            return 200, {}
+        self.server.routes[("GET", "/containers/db/json")] = slow
+        self.client = DockerClient(self.server.server_address, timeout=0.1)
+        with self.assertRaises(socket.timeout):
+            self.client.inspect("db")
+        time.sleep(0.6)
+        self.assertEqual(self.server.count("GET", "/containers/db/json"), 1)
+
+    def test_reconnects_after_the_daemon_closes_an_idle_connection(self):
+        self.server.routes[("GET", "/containers/json")] = lambda body: (200, [], CLOSE)
+        self.client.containers()
+        time.sleep(0.1)
+        self.server.routes[("POST", "/containers/db/restart")] = lambda body: (204, b"")
+        self.client.restart("db")
+        self.assertEqual(self.server.count("POST", "/containers/db/restart"), 1)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_exec_returns_exit_code_and_output(self):
+        self.server.routes[("POST", "/containers/db/exec")] = lambda body: (201, {"Id": "e1"})
+        self.server.routes[("POST", "/exec/e1/start")] = lambda body: (
+            200, exec_frame(1, "accepting connections\n") + exec_frame(2, "warning\n")
+        )
+        self.server.routes[("GET", "/exec/e1/json")] = lambda body: (200, {"ExitCode": 0})
+        exit_code, output = self.client.exec("db", ["pg_isready"])
+        self.assertEqual(exit_code, 0)
+        self.assertIn("accepting connections", output)
+        self.assertIn("warning", output)
+        create = next(r for r in self.server.requests if r[1] == "/containers/db/exec")
+        self.assertEqual(create[2]["Cmd"], ["pg_isready"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for supervisor.py restart decisions against the fake Docker daemon.
+
+Usage:
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from docker_api import DockerClient  # noqa: E402
+from startup_graph import ServiceGraph  # noqa: E402
+from supervisor import Supervisor  # noqa: E402
+from test_docker_api import FakeDockerDaemon  # noqa: E402
+
+SERVICES = {
+    "n8n-import": {"depends_on": {}, "healthcheck": False, "restart": "no"},
+    "n8n": {"depends_on": {"n8n-import": "service_completed_successfully"},
+            "healthcheck": False, "restart": "unless-stopped"},
+    "ollama-pull-llama-cpu": {"depends_on": {}, "healthcheck": False, "restart": "no"},
+}
+
+def die_event(service, exit_code):
+    return {"Action": "die", "Actor": {"Attributes": {
+        "com.docker.compose.service": service, "exitCode": str(exit_code),
+    }}}
+
+class SupervisorRestartTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = FakeDockerDaemon(os.path.join(self.tmp.name, "docker.sock"))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = DockerClient(self.server.server_address, timeout=2)
+        self.supervisor = Supervisor("localai", ServiceGraph(SERVICES), self.client, grace=0)
+        self.server.routes[("GET", "/containers/json")] = lambda body: (200, [{"Id": "c1"}])
+        self.server.routes[("POST", "/containers/c1/restart")] = lambda body: (204, b"")
+
+    def tearDown(self):
+        conn = getattr(self.client._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def inspect_returns(self, exit_code, policy):
+        self.server.routes[("GET", "/containers/c1/json")] = lambda body: (200, {
+            "State": {"Status": "exited", "Running": False, "ExitCode": exit_code},
+            "HostConfig": {"RestartPolicy": {"Name": policy}},
+        })
+
+    def test_clean_one_shot_exit_is_completed(self):
+        self.supervisor._handle_event(die_event("n8n-import", 0))
+        history = self.supervisor.history["n8n-import"]
+        self.assertEqual(history.state, "completed")
+        self.assertEqual(history.failures, 0)
+        self.assertNotIn("n8n-import", self.supervisor._pending)
+
+    def test_failed_one_shot_is_restarted(self):
+        self.supervisor._handle_event(die_event("ollama-pull-llama-cpu", 1))
+        self.assertIn("ollama-pull-llama-cpu", self.supervisor._pending)
+        self.assertEqual(self.supervisor.history["ollama-pull-llama-cpu"].failures, 1)
+
+    def test_clean_exit_under_restart_policy_is_checked(self):
+        self.supervisor._handle_event(die_event("n8n", 0))
+        self.assertIn("n8n", self.supervisor._pending)
+
+    def test_restart_skips_container_that_completed(self):
+        # Services outside the graph fall back to the inspected restart policy
+        self.inspect_returns(0, "no")
+        history = self.supervisor._service("ollama-pull-llama-gpu")
+        self.supervisor._restart("ollama-pull-llama-gpu", history)
+        self.assertEqual(self.server.count("POST", "/containers/c1/restart"), 0)
+        self.assertEqual(history.state, "completed")
+        self.assertEqual(history.restarts, 0)
+
+    def test_restart_skips_clean_exit_under_on_failure_policy(self):
+        self.inspect_returns(0, "on-failure")
+        history = self.supervisor._service("n8n-import")
+        self.supervisor._restart("n8n-import", history)
+        self.assertEqual(self.server.count("POST", "/containers/c1/restart"), 0)
+
+if __name__ == "__main__":
+    unittest.main()